@@ -1,5 +1,26 @@
+import subprocess
+import sys
+
 from . import _is_pws
 
+# Heavy dependencies which should not be imported by "import pywatershed",
+# they are only needed for plotting, analysis, and file conversions.
+lazy_modules = [
+    "contextily",
+    "flopy",
+    "geopandas",
+    "matplotlib",
+    "pandas",
+    "shapely",
+    "xarray",
+]
+
+count_template = """
+import sys
+import {package}
+print(sum(mod in sys.modules for mod in {lazy_modules}))
+"""
+
 
 class Import:
     """Benchmark importing pywatershed"""
@@ -15,3 +36,25 @@ class Import:
             return "import pywatershed", "import numpy"
         else:
             return "import pynhm", "import numpy"
+
+    def timeraw_import_lazy_attribute(self):
+        # the cost deferred from "import pywatershed" to first access
+        if not _is_pws:
+            raise NotImplementedError
+        return "pywatershed.DomainPlot", "import pywatershed"
+
+    def track_lazy_modules_imported(self):
+        # guards the import budget: should be zero
+        package = "pywatershed" if _is_pws else "pynhm"
+        code = count_template.format(
+            package=package, lazy_modules=lazy_modules
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        return int(result.stdout.strip().split("\n")[-1])
+
+    track_lazy_modules_imported.unit = "modules"
@@ -0,0 +1,73 @@
+from . import _is_pws, parameterized, test_data_dir
+
+domains = ["drb_2yr"]
+cache_states = ["cold", "warm"]
+# The kernels of canopy, snow, runoff and soilzone are compiled on their first
+# call rather than on construction, so the first time step is included.
+model_processes = {
+    "gw_channel": "[pws.PRMSGroundwater, pws.PRMSChannel]",
+    "nhm": (
+        "[pws.PRMSCanopy, pws.PRMSSnow, pws.PRMSRunoff, pws.PRMSSoilzone, "
+        "pws.PRMSGroundwater, pws.PRMSChannel]"
+    ),
+}
+
+# Each timeraw_ benchmark runs in a fresh python process, so numba has not
+# compiled anything in it. The untimed setup code imports pywatershed and
+# loads the inputs. For the warm case, the on-disk cache is first populated
+# by building the model in a separate python process.
+build_template = """
+import os
+import pathlib as pl
+import pywatershed as pws
+
+pws.utils.set_numba_cache_dir(os.environ["PYWATERSHED_NUMBA_CACHE_DIR"])
+
+domain_dir = pl.Path("{domain_dir}")
+params = pws.parameters.PrmsParameters.load(domain_dir / "myparam.param")
+processes = {processes}
+
+def build_model():
+    control = pws.Control.load_prms(
+        domain_dir / "nhm.control", warn_unused_options=False
+    )
+    control.options["input_dir"] = domain_dir / "output"
+    control.options["calc_method"] = "numba"
+    model = pws.Model(processes, control=control, parameters=params)
+    model.advance()
+    model.calculate()
+    return model
+"""
+
+setup_template = """
+import os
+import subprocess
+import sys
+import tempfile
+
+os.environ["PYWATERSHED_NUMBA_CACHE_DIR"] = tempfile.mkdtemp()
+build = {build!r}
+if "{cache_state}" == "warm":
+    subprocess.run([sys.executable, "-c", build + "build_model()"], check=True)
+
+exec(build)
+"""
+
+
+class NumbaCache:
+    """Benchmark Model construction and first time step with a cold versus
+    warm numba cache"""
+
+    @parameterized(
+        ["domain", "processes", "cache_state"],
+        (domains, list(model_processes.keys()), cache_states),
+    )
+    def timeraw_model_init(self, domain, processes, cache_state):
+        if not _is_pws:
+            raise NotImplementedError
+        domain_dir = (test_data_dir / domain).resolve()
+        build = build_template.format(
+            domain_dir=domain_dir, processes=model_processes[processes]
+        )
+        setup = setup_template.format(build=build, cache_state=cache_state)
+        return "build_model()", setup
@@ -0,0 +1,95 @@
+import datetime as dt
+import pathlib as pl
+import shutil
+import tempfile
+
+import numpy as np
+
+from . import _is_pws
+
+if _is_pws:
+    from pywatershed.utils.netcdf_utils import NetCdfWrite
+
+# The layouts of output variables, see output_layout()
+layouts = {
+    "default": None,
+    "write": "write-optimized",
+    "read": "timeseries-read-optimized",
+    "float32": {
+        "profile": "timeseries-read-optimized",
+        "float32": True,
+        "least_significant_digit": 3,
+    },
+}
+n_times = 730
+n_hru = 5000
+meta = {"x": {"dims": ("nhru",), "type": "float64", "units": "in"}}
+
+
+def write_file(nc_file: pl.Path, layout, data: np.ndarray) -> None:
+    nc = NetCdfWrite(
+        nc_file, {"nhm_id": np.arange(n_hru) + 1}, ["x"], meta, layout=layout
+    )
+    start = dt.datetime(1979, 1, 1)
+    for itime in range(n_times):
+        nc.add_simulation_time(itime, start + dt.timedelta(days=itime))
+        nc.add_data("x", itime, data[itime])
+    nc.close()
+    return
+
+
+class OutputLayout:
+    """Benchmark writing and reading output for each layout profile"""
+
+    params = list(layouts.keys())
+    param_names = ["layout"]
+
+    def setup(self, layout):
+        if not _is_pws:
+            raise NotImplementedError
+        self.tmp_dir = pl.Path(tempfile.mkdtemp())
+        self.data = np.random.default_rng(0).random((n_times, n_hru))
+        # a file to read and to size
+        self.read_file = self.tmp_dir / "read.nc"
+        write_file(self.read_file, layouts[layout], self.data)
+        return
+
+    def teardown(self, layout):
+        shutil.rmtree(self.tmp_dir)
+        return
+
+    def time_write(self, layout):
+        # time steps are written as by Process.output()
+        write_file(self.tmp_dir / "write.nc", layouts[layout], self.data)
+        return
+
+    def time_read_timeseries(self, layout):
+        # the full timeseries of a single HRU
+        import netCDF4 as nc4
+
+        with nc4.Dataset(self.read_file) as ds:
+            _ = ds["x"][:, n_hru // 2]
+        return
+
+    def time_read_time_step(self, layout):
+        # all HRUs on a single time step
+        import netCDF4 as nc4
+
+        with nc4.Dataset(self.read_file) as ds:
+            _ = ds["x"][n_times // 2, :]
+        return
+
+    def track_file_size(self, layout):
+        return self.read_file.stat().st_size
+
+    track_file_size.unit = "bytes"
+
+    def track_write_throughput(self, layout):
+        # megabytes of float64 data written per second
+        from time import perf_counter
+
+        start = perf_counter()
+        write_file(self.tmp_dir / "write.nc", layouts[layout], self.data)
+        return self.data.nbytes / 1e6 / (perf_counter() - start)
+
+    track_write_throughput.unit = "MB/s"
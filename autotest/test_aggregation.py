@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import pywatershed as pws
+
+
+@pytest.mark.parametrize(
+    "period, starts",
+    [
+        # the first periods of the months
+        ("month", ["1999-09-29", "1999-10-01", "1999-11-01", "1999-12-01"]),
+        ("year", ["1999-09-29", "2000-01-01"]),
+        ("water_year", ["1999-09-29", "1999-10-01", "2000-10-01"]),
+        (
+            np.array(["1999-10-15", "2000-03-01"], dtype="datetime64[D]"),
+            ["1999-09-29", "1999-10-15", "2000-03-01"],
+        ),
+    ],
+    ids=["month", "year", "water_year", "custom"],
+)
+def test_temporal_aggregator(period, starts):
+    control = pws.Control(
+        start_time=np.datetime64("1999-09-29T00:00:00"),
+        end_time=np.datetime64("2000-10-02T00:00:00"),
+        time_step=np.timedelta64(24, "h"),
+    )
+    agg = pws.TemporalAggregator(control, period, ["sum", "mean", "max"])
+    agg.add_variable("x", (1,))
+
+    times = []
+    sums = []
+    for istep in range(control.n_times):
+        control.advance()
+        if agg.advance():
+            times += [agg.record_time]
+            sums += [agg.records["x"]["sum"][0]]
+        agg.accumulate("x", np.array([istep]))
+
+    assert agg.finalize()
+    assert not agg.finalize()
+    times += [agg.record_time]
+    sums += [agg.records["x"]["sum"][0]]
+
+    assert sum(sums) == sum(range(control.n_times))
+    assert agg.n_records == len(times)
+    np.testing.assert_equal(
+        np.array(times[: len(starts)]), np.array(starts, dtype="datetime64[s]")
+    )
+
+    # the mean and max of the last period
+    n_last = (control.end_time - agg.record_time) // control.time_step + 1
+    last = np.arange(control.n_times)[-n_last:]
+    assert agg.records["x"]["mean"][0] == last.mean()
+    assert agg.records["x"]["max"][0] == last.max()
+
+
+def test_temporal_aggregator_bad_args():
+    control = pws.Control(
+        start_time=np.datetime64("1999-09-29T00:00:00"),
+        end_time=np.datetime64("2000-10-02T00:00:00"),
+        time_step=np.timedelta64(24, "h"),
+    )
+    with pytest.raises(ValueError):
+        pws.TemporalAggregator(control, "week")
+    with pytest.raises(ValueError):
+        pws.TemporalAggregator(control, "month", ["median"])
@@ -1,5 +1,9 @@
+import subprocess
+import sys
+
 import pytest
 
+import pywatershed as pws
 from pywatershed.base.accessor import Accessor
 
 
@@ -15,3 +19,26 @@ class TestAccessor:
         with pytest.raises(AttributeError):
             da[key]
         return
+
+
+@pytest.mark.domainless
+def test_lazy_imports():
+    code = (
+        "import sys; import pywatershed; "
+        "print([mod for mod in ('flopy', 'geopandas', 'matplotlib', "
+        "'pandas', 'xarray') if mod in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    assert result.stdout.strip().split("\n")[-1] == "[]"
+
+    for name in pws._lazy_imports.keys():
+        assert name in dir(pws)
+    assert pws.CsvFile is pws.utils.CsvFile
+    with pytest.raises(AttributeError):
+        pws.not_an_attribute
+    return
@@ -1,3 +1,5 @@
+import pickle
+
 import pytest
 
 from pywatershed.base import meta
@@ -32,3 +34,51 @@ def test_get_in_list():
     # assert set(gw_param_meta.keys()) == set(gw_params)
 
     return
+
+
+@pytest.mark.domainless
+def test_metadata_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(meta, "cache_dir", tmp_path)
+    cache_file = meta.metadata_cache_file()
+    assert cache_file.parent == tmp_path
+    assert not cache_file.exists()
+
+    # parse the yaml and write the cache
+    metadata = meta._load_metadata()
+    assert cache_file.exists()
+    assert metadata == (
+        meta.dimensions,
+        meta.control,
+        meta.parameters,
+        meta.variables,
+    )
+
+    # read from the cache
+    assert meta._load_metadata() == metadata
+    with cache_file.open("wb") as file:
+        pickle.dump("cached", file)
+    assert meta._load_metadata() == "cached"
+
+    # the cache is invalidated by changes to the metadata files
+    meta_file = tmp_path / "variables.yaml"
+    meta_file.write_text(meta.vars_file.read_text() + "\n# edit\n")
+    monkeypatch.setattr(meta, "meta_files", (*meta.meta_files[0:3], meta_file))
+    assert meta.metadata_cache_file() != cache_file
+    assert meta._load_metadata() == metadata
+    return
+
+
+@pytest.mark.domainless
+def test_find_variables():
+    names = ["nhru", "seg_outflow", "start_time", "hru_area", "not_a_name"]
+    found = meta.find_variables(names)
+    assert list(found.keys()) == names[0:4]
+    assert found["nhru"] is meta.dimensions["nhru"]
+    assert found["seg_outflow"] is meta.variables["seg_outflow"]
+    assert found["start_time"] is meta.control["start_time"]
+    assert found["hru_area"] is meta.parameters["hru_area"]
+    assert meta.find_variables("nhru") == {"nhru": meta.dimensions["nhru"]}
+    assert list(meta.get_params("K_coef").keys()) == ["K_coef"]
+    assert meta.is_available("hru_area")
+    assert not meta.is_available("not_a_name")
+    return
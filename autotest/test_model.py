@@ -0,0 +1,624 @@
+import pathlib as pl
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import pywatershed as pws
+
+n_time_steps = 30
+
+
+@pytest.fixture(scope="function")
+def process_list(simulation):
+    control = pws.Control.load_prms(
+        simulation["control_file"], warn_unused_options=False
+    )
+
+    if (
+        "dprst_flag" in control.options.keys()
+        and control.options["dprst_flag"]
+    ):
+        Runoff = pws.PRMSRunoff
+        Soilzone = pws.PRMSSoilzone
+        Groundwater = pws.PRMSGroundwater
+
+    else:
+        Runoff = pws.PRMSRunoffNoDprst
+        Soilzone = pws.PRMSSoilzoneNoDprst
+        Groundwater = pws.PRMSGroundwaterNoDprst
+
+    process_list = [
+        pws.PRMSSolarGeometry,
+        pws.PRMSAtmosphere,
+        pws.PRMSCanopy,
+        pws.PRMSSnow,
+        Runoff,
+        Soilzone,
+        Groundwater,
+    ]
+
+    if control.options["streamflow_module"] != "strmflow":
+        process_list += [pws.PRMSChannel]
+    return process_list
+
+
+def get_control(simulation, **control_opts):
+    control = pws.Control.load_prms(
+        simulation["control_file"], warn_unused_options=False
+    )
+    control.edit_n_time_steps(n_time_steps)
+    control.options["budget_type"] = "warn"
+    control.options["calc_method"] = "numba"
+    control.options["input_dir"] = simulation["dir"]
+    del control.options["netcdf_output_var_names"]
+    del control.options["netcdf_output_dir"]
+    for kk, vv in control_opts.items():
+        control.options[kk] = vv
+    return control
+
+
+def get_parameters(simulation):
+    control = pws.Control.load_prms(
+        simulation["control_file"], warn_unused_options=False
+    )
+    param_file = simulation["dir"] / control.options["parameter_file"]
+    return pws.parameters.PrmsParameters.load(param_file)
+
+
+def get_model(simulation, process_list, **control_opts):
+    return pws.Model(
+        process_list,
+        control=get_control(simulation, **control_opts),
+        parameters=get_parameters(simulation),
+    )
+
+
+def assert_models_equal(model_0, model_1, timeseries_attr="data"):
+    for proc_name, proc_0 in model_0.processes.items():
+        proc_1 = model_1.processes[proc_name]
+        for var in proc_0.variables:
+            val_0 = proc_0[var]
+            val_1 = proc_1[var]
+            if isinstance(val_0, pws.TimeseriesArray):
+                val_0 = getattr(val_0, timeseries_attr)
+                val_1 = getattr(val_1, timeseries_attr)
+            np.testing.assert_equal(
+                val_0, val_1, err_msg=f"{proc_name}: {var}"
+            )
+    return
+
+
+def assert_output_dirs_equal(dir_0, dir_1):
+    files_0 = sorted(pl.Path(dir_0).glob("*.nc"))
+    assert len(files_0)
+    for ff in files_0:
+        with (
+            xr.open_dataset(ff) as ds_0,
+            xr.open_dataset(pl.Path(dir_1) / ff.name) as ds_1,
+        ):
+            xr.testing.assert_identical(ds_0, ds_1)
+    return
+
+
+def test_partitioned_model(simulation, process_list, tmp_path):
+    """HRU partitions run in worker processes route identically"""
+    if pws.PRMSChannel not in process_list:
+        pytest.skip("PartitionedModel requires a routing process")
+    if simulation["name"].split(":")[1] != "nhm":
+        pytest.skip("Only testing the nhm configuration for run time")
+
+    model = get_model(simulation, process_list)
+    model.run(finalize=True)
+
+    part_model = pws.PartitionedModel(
+        process_list,
+        control=get_control(simulation),
+        parameters=get_parameters(simulation),
+        n_partitions=2,
+        work_dir=tmp_path / "partitions",
+    )
+    part_model.run(netcdf_dir=tmp_path / "output", finalize=True)
+
+    channel = model.processes["PRMSChannel"]
+    for var in channel.variables:
+        np.testing.assert_equal(
+            channel[var], part_model.router[var], err_msg=var
+        )
+
+    for ipart in range(2):
+        assert (tmp_path / f"output/partition_{ipart}/hru_ppt.nc").exists()
+        # a work_dir passed in is kept
+        assert (tmp_path / f"partitions/partition_{ipart}").exists()
+    return
+
+
+def test_partitioned_model_work_dir(simulation, process_list):
+    """The default work directory is removed"""
+    if pws.PRMSChannel not in process_list:
+        pytest.skip("PartitionedModel requires a routing process")
+    if simulation["name"].split(":")[1] != "nhm":
+        pytest.skip("Only testing the nhm configuration for run time")
+
+    part_model = pws.PartitionedModel(
+        process_list,
+        control=get_control(simulation),
+        parameters=get_parameters(simulation),
+        n_partitions=2,
+    )
+    work_dir = part_model.work_dir
+    assert (work_dir / "partition_1/parameters.nc").exists()
+    part_model.close()
+    assert not work_dir.exists()
+    # closing again is harmless
+    part_model.close()
+
+    part_model = pws.PartitionedModel(
+        process_list,
+        control=get_control(simulation),
+        parameters=get_parameters(simulation),
+        n_partitions=2,
+    )
+    work_dir = part_model.work_dir
+    del part_model
+    assert not work_dir.exists()
+    return
+
+
+def assert_budgets_equal(model_0, model_1):
+    for proc_name, proc_0 in model_0.processes.items():
+        budget_0 = getattr(proc_0, "budget", None)
+        if budget_0 is None:
+            continue
+        budget_1 = model_1.processes[proc_name].budget
+        for comp, accums in budget_0.accumulations.items():
+            for var, accum in accums.items():
+                np.testing.assert_equal(
+                    accum,
+                    budget_1.accumulations[comp][var],
+                    err_msg=f"{proc_name}: {comp}: {var}",
+                )
+    return
+
+
+def test_model_checkpoint(simulation, process_list, tmp_path):
+    """Restarts from a checkpoint reproduce the continuous run"""
+    n_time_steps_0 = n_time_steps // 2
+    checkpoint_file = tmp_path / "checkpoint.nc"
+
+    model = get_model(simulation, process_list)
+    model.run(n_time_steps=n_time_steps_0, finalize=False)
+    model.checkpoint(checkpoint_file)
+    checkpoint_time = model.control.current_time
+    model.run(n_time_steps=n_time_steps - n_time_steps_0, finalize=True)
+
+    # resume within the period of the control
+    model_resume = pws.Model.from_checkpoint(
+        checkpoint_file,
+        process_list,
+        control=get_control(simulation),
+        parameters=get_parameters(simulation),
+    )
+    assert model_resume.control.current_time == checkpoint_time
+    model_resume.run(finalize=True)
+    assert model_resume.control.current_time == model.control.current_time
+    assert_models_equal(model, model_resume)
+    assert_budgets_equal(model, model_resume)
+
+    # warm start a control beginning after the checkpoint
+    control = get_control(simulation)
+    control_warm = pws.Control(
+        start_time=checkpoint_time + control.time_step,
+        end_time=control.end_time,
+        time_step=control.time_step,
+        options=control.options,
+    )
+    model_warm = pws.Model.from_checkpoint(
+        checkpoint_file,
+        process_list,
+        control=control_warm,
+        parameters=get_parameters(simulation),
+    )
+    assert model_warm.control.itime_step == -1
+    model_warm.run(finalize=True)
+    # the timeseries of the warm start only cover its period
+    assert_models_equal(model, model_warm, timeseries_attr="current")
+    assert_budgets_equal(model, model_warm)
+    return
+
+
+def test_model_checkpoint_transp(simulation, tmp_path):
+    """A warm start within the month transpiration begins continues the
+    transpiration switch from the checkpoint"""
+    process_list = [pws.PRMSSolarGeometry, pws.PRMSAtmosphere]
+    parameters = get_parameters(simulation)
+    transp_beg = np.bincount(parameters.parameters["transp_beg"]).argmax()
+
+    # checkpoint early in the month, where the switch is initialized to
+    # check the temperature sum rather than to be on
+    control = get_control(simulation)
+    control.edit_n_time_steps(366)
+    times = control.start_time + np.arange(control.n_times) * (
+        control.time_step
+    )
+    days = times.astype("datetime64[D]")
+    months = days.astype("datetime64[M]")
+    dom = (days - months).astype(int) + 1
+    month = months.astype(int) % 12 + 1
+    wh_checkpoint = np.where((month == transp_beg) & (dom == 5))[0]
+    if not len(wh_checkpoint):
+        pytest.skip("The simulation does not begin transpiration")
+    n_time_steps_0 = wh_checkpoint[0] + 1
+    n_time_steps_1 = 20
+    control.edit_n_time_steps(n_time_steps_0 + n_time_steps_1)
+    checkpoint_file = tmp_path / "checkpoint.nc"
+
+    model = pws.Model(process_list, control=control, parameters=parameters)
+    model.run(n_time_steps=n_time_steps_0, finalize=False)
+    model.checkpoint(checkpoint_file)
+    checkpoint_time = model.control.current_time
+    atm = model.processes["PRMSAtmosphere"]
+    assert atm.transp_on.current.any()
+
+    control_warm = pws.Control(
+        start_time=checkpoint_time + control.time_step,
+        end_time=control.end_time,
+        time_step=control.time_step,
+        options=control.options,
+    )
+    model_warm = pws.Model.from_checkpoint(
+        checkpoint_file,
+        process_list,
+        control=control_warm,
+        parameters=get_parameters(simulation),
+    )
+    atm_warm = model_warm.processes["PRMSAtmosphere"]
+    for istep in range(n_time_steps_1):
+        for mm in [model, model_warm]:
+            mm.advance()
+            mm.calculate()
+        for var in ["_transp_check", "_tmax_sum"]:
+            np.testing.assert_equal(atm_warm[var], atm[var], err_msg=var)
+        np.testing.assert_equal(
+            atm_warm.transp_on.current, atm.transp_on.current
+        )
+    return
+
+
+def test_model_forcing_memory_budget(simulation, process_list, tmp_path):
+    """Forcings calculated in time windows give identical results, output
+    and restarts"""
+    from pywatershed.atmosphere.prms_atmosphere import n_window_temporaries
+
+    # windows of 7 time steps, the last window is shorter
+    n_window = 7
+    nhru = get_parameters(simulation).dims["nhru"]
+    n_arrays = (
+        len(pws.PRMSAtmosphere.get_variables()) + 3 + n_window_temporaries
+    )
+    budget = n_window * nhru * n_arrays * 8
+
+    out_dirs = {}
+    models = {}
+    for name, opts in {
+        "all": {},
+        "win": {"forcing_memory_budget": budget},
+    }.items():
+        out_dirs[name] = pl.Path(tmp_path) / name
+        models[name] = get_model(simulation, process_list, **opts)
+        models[name].run(netcdf_dir=out_dirs[name], finalize=True)
+
+    atm_win = models["win"].processes["PRMSAtmosphere"]
+    assert atm_win._windowed
+    assert atm_win.tmaxf.data.shape == (n_time_steps % n_window, nhru)
+    assert_models_equal(models["all"], models["win"], "current")
+    assert_output_dirs_equal(out_dirs["all"], out_dirs["win"])
+
+    # resume within a window, the first window starts after the checkpoint
+    n_time_steps_0 = 10
+    checkpoint_file = tmp_path / "checkpoint.nc"
+    model = get_model(simulation, process_list, forcing_memory_budget=budget)
+    model.run(n_time_steps=n_time_steps_0, finalize=False)
+    model.checkpoint(checkpoint_file)
+    model_resume = pws.Model.from_checkpoint(
+        checkpoint_file,
+        process_list,
+        control=get_control(simulation, forcing_memory_budget=budget),
+        parameters=get_parameters(simulation),
+    )
+    model_resume.run(finalize=True)
+    atm_resume = model_resume.processes["PRMSAtmosphere"]
+    assert atm_resume.tmaxf.data_start == n_time_steps_0 + 2 * n_window
+    assert_models_equal(models["all"], model_resume, "current")
+    return
+
+
+def test_model_profile(simulation, process_list, tmp_path):
+    """Profiling does not change results and times every phase"""
+    import json
+    import pstats
+
+    model = get_model(simulation, process_list)
+    model.run(finalize=True)
+
+    model_prof = get_model(simulation, process_list)
+    profile_file = tmp_path / "model.prof"
+    model_prof.run(
+        finalize=True,
+        profile=True,
+        profile_window=(2, 4),
+        profile_file=profile_file,
+    )
+    assert_models_equal(model, model_prof)
+
+    timers = model_prof.timers.to_dict()
+    assert timers["Control"]["advance"]["calls"] == n_time_steps
+    for cls in model_prof.process_order:
+        assert timers[cls]["advance"]["calls"] == n_time_steps
+        assert timers[cls]["calculate"]["calls"] == n_time_steps
+        assert timers[cls]["finalize"]["calls"] == 1
+        if getattr(model_prof.processes[cls], "budget", None) is not None:
+            for phase in ["budget_advance", "budget_calculate"]:
+                assert timers[cls][phase]["calls"] == n_time_steps
+    for name in model_prof._file_input_adapters.keys():
+        adapter_timer = timers[f"AdapterNetcdf:{name}"]["advance"]
+        assert adapter_timer["calls"] == n_time_steps
+
+    df = model_prof.timers.to_dataframe()
+    assert len(df) == sum(len(phases) for phases in timers.values())
+    np.testing.assert_allclose(df["fraction"].sum(), 1.0)
+
+    json_file = tmp_path / "timers.json"
+    model_prof.timers.to_json(json_file)
+    with open(json_file) as file:
+        assert json.load(file) == timers
+
+    stats = pstats.Stats(str(profile_file))
+    assert stats.total_calls > 0
+    return
+
+
+def test_model_prefetch(simulation, process_list):
+    """Time batched input read ahead in the background gives same results"""
+    model = get_model(simulation, process_list)
+    model.run(finalize=True)
+
+    model_prefetch = get_model(
+        simulation,
+        process_list,
+        load_n_time_batches=3,
+        prefetch_n_batches=1,
+    )
+    for adapter in model_prefetch._file_input_adapters.values():
+        assert adapter._nc_read._prefetch_n_batches == 1
+    model_prefetch.run(finalize=True)
+    assert_models_equal(model, model_prefetch)
+    return
+
+
+def test_model_input_memory_budget(simulation, process_list):
+    """Input time batches sized from a memory budget give same results"""
+    model = get_model(simulation, process_list)
+    model.run(finalize=True)
+
+    nhru = model.processes[model.process_order[0]].nhru
+    # 8 byte inputs, room for about 7 times of each input and its prefetch
+    n_inputs = len(model._file_input_adapters)
+    budget = 7 * 2 * n_inputs * nhru * 8
+    model_budget = get_model(
+        simulation,
+        process_list,
+        input_memory_budget=budget,
+        prefetch_n_batches=1,
+    )
+    plan = model_budget.input_batch_plan
+    for name, adapter in model_budget._file_input_adapters.items():
+        if name not in plan.keys():
+            continue
+        assert adapter._nc_read._load_n_times == plan[name]["load_n_times"]
+        assert plan[name]["n_batches"] > 1
+    total_bytes = 2 * sum(pp["batch_bytes"] for pp in plan.values())
+    assert total_bytes <= budget
+
+    model_budget.run(finalize=True, profile=True)
+    assert_models_equal(model, model_budget)
+    for name, info in plan.items():
+        assert model_budget.timers.annotations[f"AdapterNetcdf:{name}"] == (
+            info
+        )
+    return
+
+
+@pytest.mark.parametrize(
+    "write_opts",
+    [
+        {"netcdf_buffer_n_times": 7},
+        {"netcdf_write_queue_size": 4},
+        {"netcdf_buffer_n_times": 7, "netcdf_write_queue_size": 4},
+        {"netcdf_output_layout": "timeseries-read-optimized"},
+    ],
+    ids=["buffer", "background", "buffer_background", "layout"],
+)
+def test_model_netcdf_write_opts(
+    simulation, process_list, tmp_path, write_opts
+):
+    """Buffered, background, and chunked NetCDF output give identical files"""
+    out_dirs = {}
+    for name, opts in {"inline": {}, "opts": write_opts}.items():
+        out_dirs[name] = pl.Path(tmp_path) / name
+        model = get_model(simulation, process_list, **opts)
+        model.run(netcdf_dir=out_dirs[name], finalize=True)
+
+    assert len(list(out_dirs["opts"].glob("*_budget.nc")))
+    assert_output_dirs_equal(out_dirs["inline"], out_dirs["opts"])
+    return
+
+
+def test_model_output_aggregation(simulation, process_list, tmp_path):
+    """Aggregated output matches statistics of the time step output"""
+    stats = ["sum", "mean", "min", "max"]
+    control = get_control(simulation)
+    # custom periods of 10 days
+    period_starts = control.start_time + np.arange(0, n_time_steps, 10) * (
+        control.time_step
+    )
+    aggregation = {"period": period_starts, "stats": stats}
+
+    out_dirs = {}
+    for name, agg in {"daily": None, "agg": aggregation}.items():
+        out_dirs[name] = pl.Path(tmp_path) / name
+        model = get_model(simulation, process_list)
+        model.run(
+            netcdf_dir=out_dirs[name],
+            finalize=True,
+            output_aggregation=agg,
+        )
+
+    agg_vars = []
+    for ff in sorted(out_dirs["agg"].glob("*.nc")):
+        var = ff.stem
+        with (
+            xr.open_dataset(out_dirs["daily"] / ff.name) as ds_daily,
+            xr.open_dataset(ff) as ds_agg,
+        ):
+            if f"{var}_sum" not in ds_agg.variables:
+                # budgets
+                continue
+            agg_vars.append(var)
+            np.testing.assert_equal(
+                ds_agg.time.values, period_starts.astype(ds_agg.time.dtype)
+            )
+            daily = ds_daily[var].values
+            for stat in stats:
+                assert ds_agg[f"{var}_{stat}"].cell_methods == f"time: {stat}"
+                answer = np.stack(
+                    [
+                        getattr(np, stat)(daily[istart : istart + 10], axis=0)
+                        for istart in range(0, n_time_steps, 10)
+                    ]
+                )
+                np.testing.assert_allclose(
+                    ds_agg[f"{var}_{stat}"].values,
+                    answer,
+                    rtol=1e-12,
+                    err_msg=f"{var}_{stat}",
+                )
+    # the processes calculating all time also aggregate their output
+    for process in [pws.PRMSAtmosphere, pws.PRMSSolarGeometry]:
+        assert set(process.get_variables()) <= set(agg_vars)
+    return
+
+
+def test_model_output_backend_zarr(simulation, process_list, tmp_path):
+    """Zarr output stores match the NetCDF output files"""
+    pytest.importorskip("zarr")
+    out_dirs = {}
+    for backend in ["netcdf", "zarr"]:
+        out_dirs[backend] = pl.Path(tmp_path) / backend
+        model = get_model(simulation, process_list, output_backend=backend)
+        model.run(netcdf_dir=out_dirs[backend], finalize=True)
+
+    nc_files = sorted(out_dirs["netcdf"].glob("*.nc"))
+    zarr_stores = sorted(out_dirs["zarr"].glob("*.zarr"))
+    assert [ff.stem for ff in nc_files] == [ss.stem for ss in zarr_stores]
+    assert len(list(out_dirs["zarr"].glob("*_budget.zarr")))
+    for nc_file, zarr_store in zip(nc_files, zarr_stores):
+        with (
+            xr.open_dataset(nc_file) as ds_nc,
+            xr.open_zarr(zarr_store) as ds_zarr,
+        ):
+            for var in ds_nc.data_vars:
+                np.testing.assert_equal(
+                    ds_zarr[var].values, ds_nc[var].values, err_msg=var
+                )
+                assert ds_zarr[var].dims == ds_nc[var].dims
+            for coord in ds_nc.coords:
+                np.testing.assert_equal(
+                    ds_zarr[coord].values, ds_nc[coord].values
+                )
+    return
+
+
+def test_model_output_spatial_subset(simulation, process_list, tmp_path):
+    """Spatially subset output matches the selection of the full output"""
+    params = get_parameters(simulation)
+    seg_ids = params.coords["nhm_seg"][::7]
+    hru_mask = np.zeros(len(params.coords["nhm_id"]), dtype=bool)
+    hru_mask[[0, 3, 4]] = True
+    spatial_subset = {
+        "nhm_seg": seg_ids,
+        "nhm_id": hru_mask,
+        # a variable selection takes precedence over its coordinate
+        "tmaxf": params.coords["nhm_id"][-2:],
+    }
+
+    out_dirs = {}
+    for name, subset in {"full": None, "subset": spatial_subset}.items():
+        out_dirs[name] = pl.Path(tmp_path) / name
+        model = get_model(simulation, process_list)
+        model.initialize_netcdf(out_dirs[name], spatial_subset=subset)
+        model.run(finalize=True)
+
+    for ff in sorted(out_dirs["subset"].glob("*.nc")):
+        with (
+            xr.open_dataset(out_dirs["full"] / ff.name) as ds_full,
+            xr.open_dataset(ff) as ds_subset,
+        ):
+            if "nhm_seg" in ds_full.dims:
+                selection = {"nhm_seg": seg_ids}
+            elif ff.stem == "tmaxf":
+                selection = {"nhm_id": params.coords["nhm_id"][-2:]}
+            elif "nhm_id" in ds_full.dims:
+                selection = {"nhm_id": params.coords["nhm_id"][hru_mask]}
+            else:
+                selection = {}
+            for coord, ids in selection.items():
+                np.testing.assert_equal(ds_subset[coord].values, ids)
+            xr.testing.assert_equal(ds_subset, ds_full.sel(selection))
+
+    with pytest.raises(ValueError):
+        model = get_model(simulation, process_list)
+        model.initialize_netcdf(
+            pl.Path(tmp_path) / "bad",
+            spatial_subset={"nhm_seg": np.array([-1])},
+        )
+    return
+
+
+@pytest.mark.parametrize("memory_dtype", [None, np.float32])
+def test_model_memory_output(simulation, process_list, tmp_path, memory_dtype):
+    """Variables held in memory match the NetCDF output"""
+    memory_vars = ["tmaxf", "hru_intcpstor", "soltab_potsw"]
+    model = get_model(simulation, process_list)
+    result = model.run(
+        netcdf_dir=tmp_path,
+        output_vars=memory_vars,
+        memory_vars=memory_vars,
+        memory_dtype=memory_dtype,
+        memory_as_xarray=memory_dtype is not None,
+    )
+    if memory_dtype is None:
+        assert isinstance(result, dict)
+        result = xr.Dataset(
+            {var: (("time", "nhm_id"), arr) for var, arr in result.items()}
+        )
+    else:
+        assert isinstance(result, xr.Dataset)
+        np.testing.assert_equal(
+            result.nhm_id.values, model.memory_output._coords["nhm_id"]
+        )
+
+    for var in memory_vars:
+        assert result[var].shape[0] == n_time_steps
+        if memory_dtype is not None:
+            assert result[var].dtype == memory_dtype
+        if var == "soltab_potsw":
+            # written by day of year
+            continue
+        with xr.open_dataarray(pl.Path(tmp_path) / f"{var}.nc") as da:
+            np.testing.assert_allclose(
+                result[var].values,
+                da.values,
+                rtol=1e-6 if memory_dtype is not None else 0,
+            )
+    return
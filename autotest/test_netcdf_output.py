@@ -1,3 +1,4 @@
+import datetime as dt
 import pathlib as pl
 import shutil
 from copy import deepcopy
@@ -11,6 +12,11 @@ import pywatershed
 from pywatershed.base.control import Control
 from pywatershed.base.model import Model
 from pywatershed.parameters import PrmsParameters
+from pywatershed.utils.netcdf_utils import (
+    BackgroundWriter,
+    NetCdfWrite,
+    output_layout,
+)
 from pywatershed.utils.time_utils import datetime_doy as doy
 
 # test for a few timesteps a model with both unit/cell and global balance
@@ -357,3 +363,187 @@ def test_separate_together_var_list(
 
             del ds
     return
+
+
+def test_background_writer():
+    writer = BackgroundWriter(max_queued=2)
+    result = []
+    for ii in range(10):
+        writer.submit(result.append, ii)
+    writer.drain()
+    assert result == list(range(10))
+
+    class Owner:
+        def __init__(self, name):
+            self._store_name = name
+            self.written = []
+
+        def write(self, ii):
+            self.written.append(ii)
+
+        def fail(self):
+            raise ValueError("write failed")
+
+    # a failed write is tied to its owner
+    failed = Owner("failed.nc")
+    other = Owner("other.nc")
+    failed.write(0)
+    writer.submit(failed.fail)
+    writer.drain(other)
+    for ii in range(3):
+        # sticky for the owner until drained
+        with pytest.raises(RuntimeError, match="failed.nc"):
+            writer.submit(failed.write, ii)
+        writer.submit(other.write, ii)
+    # the writes of the failed owner are skipped, always calls run
+    writer.submit(failed.write, 10, always=True)
+    writer.drain(other)
+    assert other.written == [0, 1, 2]
+    assert failed.written == [0, 10]
+    with pytest.raises(RuntimeError, match="failed.nc"):
+        writer.drain(failed)
+    writer.submit(failed.write, 11)
+    writer.drain()
+    assert failed.written == [0, 10, 11]
+
+    # close raises the failures of all owners
+    writer.submit(other.fail)
+    with pytest.raises(RuntimeError, match="other.nc"):
+        writer.close()
+    with pytest.raises(RuntimeError):
+        writer.submit(result.append, 10)
+
+
+def test_background_writer_failed_file(tmp_path):
+    # a failed background write makes closing its file fail, the file is
+    # closed and other files are written
+    writer = BackgroundWriter()
+    meta = {"x": {"dims": ("nhru",), "type": "float64", "units": "in"}}
+    ncs = {
+        name: NetCdfWrite(
+            tmp_path / f"{name}.nc",
+            {"nhm_id": np.arange(5) + 1},
+            ["x"],
+            meta,
+            writer=writer,
+        )
+        for name in ["bad", "good"]
+    }
+    for itime in range(3):
+        time = dt.datetime(2000, 1, 1) + dt.timedelta(days=itime)
+        for name, nc in ncs.items():
+            if name == "bad" and itime == 2:
+                # every later write of the failed file raises
+                with pytest.raises(RuntimeError, match="bad.nc"):
+                    nc.add_simulation_time(itime, time)
+                with pytest.raises(RuntimeError, match="bad.nc"):
+                    nc.add_data("x", itime, np.ones(5))
+                continue
+            nc.add_simulation_time(itime, time)
+            if name == "bad" and itime == 1:
+                # the wrong shape fails in the writer thread
+                nc.add_data("x", itime, np.ones(7))
+                writer.drain(ncs["good"])
+                continue
+            nc.add_data("x", itime, np.full(5, itime))
+
+    ncs["good"].close()
+    with pytest.raises(RuntimeError, match="bad.nc"):
+        ncs["bad"].close()
+    assert not ncs["bad"]._is_open()
+    writer.close()
+
+    with xr.open_dataset(tmp_path / "good.nc") as ds:
+        np.testing.assert_equal(ds.x.values[:, 0], [0, 1, 2])
+
+
+layouts = {
+    "none": None,
+    "write": "write-optimized",
+    "read": "timeseries-read-optimized",
+    "explicit": {
+        "chunk_sizes": {"time": 4, "space": 3},
+        "complevel": 9,
+        "shuffle": False,
+        "float32": True,
+        "least_significant_digit": 2,
+    },
+}
+
+
+@pytest.mark.parametrize("layout", layouts.values(), ids=layouts.keys())
+def test_netcdf_write_layout(tmp_path, layout):
+    n_times, n_hru = 10, 5
+    meta = {"x": {"dims": ("nhru",), "type": "float64", "units": "in"}}
+    data = np.random.default_rng(0).random((n_times, n_hru)) * 100
+    nc_file = pl.Path(tmp_path) / "x.nc"
+    nc = NetCdfWrite(
+        nc_file, {"nhm_id": np.arange(n_hru) + 1}, ["x"], meta, layout=layout
+    )
+    for itime in range(n_times):
+        nc.add_simulation_time(
+            itime, dt.datetime(2000, 1, 1) + dt.timedelta(days=itime)
+        )
+        nc.add_data("x", itime, data[itime])
+    nc.close()
+
+    with xr.open_dataset(nc_file) as ds:
+        encoding = ds.x.encoding
+        if layout is None:
+            np.testing.assert_equal(ds.x.values, data)
+            assert encoding["zlib"]
+            return
+
+        expected = output_layout(layout)
+        chunks = [
+            size if size else n_hru
+            for size in expected["chunk_sizes"].values()
+        ]
+        assert encoding["chunksizes"] == (chunks[0], min(chunks[1], n_hru))
+        assert encoding["zlib"] == expected["zlib"]
+        assert encoding["shuffle"] == expected["shuffle"]
+        if expected["float32"]:
+            assert encoding["dtype"] == np.float32
+            np.testing.assert_allclose(ds.x.values, data, atol=1e-2)
+        else:
+            np.testing.assert_equal(ds.x.values, data)
+
+    with pytest.raises(ValueError):
+        output_layout({"profile": "read-optimized"})
+    with pytest.raises(ValueError):
+        output_layout({"chunksize": 10})
+
+
+@pytest.mark.parametrize("layout", layouts.values(), ids=layouts.keys())
+def test_netcdf_write_blocks(tmp_path, layout):
+    n_times, n_hru = 10, 5
+    meta = {"x": {"dims": ("nhru",), "type": "float64", "units": "in"}}
+    data = np.random.default_rng(0).random((n_times, n_hru)) * 100
+    times = np.datetime64("2000-01-01") + np.arange(n_times).astype(
+        "timedelta64[D]"
+    )
+    nc_file = pl.Path(tmp_path) / "x.nc"
+    writer = BackgroundWriter()
+    nc = NetCdfWrite(
+        nc_file,
+        {"nhm_id": np.arange(n_hru) + 1},
+        ["x"],
+        meta,
+        writer=writer,
+        spatial_subset={"nhm_id": [2, 4]},
+        layout=layout,
+    )
+    # two windows written in blocks of 3 (rounded up to time chunks)
+    for start, stop in [(0, 6), (6, n_times)]:
+        nc.add_time_block(start, times[start:stop])
+        nc.add_data_block("x", start, data[start:stop], block_n_times=3)
+    nc.close()
+    writer.close()
+
+    with xr.open_dataset(nc_file) as ds:
+        np.testing.assert_equal(ds.time.values, times)
+        np.testing.assert_equal(ds.nhm_id.values, [2, 4])
+        np.testing.assert_allclose(ds.x.values, data[:, [1, 3]], atol=1e-2)
+
+    with pytest.raises(KeyError):
+        nc.add_data_block("y", 0, data)
@@ -19,3 +19,32 @@ def test_netcdf(simulation):
     shape = (ntimes, nhru)
     arr = nc_data.get_data(variable)
     assert arr.shape == shape, f"shape is {arr.shape} but should be {shape}"
+
+
+def test_netcdf_prefetch(simulation):
+    variable = "gwres_stor"
+    output_dir = simulation["output_dir"]
+    nc_pth = output_dir / f"{variable}.nc"
+
+    nc_data = NetCdfRead(nc_pth)
+    ntimes = nc_data.ntimes
+    answer = nc_data.get_data(variable)
+    nc_data.close()
+
+    nc_prefetch = NetCdfRead(
+        nc_pth, load_n_time_batches=7, prefetch_n_batches=2
+    )
+    for idx in range(ntimes):
+        arr = nc_prefetch.advance(variable)
+        assert (arr == answer[idx, :]).all()
+        # bounded: at most prefetch_n_batches in flight
+        assert len(nc_prefetch._prefetched.get(variable, {})) <= 2
+
+    # start mid-stream, as after a restart, discarding the prefetched batches
+    nc_prefetch._itime_step[variable] = 3
+    for idx in range(3, 10):
+        arr = nc_prefetch.advance(variable)
+        assert (arr == answer[idx, :]).all()
+
+    nc_prefetch.close()
+    assert nc_prefetch._executor is None
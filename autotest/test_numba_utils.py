@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+
+from pywatershed.utils import (
+    get_numba_cache_dir,
+    numba_utils,
+    set_numba_cache_dir,
+)
+from pywatershed.utils.numba_utils import (
+    bind_functions,
+    njit,
+    njit_functions,
+)
+
+
+def add_one(arr):
+    return arr + 1.0
+
+
+def _add_one(val):
+    return val + 1.0
+
+
+def _add_two(val):
+    return _add_one(_add_one(val))
+
+
+def kernel(arr):
+    out = np.empty_like(arr)
+    for ii in range(arr.shape[0]):
+        out[ii] = _add_two(arr[ii])
+    return out
+
+
+def _add_ten(val):
+    return val + 10.0
+
+
+def kernel_functions(add_one=_add_one):
+    return {
+        "kernel": (kernel, {"fastmath": True}),
+        "_add_two": (_add_two, {}),
+        "_add_one": (add_one, {}),
+    }
+
+
+def jit_kernel():
+    return njit_functions(kernel_functions())["kernel"]
+
+
+@pytest.fixture(scope="function")
+def cache_dir(tmp_path):
+    set_numba_cache_dir(tmp_path)
+    yield tmp_path
+    set_numba_cache_dir(None)
+
+
+@pytest.mark.domainless
+def test_numba_cache(cache_dir):
+    keyed_dir = get_numba_cache_dir()
+    assert keyed_dir.is_relative_to(cache_dir.resolve())
+    # keyed by the CPU features rather than the CPU name
+    from llvmlite import binding as llvm
+
+    assert llvm.get_host_cpu_name() not in keyed_dir.name
+
+    jitted = njit("float64[:](float64[:])", fastmath=True)(add_one)
+    assert len(jitted.stats.cache_misses) == 1
+    assert len(list(keyed_dir.glob("**/*.nbi"))) == 1
+
+    # a new python process loads from the cache instead of compiling
+    numba_utils._dispatchers.clear()
+    jitted = njit("float64[:](float64[:])", fastmath=True)(add_one)
+    assert len(jitted.stats.cache_hits) == 1
+    assert len(jitted.stats.cache_misses) == 0
+
+    np.testing.assert_equal(jitted(np.zeros(3)), np.ones(3))
+    return
+
+
+@pytest.mark.domainless
+def test_numba_no_cache():
+    assert get_numba_cache_dir() is None
+    jitted = njit(add_one)
+    np.testing.assert_equal(jitted(np.zeros(3)), np.ones(3))
+    assert jitted.stats.cache_path is None
+    return
+
+
+@pytest.mark.domainless
+def test_njit_functions_cache(cache_dir):
+    jitted = jit_kernel()
+    np.testing.assert_equal(jitted(np.zeros(3)), np.full(3, 2.0))
+    assert len(jitted.stats.cache_misses) == 1
+    # the module keeps the python functions
+    assert not hasattr(_add_two, "py_func")
+    np.testing.assert_equal(kernel(np.zeros(3)), np.full(3, 2.0))
+
+    # the same dispatcher is returned in this python process
+    assert jit_kernel() is jitted
+
+    # a new python process loads the kernel from the cache, the functions
+    # it calls are not compiled
+    numba_utils._dispatchers.clear()
+    numba_utils._function_dispatchers.clear()
+    jitted = jit_kernel()
+    np.testing.assert_equal(jitted(np.zeros(3)), np.full(3, 2.0))
+    assert len(jitted.stats.cache_hits) == 1
+    assert len(jitted.stats.cache_misses) == 0
+    return
+
+
+@pytest.mark.domainless
+def test_njit_functions_override(cache_dir):
+    # overriding a helper, as a subclass would, is not cached on disk
+    jitted = njit_functions(kernel_functions(_add_ten))["kernel"]
+    np.testing.assert_equal(jitted(np.zeros(3)), np.full(3, 20.0))
+    assert jitted.stats.cache_path is None
+    assert len(list(cache_dir.glob("**/*.nbi"))) == 0
+
+    # and is not loaded for the kernel without the override
+    jitted = jit_kernel()
+    np.testing.assert_equal(jitted(np.zeros(3)), np.full(3, 2.0))
+    assert len(jitted.stats.cache_misses) == 1
+    assert len(list(cache_dir.glob("**/*.nbi"))) > 0
+
+    # the python functions bound for calc_method="numpy" use the override
+    bound = bind_functions(kernel_functions(_add_ten))["kernel"]
+    np.testing.assert_equal(bound(np.zeros(3)), np.full(3, 20.0))
+    assert not hasattr(bound, "py_func")
+    bound = bind_functions(kernel_functions())["kernel"]
+    np.testing.assert_equal(bound(np.zeros(3)), np.full(3, 2.0))
+    np.testing.assert_equal(kernel(np.zeros(3)), np.full(3, 2.0))
+    return
@@ -1,10 +1,15 @@
+from copy import deepcopy
 from warnings import warn
 
 import numpy as np
 import pytest
+import xarray as xr
 from utils_compare import compare_in_memory, compare_netcdfs
 
-from pywatershed.atmosphere.prms_atmosphere import PRMSAtmosphere
+from pywatershed.atmosphere.prms_atmosphere import (
+    PRMSAtmosphere,
+    n_window_temporaries,
+)
 from pywatershed.base.adapter import adapter_factory
 from pywatershed.base.control import Control
 from pywatershed.base.parameters import Parameters
@@ -155,3 +160,65 @@ def test_compare_prms(
         )
 
     return
+
+
+def test_forcing_memory_budget(
+    simulation, control, discretization, parameters, tmp_path
+):
+    input_variables = {}
+    for key in PRMSAtmosphere.get_inputs():
+        if "soltab" in key:
+            input_variables[key] = simulation["output_dir"] / f"{key}.nc"
+        else:
+            input_variables[key] = simulation["dir"] / f"{key}.nc"
+
+    # a budget for windows of 100 time steps, the last window is shorter
+    n_window = 100
+    nhru = discretization.dims["nhru"]
+    n_arrays = len(PRMSAtmosphere.get_variables()) + 3 + n_window_temporaries
+    budget = n_window * nhru * n_arrays * 8
+
+    atm_all = PRMSAtmosphere(
+        control=control,
+        discretization=discretization,
+        parameters=parameters,
+        **input_variables,
+    )
+    control_win = deepcopy(control)
+    atm_win = PRMSAtmosphere(
+        control=control_win,
+        discretization=discretization,
+        parameters=parameters,
+        **input_variables,
+        forcing_memory_budget=budget,
+    )
+    assert not atm_all._windowed
+    assert atm_win._windowed
+    assert atm_win.tmaxf.data.shape == (n_window, nhru)
+
+    for name, atm in [("all", atm_all), ("win", atm_win)]:
+        (tmp_path / name).mkdir()
+        atm.initialize_netcdf(output_dir=tmp_path / name)
+
+    for istep in range(control.n_times):
+        for ctl, atm in [(control, atm_all), (control_win, atm_win)]:
+            ctl.advance()
+            atm.advance()
+            atm.calculate(1.0)
+        # all time is written at once without windows
+        if istep == 0:
+            atm_all.output()
+        atm_win.output()
+
+        for var in PRMSAtmosphere.get_variables():
+            assert (atm_win[var].current == atm_all[var].current).all()
+
+    atm_all.finalize()
+    atm_win.finalize()
+
+    for var in PRMSAtmosphere.get_variables():
+        with xr.open_dataarray(tmp_path / f"all/{var}.nc") as da_all:
+            with xr.open_dataarray(tmp_path / f"win/{var}.nc") as da_win:
+                xr.testing.assert_equal(da_win, da_all)
+
+    return
@@ -1,12 +1,17 @@
 import pathlib as pl
 
+import numpy as np
 import pytest
 from utils_compare import compare_in_memory, compare_netcdfs
 
 from pywatershed.base.adapter import adapter_factory
 from pywatershed.base.control import Control
 from pywatershed.base.parameters import Parameters
-from pywatershed.hydrology.prms_channel import PRMSChannel, has_prmschannel_f
+from pywatershed.hydrology.prms_channel import (
+    HruSegmentMap,
+    PRMSChannel,
+    has_prmschannel_f,
+)
 from pywatershed.parameters import PrmsParameters
 
 # compare in memory (faster) or full output files? or both!
@@ -122,3 +127,105 @@ def test_compare_prms(
         )
 
     return
+
+
+@pytest.mark.parametrize("method", ("serial", "levels", "components"))
+def test_muskingum_mann_schedule(simulation, control, discretization, method):
+    # scheduled routing, in parallel, is identical to routing in segment
+    # order
+    import numba as nb
+
+    from pywatershed.utils.topology import routing_schedule
+
+    output_dir = simulation["output_dir"]
+    parameters = PrmsParameters.from_netcdf(
+        simulation["dir"] / "parameters_PRMSChannel.nc"
+    )
+    input_variables = {
+        key: output_dir / f"{key}.nc" for key in PRMSChannel.get_inputs()
+    }
+    channel = PRMSChannel(
+        control,
+        discretization,
+        parameters,
+        **input_variables,
+        calc_method="numba",
+    )
+
+    serial = nb.njit(fastmath=True)(PRMSChannel._muskingum_mann_numpy)
+    scheduled = nb.njit(fastmath=True, parallel=True)(
+        PRMSChannel._muskingum_mann_schedule
+    )
+    schedule = routing_schedule(
+        channel._segment_order, channel._tosegment, n_parts=4, method=method
+    )
+
+    for istep in range(100):
+        control.advance()
+        channel.advance()
+        # the state before routing the time step
+        state = (
+            channel._seg_inflow0.copy(),
+            channel._outflow_ts.copy(),
+        )
+        channel.calculate(float(istep))
+        coefs = (
+            channel._tsi,
+            channel._ts,
+            channel._c0,
+            channel._c1,
+            channel._c2,
+        )
+
+        results_serial = serial(
+            channel._segment_order,
+            channel._tosegment,
+            channel.seg_lateral_inflow,
+            *(arr.copy() for arr in state),
+            *coefs,
+        )
+        results_scheduled = scheduled(
+            *schedule,
+            channel._upstream_offsets,
+            channel._upstream_segments,
+            channel.seg_lateral_inflow,
+            *(arr.copy() for arr in state),
+            *coefs,
+        )
+        for res_serial, res_sched in zip(results_serial, results_scheduled):
+            np.testing.assert_equal(res_serial, res_sched)
+
+        np.testing.assert_equal(channel.seg_outflow, results_serial[3])
+
+    return
+
+
+def test_hru_segment_map():
+    rng = np.random.default_rng(0)
+    nhru = 50
+    nsegment = 10
+    # zero is an HRU not flowing to a segment
+    hru_segment = rng.integers(0, nsegment + 1, nhru)
+    hru_area = rng.random(nhru)
+    values = rng.random((3, 4, nhru))
+
+    hru_segment_map = HruSegmentMap(hru_segment, nsegment, hru_area=hru_area)
+
+    # the loop over HRUs this replaces
+    answers = np.zeros((3, 4, nsegment))
+    answers_unmapped = np.zeros((3, 4, nhru))
+    for ihru in range(nhru):
+        iseg = hru_segment[ihru] - 1
+        if iseg < 0:
+            answers_unmapped[..., ihru] = values[..., ihru] * hru_area[ihru]
+            continue
+        answers[..., iseg] += values[..., ihru] * hru_area[ihru]
+
+    np.testing.assert_equal(hru_segment_map.segment_sums(values), answers)
+    np.testing.assert_equal(hru_segment_map.unmapped(values), answers_unmapped)
+
+    # a single time step in place
+    out = np.full(nsegment, np.nan)
+    result = hru_segment_map.segment_sums(values[1, 2], out=out)
+    assert result is out
+    np.testing.assert_equal(out, answers[1, 2])
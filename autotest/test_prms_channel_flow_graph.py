@@ -205,6 +205,138 @@ def test_prms_channel_flow_graph_compare_prms(
     flow_graph.finalize()
 
 
+def test_prms_channel_flow_graph_engines(
+    simulation, control, discretization, parameters
+):
+    # the arrays engine matches the per-node engine on a graph mixing node
+    # types: every 5th segment is a pass through node
+    output_dir = simulation["output_dir"]
+    nnodes = parameters.dims["nsegment"]
+    pass_through = np.arange(nnodes) % 5 == 0
+    node_maker_name = np.where(pass_through, "pass", "prms_channel")
+    node_maker_index = np.arange(nnodes)
+    node_maker_index[pass_through] = np.arange(pass_through.sum())
+
+    params_flow_graph = Parameters(
+        dims={"nnodes": nnodes},
+        coords={"node_coord": np.arange(nnodes)},
+        data_vars={
+            "node_maker_name": node_maker_name.astype("U"),
+            "node_maker_index": node_maker_index,
+            "node_maker_id": np.arange(nnodes),
+            "to_graph_index": discretization.parameters["tosegment"] - 1,
+        },
+        metadata={
+            "node_coord": {"dims": ["nnodes"]},
+            "node_maker_name": {"dims": ["nnodes"]},
+            "node_maker_index": {"dims": ["nnodes"]},
+            "node_maker_id": {"dims": ["nnodes"]},
+            "to_graph_index": {"dims": ["nnodes"]},
+        },
+        validate=True,
+    )
+
+    flow_graphs = {}
+    for engine in (None, "nodes"):
+        input_variables = {}
+        for key in PRMSChannel.get_inputs():
+            nc_path = output_dir / f"{key}.nc"
+            input_variables[key] = AdapterNetcdf(nc_path, key, control)
+
+        flow_graphs[engine] = FlowGraph(
+            control,
+            discretization=None,
+            parameters=params_flow_graph,
+            inflows=HruSegmentFlowAdapter(parameters, **input_variables),
+            node_maker_dict={
+                "prms_channel": PRMSChannelFlowNodeMaker(
+                    discretization, parameters
+                ),
+                "pass": PassThroughFlowNodeMaker(),
+            },
+            budget_type="error",
+            engine=engine,
+        )
+
+    assert flow_graphs[None].engine == "arrays"
+    assert flow_graphs["nodes"].engine == "nodes"
+
+    for istep in range(control.n_times):
+        control.advance()
+        for flow_graph in flow_graphs.values():
+            flow_graph.advance()
+            flow_graph.calculate(1.0)
+
+        for var in FlowGraph.get_variables():
+            np.testing.assert_equal(
+                flow_graphs[None][var], flow_graphs["nodes"][var]
+            )
+
+    for flow_graph in flow_graphs.values():
+        flow_graph.finalize()
+
+
+@pytest.mark.parametrize("method", ("levels", "components"))
+def test_flow_graph_sweep_schedule(method):
+    # a parallel sweep on a schedule is identical to a serial sweep in
+    # routing order, here on random basins of mixed node kinds
+    from pywatershed.base.flow_graph import flow_graph_sweep
+    from pywatershed.hydrology.pass_through_flow_node import (
+        _pass_through_kernel,
+    )
+    from pywatershed.hydrology.prms_channel_flow_graph import (
+        _muskingum_mann_kernel,
+    )
+    from pywatershed.utils.topology import (
+        routing_schedule,
+        upstream_adjacency,
+    )
+
+    rng = np.random.default_rng(0)
+    nnodes = 200
+    to_graph_index = np.array(
+        [
+            rng.integers(ii + 1, min(ii + 20, nnodes + 5))
+            for ii in range(nnodes)
+        ]
+    )
+    to_graph_index[to_graph_index >= nnodes] = -1
+    node_order = np.arange(nnodes)
+    upstream = upstream_adjacency(node_order, to_graph_index)
+    node_kernel = rng.integers(0, 2, nnodes)
+    inflows = rng.random(nnodes)
+    # muskingum parameters: tsi, ts, c0, c1, c2
+    params = np.array(
+        [[2.0] * nnodes, [2.0] * nnodes, *rng.random((3, nnodes))]
+    )
+
+    results = {}
+    for parallel, sched_method in ((False, "serial"), (True, method)):
+        sweep = flow_graph_sweep(
+            (_muskingum_mann_kernel, _pass_through_kernel), parallel=parallel
+        )
+        schedule = routing_schedule(
+            node_order, to_graph_index, n_parts=3, method=sched_method
+        )
+        state = np.zeros((5, nnodes))
+        outputs = [np.zeros(nnodes) for _ in range(3)]
+        for istep in range(3):
+            sweep(
+                24,
+                *schedule,
+                *upstream,
+                node_kernel,
+                inflows,
+                state,
+                params,
+                *outputs,
+            )
+        results[parallel] = [state, *outputs]
+
+    for res_serial, res_parallel in zip(results[False], results[True]):
+        np.testing.assert_equal(res_serial, res_parallel)
+
+
 exchange_types = ("hrunodeflowexchange", "inflowexchangefactory")
 
 
@@ -523,6 +655,9 @@ def test_prms_segment_lateral_inflow_components_to_netcdf(
         nc_out_file_path=nc_out_file_path,
         output_sum=True,
     )
+    # the control is advanced through all its times
+    assert control.itime_step == control.n_times - 1
+    assert control.current_time == control.end_time
 
     results = xr.load_dataset(nc_out_file_path).lateral_inflow_vol
     answers = xr.load_dataarray(
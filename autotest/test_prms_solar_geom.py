@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 from utils_compare import compare_in_memory, compare_netcdfs
 
@@ -103,3 +104,41 @@ def test_compare_prms(
         )
 
     return
+
+
+def test_soltab_cache(control, discretization, parameters, tmp_path):
+    cache_dir = tmp_path / "cache"
+
+    def calculated(soltab_cache_dir):
+        solar_geom = PRMSSolarGeometry(
+            control,
+            discretization=discretization,
+            parameters=parameters,
+            soltab_cache_dir=soltab_cache_dir,
+        )
+        solar_geom._calculate_all_time()
+        return solar_geom
+
+    solar_geom = calculated(None)
+    assert not cache_dir.exists()
+
+    # the first model writes the cache and the second reads it
+    cached = calculated(cache_dir)
+    cache_files = list(cache_dir.glob("soltab_*.npz"))
+    assert len(cache_files) == 1
+    assert cached._soltab_cache_file() == cache_files[0]
+    cache_files[0].touch()
+    mtime = cache_files[0].stat().st_mtime_ns
+
+    cached = calculated(cache_dir)
+    assert cache_files[0].stat().st_mtime_ns == mtime
+    for var in PRMSSolarGeometry.get_variables():
+        np.testing.assert_equal(cached[var].data, solar_geom[var].data)
+
+    # the cache is keyed by hru_slope, hru_aspect, and hru_lat
+    solar_geom.hru_slope = solar_geom.hru_slope + 0.1
+    assert solar_geom._soltab_cache_file() is None
+    solar_geom._soltab_cache_dir = cache_dir
+    assert solar_geom._soltab_cache_file() != cache_files[0]
+
+    return
@@ -0,0 +1,189 @@
+import numpy as np
+import pytest
+
+from pywatershed.utils.topology import (
+    TopologyIndex,
+    _topology_indices,
+    balance_components,
+    connected_components,
+    kahn_order,
+    routing_schedule,
+    topological_levels,
+    upstream_adjacency,
+)
+
+# a network of two basins and an isolated node
+#   0 -> 2 -> 3 -> out
+#   1 -> 2
+#   4 -> 3
+#   5 -> 6 -> out
+#   7 -> out
+to_index = np.array([2, 2, 3, -1, 3, 6, -1, -1])
+order = np.array([7, 5, 1, 0, 4, 2, 6, 3])
+
+
+def test_topological_levels():
+    level_offsets, level_nodes = topological_levels(order, to_index)
+    levels = [
+        level_nodes[level_offsets[ii] : level_offsets[ii + 1]].tolist()
+        for ii in range(len(level_offsets) - 1)
+    ]
+    # nodes are in routing order within a level
+    assert levels == [[7, 5, 1, 0, 4], [2, 6], [3]]
+
+    # the longest path from a headwater, on random forests
+    rng = np.random.default_rng(0)
+    for trial in range(20):
+        n_nodes = rng.integers(1, 300)
+        perm = rng.permutation(n_nodes)
+        to_random = np.full(n_nodes, -1)
+        for kk in range(1, n_nodes):
+            if rng.random() < 0.9:
+                to_random[perm[kk]] = perm[rng.integers(0, kk)]
+        order_random = kahn_order(to_random)
+
+        level = np.zeros(n_nodes, dtype="int64")
+        for inode in order_random.tolist():
+            to_node = to_random[inode]
+            if to_node >= 0:
+                level[to_node] = max(level[to_node], level[inode] + 1)
+
+        level_offsets, level_nodes = topological_levels(
+            order_random, to_random
+        )
+        assert level_offsets[-1] == n_nodes
+        for ii in range(len(level_offsets) - 1):
+            nodes = level_nodes[level_offsets[ii] : level_offsets[ii + 1]]
+            assert (level[nodes] == ii).all()
+
+
+def test_upstream_adjacency():
+    upstream_offsets, upstream_nodes = upstream_adjacency(order, to_index)
+    upstream = [
+        upstream_nodes[upstream_offsets[ii] : upstream_offsets[ii + 1]]
+        for ii in range(len(to_index))
+    ]
+    # upstream nodes are in routing order
+    assert [uu.tolist() for uu in upstream] == [
+        [],
+        [],
+        [1, 0],
+        [4, 2],
+        [],
+        [],
+        [5],
+        [],
+    ]
+
+
+def test_connected_components():
+    component = connected_components(to_index)
+    # numbered by outlet: 3, 6, 7
+    assert component.tolist() == [0, 0, 0, 0, 0, 1, 1, 2]
+
+    part = balance_components(component, 2)
+    assert part.tolist() == [0, 0, 0, 0, 0, 1, 1, 1]
+
+    # cycles have no outlet
+    with pytest.raises(ValueError):
+        connected_components(np.array([1, 2, 0, -1]))
+    with pytest.raises(ValueError):
+        connected_components(np.array([0, -1]))
+
+
+@pytest.mark.parametrize("method", (None, "serial", "levels", "components"))
+def test_routing_schedule(method):
+    n_parts = 2
+    stage_offsets, task_offsets, task_nodes = routing_schedule(
+        order, to_index, n_parts=n_parts, method=method
+    )
+    assert sorted(task_nodes.tolist()) == list(range(len(to_index)))
+
+    # every node is in a later stage or earlier in the same task than its
+    # upstream nodes
+    stage = np.zeros(len(to_index), dtype="int64")
+    task = np.zeros(len(to_index), dtype="int64")
+    position = np.zeros(len(to_index), dtype="int64")
+    for istage in range(len(stage_offsets) - 1):
+        for itask in range(stage_offsets[istage], stage_offsets[istage + 1]):
+            for ii in range(task_offsets[itask], task_offsets[itask + 1]):
+                stage[task_nodes[ii]] = istage
+                task[task_nodes[ii]] = itask
+                position[task_nodes[ii]] = ii
+
+    for inode, to_node in enumerate(to_index):
+        if to_node < 0:
+            continue
+        if stage[inode] == stage[to_node]:
+            assert task[inode] == task[to_node]
+            assert position[inode] < position[to_node]
+        else:
+            assert stage[inode] < stage[to_node]
+
+    if method == "levels":
+        assert len(stage_offsets) == 4
+    if method == "components":
+        assert task_offsets.tolist() == [0, 5, 8]
+    if method == "serial":
+        assert task_nodes.tolist() == order.tolist()
+
+
+def test_kahn_order():
+    kahn = kahn_order(to_index)
+    # the isolated node, then frontiers of the levels
+    assert kahn.tolist() == [7, 0, 1, 4, 5, 2, 6, 3]
+    # later frontiers are in the order of their last upstream node
+    assert kahn_order(np.array([3, 2, -1, -1])).tolist() == [0, 1, 3, 2]
+    position = np.argsort(kahn)
+    flows = to_index >= 0
+    assert (position[flows] < position[to_index[flows]]).all()
+
+    with pytest.raises(ValueError):
+        kahn_order(np.array([1, 2, 0, -1]))
+
+
+def test_kahn_order_networkx():
+    """The order of networkx.topological_sort, summing flows identically"""
+    import networkx as nx
+
+    rng = np.random.default_rng(0)
+    for trial in range(50):
+        n_nodes = rng.integers(1, 300)
+        # random forests with isolated nodes
+        perm = rng.permutation(n_nodes)
+        to_random = np.full(n_nodes, -1)
+        for kk in range(1, n_nodes):
+            if rng.random() < 0.9:
+                to_random[perm[kk]] = perm[rng.integers(0, kk)]
+
+        graph = nx.DiGraph()
+        graph.add_edges_from(
+            [(ii, tt) for ii, tt in enumerate(to_random.tolist()) if tt >= 0]
+        )
+        isolated = [ii for ii in range(n_nodes) if ii not in graph]
+        nx_order = isolated + list(nx.topological_sort(graph))
+        assert kahn_order(to_random).tolist() == nx_order
+
+
+def test_topology_index(tmp_path):
+    topology = TopologyIndex(to_index)
+    assert topology.n_nodes == len(to_index)
+    assert topology.headwaters.tolist() == [0, 1, 4, 5, 7]
+    assert topology.outlets.tolist() == [3, 6, 7]
+    assert topology.isolated.tolist() == [7]
+
+    # the same network is indexed once in the process and once on disk
+    _topology_indices.clear()
+    cached = TopologyIndex.from_to_index(to_index, cache_dir=tmp_path)
+    assert TopologyIndex.from_to_index(to_index) is cached
+    cache_files = list(tmp_path.glob("topology_*.npz"))
+    assert len(cache_files) == 1
+
+    _topology_indices.clear()
+    loaded = TopologyIndex.from_to_index(to_index, cache_dir=tmp_path)
+    assert loaded is not cached
+    for name in TopologyIndex._array_names:
+        assert (getattr(loaded, name) == getattr(topology, name)).all()
+    assert (
+        loaded.routing_schedule(2)[2] == topology.routing_schedule(2)[2]
+    ).all()
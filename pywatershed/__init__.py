@@ -1,14 +1,15 @@
-from .analysis.model_graph import ModelGraph
-from .analysis.utils.colorbrewer import ColorBrewer
 from .atmosphere.prms_atmosphere import PRMSAtmosphere
 from .atmosphere.prms_solar_geometry import PRMSSolarGeometry
 from .base import meta
 from .base.adapter import Adapter, AdapterNetcdf, adapter_factory
+from .base.aggregation import TemporalAggregator
 from .base.budget import Budget
 from .base.control import Control
-from .base.flow_graph import FlowGraph, FlowNode, FlowNodeMaker
+from .base.flow_graph import FlowGraph, FlowNode, FlowNodeArrays, FlowNodeMaker
+from .base.memory_output import MemoryOutput
 from .base.model import Model
 from .base.parameters import Parameters
+from .base.partitioned_model import PartitionedModel
 from .base.process import Process
 from .base.timeseries import TimeseriesArray
 from .hydrology.obsin_flow_node import ObsInFlowNode, ObsInFlowNodeMaker
@@ -17,7 +18,7 @@ from .hydrology.pass_through_flow_node import (
     PassThroughFlowNodeMaker,
 )
 from .hydrology.prms_canopy import PRMSCanopy
-from .hydrology.prms_channel import PRMSChannel
+from .hydrology.prms_channel import HruSegmentMap, PRMSChannel
 from .hydrology.prms_channel_flow_graph import (
     HruNodeFlowExchange,
     HruSegmentFlowAdapter,
@@ -36,7 +37,6 @@ from .hydrology.prms_snow import PRMSSnow
 from .hydrology.prms_soilzone import PRMSSoilzone
 from .hydrology.prms_soilzone_no_dprst import PRMSSoilzoneNoDprst
 from .hydrology.starfit import Starfit, StarfitFlowNode, StarfitFlowNodeMaker
-from .plot.domain_plot import DomainPlot
 from .utils import (
     ControlVariables,
     NetCdfRead,
@@ -45,10 +45,20 @@ from .utils import (
     addtl_domain_files,
     gis_files,
 )
-from .utils.csv_utils import CsvFile
-from .utils.mmr_to_mf6_dfw import MmrToMf6Dfw
 from .version import __version__
 
+# Attributes requiring heavy (mostly optional) dependencies, such as
+# matplotlib, geopandas, contextily, and flopy, are imported on first access
+# so that importing pywatershed to run a model does not import them.
+_lazy_imports = {
+    "ColorBrewer": ".analysis.utils.colorbrewer",
+    "CsvFile": ".utils.csv_utils",
+    "DomainPlot": ".plot.domain_plot",
+    "MmrToMf6Dfw": ".utils.mmr_to_mf6_dfw",
+    "ModelGraph": ".analysis.model_graph",
+}
+_lazy_submodules = ("analysis", "plot")
+
 __all__ = (
     "prms_channel_flow_graph_postprocess",
     "prms_channel_flow_graph_to_model_dict",
@@ -56,6 +66,7 @@ __all__ = (
     "PRMSChannelFlowNode",
     "PRMSChannelFlowNodeMaker",
     "HruSegmentFlowAdapter",
+    "HruSegmentMap",
     "HruNodeFlowExchange",
     "ModelGraph",
     "ColorBrewer",
@@ -69,11 +80,15 @@ __all__ = (
     "Control",
     "FlowGraph",
     "FlowNode",
+    "FlowNodeArrays",
     "FlowNodeMaker",
     "HruSegmentFlowAdapter",
+    "MemoryOutput",
     "Model",
     "Parameters",
+    "PartitionedModel",
     "Process",
+    "TemporalAggregator",
     "TimeseriesArray",
     "ObsInFlowNode",
     "ObsInFlowNodeMaker",
@@ -103,3 +118,24 @@ __all__ = (
     "DomainPlot",
     "__version__",
 )
+
+
+def __getattr__(name: str):
+    if name in _lazy_imports.keys():
+        import importlib
+
+        module = importlib.import_module(_lazy_imports[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+
+    if name in _lazy_submodules:
+        import importlib
+
+        return importlib.import_module(f".{name}", __name__)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals().keys()).union(__all__))
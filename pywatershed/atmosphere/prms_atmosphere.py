@@ -1,10 +1,9 @@
 import pathlib as pl
-from warnings import warn
+from typing import Union
 
 import numpy as np
 
-from pywatershed.base.process import Process
-from pywatershed.utils.netcdf_utils import NetCdfWrite
+from pywatershed.base.all_time_process import AllTimeProcess
 
 from ..base.adapter import adaptable
 from ..base.control import Control
@@ -13,6 +12,11 @@ from ..parameters import Parameters
 from ..utils.time_utils import datetime_day_of_month, datetime_month
 from .solar_constants import solf
 
+# The number of (time, nhru) float arrays of temporaries in the calculation
+# of the forcings, in addition to the variables and the inputs, used to size
+# the time windows to a memory budget.
+n_window_temporaries = 12
+
 
 # may not use this if they cant be called with jit
 # if it can, put it in a common utility.
@@ -24,7 +28,7 @@ def tile_time_to_space(arr: np.ndarray, n_space) -> np.ndarray:
     return np.transpose(np.tile(arr, (n_space, 1)))
 
 
-class PRMSAtmosphere(Process):
+class PRMSAtmosphere(AllTimeProcess):
     """PRMS atmospheric boundary layer model.
 
     Implementation based on PRMS 5.2.1 with theoretical documentation given in
@@ -62,12 +66,32 @@ class PRMSAtmosphere(Process):
     all time is _tmaxf).
 
     This full-time initialization may not be tractable for large domains and/or
-    long periods of time and require changes to batch the processing of the
-    variables. The benefits of full-time initialization are 1) the code is
-    vectorized and fast for such a large calculation, 2) the initialization of
-    this class effectively preprocess all the inputs to the rest of the model
-    and can then be skipped in subsequent model calls (unless the parameters
-    are changing).
+    long periods of time. The benefits of full-time initialization are 1) the
+    code is vectorized and fast for such a large calculation, 2) the
+    initialization of this class effectively preprocess all the inputs to the
+    rest of the model and can then be skipped in subsequent model calls
+    (unless the parameters are changing).
+
+    With a forcing_memory_budget, the variables are instead calculated for
+    windows of time steps, sized so that the variables, inputs and
+    temporaries of the calculation of a window fit in the budget. The next
+    window is calculated when the model advances past the current window and
+    the state of the transpiration switch (transp_on) is carried between
+    windows, so the results are identical to the full-time calculation. The
+    variables then hold only the current window (their "data", starting at
+    the time step "data_start"). After a restart from a checkpoint, the
+    first window starts at the time step following the checkpoint.
+
+    The state of the transpiration switch at the current time (transp_on and
+    the private _transp_check and _tmax_sum) is saved in checkpoints. After
+    a warm start (Model.load_checkpoint) the switch continues from that state
+    rather than being initialized from the start month.
+
+    NetCDF output is written as the variables are calculated: the time steps
+    of each window (or of all time) are handed to the BackgroundWriter in
+    blocks, without copying them, so the writes overlap the time steps of
+    the model. With output aggregation, the statistics are instead
+    accumulated on each time step (see AllTimeProcess).
 
     Args:
         control: a Control object
@@ -81,10 +105,16 @@ class PRMSAtmosphere(Process):
         soltab_horad_potsw: the solar table of potential shortwave
             radiation on a horizontal plane
 
+        forcing_memory_budget: Optional number of bytes for calculating the
+            variables in windows of time steps instead of for all time,
+            defaulting to the control option of the same name.
         verbose: Print extra information or not?
 
     """
 
+    # the state of the transpiration switch at the current time
+    _checkpoint_private_variables = ("_transp_check", "_tmax_sum")
+
     def __init__(
         self,
         control: Control,
@@ -95,6 +125,7 @@ class PRMSAtmosphere(Process):
         tmin: [str, pl.Path],
         soltab_potsw: adaptable,
         soltab_horad_potsw: adaptable,
+        forcing_memory_budget: int = None,
         verbose: bool = False,
     ):
         # Defering handling batch handling of time chunks but self.n_time_chunk
@@ -108,6 +139,22 @@ class PRMSAtmosphere(Process):
         # Initialize full time with nans
         self._time = np.full(control.n_times, nan, dtype="datetime64[s]")
 
+        # the variables hold a window of time steps, all time by default
+        if forcing_memory_budget is None:
+            forcing_memory_budget = control.options.get(
+                "forcing_memory_budget"
+            )
+        if discretization is None:
+            nhru = parameters.dims["nhru"]
+        else:
+            nhru = discretization.dims["nhru"]
+        self._window_n_times = self._get_window_n_times(
+            control, nhru, forcing_memory_budget
+        )
+        self._windowed = self._window_n_times < control.n_times
+        self._window_start = None
+        self._window_stop = None
+
         metadata_patches = {
             kk: {"dims": ("ntime", "nhru")} for kk in self.variables
         }
@@ -127,13 +174,46 @@ class PRMSAtmosphere(Process):
         self._calculated = False
         self._netcdf_initialized = False
 
+        # the transpiration switch state at the current time and the time
+        # step of the checkpoint it was restored from
+        self._transp_check = np.zeros(self.nhru, dtype="int64")
+        self._tmax_sum = np.zeros(self.nhru, dtype="float64")
+        self._restart_itime_step = None
+
+        return
+
+    @classmethod
+    def _get_window_n_times(
+        cls, control: Control, nhru: int, memory_budget: int
+    ) -> int:
+        """The number of time steps of a window within a memory budget."""
+        if memory_budget is None:
+            return control.n_times
+        n_arrays = len(cls.get_variables()) + 3 + n_window_temporaries
+        bytes_per_time = nhru * n_arrays * np.dtype("float64").itemsize
+        return int(
+            max(1, min(control.n_times, memory_budget // bytes_per_time))
+        )
+
+    def _initialize_var(self, var_name: str, flt_to_dbl: bool = True):
+        # the time dimension of the variables is the window
+        self.ntime = self._window_n_times
+        super()._initialize_var(var_name, flt_to_dbl=flt_to_dbl)
+        self.ntime = self.control.n_times
         return
 
     def _calculate_all_time(self):
         if self._calculated:
             return
 
-        # Eventually refactor to work at specific chunks of time
+        self._calculate_window(0)
+
+        # JLM todo: delete large variables on self for memory management
+        self._calculated = True
+
+        return
+
+    def _init_time(self):
         for input in ["prcp", "tmax", "tmin"]:
             # # this is a bit of a mess: ._dataset.dataset
             input_time = self._input_variables_dict[input]._nc_read.times
@@ -149,12 +229,63 @@ class PRMSAtmosphere(Process):
             msg = "Control start_time is not in the input data time"
             raise ValueError(msg)
         self._init_time_ind = start_time_ind[0]
+        return
+
+    def _calculate_window(self, start: int) -> None:
+        """Calculate the variables for the window starting at a time step.
 
-        # Solve all variables for all time
-        self._month_ind_12 = datetime_month(self._time) - 1  # (time)
-        self._month_ind_1 = np.zeros(self._time.shape, dtype=int)  # (time)
-        self._month = datetime_month(self._time)  # (time)
-        self._dom = datetime_day_of_month(self._time)  # (time)
+        Windows are calculated in order, each starting where the previous
+        one stopped, as the transpiration switch depends on the past.
+
+        Args:
+            start: the control time step at which the window starts.
+        """
+        if self._window_start is None:
+            if not hasattr(self, "_init_time_ind"):
+                self._init_time()
+        elif start != self._window_stop:
+            msg = (
+                f"{self.name} windows are calculated in order, the window "
+                f"at {start} does not follow the window ending at "
+                f"{self._window_stop}"
+            )
+            raise ValueError(msg)
+        elif self._netcdf_blocks():
+            # complete the writes of the previous window before replacing it
+            self._write_netcdf_blocks()
+            for nc in self._netcdf_writers():
+                nc.flush()
+
+        stop = min(start + self._window_n_times, self.control.n_times)
+        self._window_start = start
+        self._window_stop = stop
+        init_vals = self.get_init_values()
+        for vv in self.variables:
+            if stop - start != self[vv].data.shape[0]:
+                # the final window is shorter, or a window follows a restart
+                self[vv].data = np.full(
+                    (stop - start, self.nhru),
+                    init_vals[vv],
+                    dtype=self[vv].data.dtype,
+                )
+            self[vv].data_start = start
+
+        # Solve all variables for the window of time
+        time = self._time[start:stop]
+        self._window_time = time
+        self._month_ind_12 = datetime_month(time) - 1  # (time)
+        self._month_ind_1 = np.zeros(time.shape, dtype=int)  # (time)
+        self._month = datetime_month(time)  # (time)
+        self._dom = datetime_day_of_month(time)  # (time)
+
+        # read the inputs of the window once
+        ivd = self._input_variables_dict
+        self._window_inputs = {
+            input: ivd[input].data_window(
+                self._init_time_ind + start, self._init_time_ind + stop
+            )
+            for input in ["prcp", "tmax", "tmin"]
+        }
 
         self.adjust_temperature()
         self.adjust_precip()
@@ -162,9 +293,8 @@ class PRMSAtmosphere(Process):
         self.calculate_potential_et_jh()
         self.calculate_transp_tindex()
 
-        # JLM todo: delete large variables on self for memory management
-        self._calculated = True
-
+        del self._window_inputs
+        self._write_netcdf_blocks()
         return
 
     @staticmethod
@@ -274,11 +404,43 @@ class PRMSAtmosphere(Process):
     def _set_initial_conditions(self):
         return
 
+    def set_checkpoint_state(self, state: dict) -> None:
+        super().set_checkpoint_state(state)
+        # the switch continues from the checkpoint in a warm start or in the
+        # window following the checkpoint
+        self._restart_itime_step = self._itime_step
+        if self._windowed:
+            if self._netcdf_blocks():
+                # complete the writes of the window before replacing it
+                for nc in self._netcdf_writers():
+                    nc.flush()
+            self._window_start = None
+            self._window_stop = None
+        return
+
     def _advance_variables(self):
-        if not self._calculated:
-            self._calculate_all_time()
-        for vv in self.variables:
-            self[vv].advance()
+        itime_step = self.control.itime_step
+        if not self._windowed:
+            if not self._calculated:
+                self._calculate_all_time()
+            for vv in self.variables:
+                self[vv].advance()
+        else:
+            if self._window_stop is None:
+                # the first time step of the run or after a restart
+                self._calculate_window(itime_step)
+            elif itime_step >= self._window_stop:
+                self._calculate_window(self._window_stop)
+            for vv in self.variables:
+                self[vv].advance()
+
+        # carry the switch state to the current time, for checkpoints
+        self._switch_transp(
+            itime_step - self._window_start,
+            None,
+            self._transp_check,
+            self._tmax_sum,
+        )
         return
 
     def _calculate(self, time_length):
@@ -307,9 +469,9 @@ class PRMSAtmosphere(Process):
             raise ValueError(msg)
 
         # (time, space) dimensions on these variables
-        ivd = self._input_variables_dict
-        self.tmaxf.data[:] = ivd["tmax"].data + self.tmax_cbh_adj[month_ind]
-        self.tminf.data[:] = ivd["tmin"].data + self.tmin_cbh_adj[month_ind]
+        win = self._window_inputs
+        self.tmaxf.data[:] = win["tmax"] + self.tmax_cbh_adj[month_ind]
+        self.tminf.data[:] = win["tmin"] + self.tmin_cbh_adj[month_ind]
         self.tminc.data[:] = (self["tminf"].data - 32.0) * (5 / 9)
         self.tmaxc.data[:] = (self["tmaxf"].data - 32.0) * (5 / 9)
         self.tavgc.data[:] = (self["tmaxc"].data + self["tminc"].data) / 2.0
@@ -326,7 +488,7 @@ class PRMSAtmosphere(Process):
             None
         """
 
-        ivd = self._input_variables_dict
+        prcp = self._window_inputs["prcp"]
 
         # throw an error shapes are inconsistent
         shape_list = np.array(
@@ -385,9 +547,7 @@ class PRMSAtmosphere(Process):
 
         # This is in climate_hru as a condition of calling climateflow
         # (eye roll)
-        self.prmx.data[:] = np.where(
-            ivd["prcp"].data <= zero, zero, self.prmx.data
-        )
+        self.prmx.data[:] = np.where(prcp <= zero, zero, self.prmx.data)
 
         # Recalculate/redefine these now based on prmx instead of the
         # temperature logic
@@ -396,23 +556,23 @@ class PRMSAtmosphere(Process):
 
         # Mixed case (everywhere, to be overwritten by the all-snow/rain-fall
         # cases)
-        self.hru_ppt.data[:] = ivd["prcp"].data * self.snow_cbh_adj[month_ind]
+        self.hru_ppt.data[:] = prcp * self.snow_cbh_adj[month_ind]
         self.hru_rain.data[:] = self.prmx.data * self.hru_ppt.data
         self.hru_snow.data[:] = self.hru_ppt.data - self.hru_rain.data
 
         # All precip is snow case
         # The condition to be used later:
-        self.hru_ppt.data[wh_all_snow] = (
-            ivd["prcp"].data * self.snow_cbh_adj[month_ind]
-        )[wh_all_snow]
+        self.hru_ppt.data[wh_all_snow] = (prcp * self.snow_cbh_adj[month_ind])[
+            wh_all_snow
+        ]
         self.hru_snow.data[wh_all_snow] = self.hru_ppt.data[wh_all_snow]
         self.hru_rain.data[wh_all_snow] = zero
 
         # All precip is rain case
         # The condition to be used later:
-        self.hru_ppt.data[wh_all_rain] = (
-            ivd["prcp"].data * self.rain_cbh_adj[month_ind]
-        )[wh_all_rain]
+        self.hru_ppt.data[wh_all_rain] = (prcp * self.rain_cbh_adj[month_ind])[
+            wh_all_rain
+        ]
         self.hru_rain.data[wh_all_rain] = self.hru_ppt.data[wh_all_rain]
         self.hru_snow.data[wh_all_rain] = zero
 
@@ -459,7 +619,7 @@ class PRMSAtmosphere(Process):
 
         ivd = self._input_variables_dict
         self.swrad.data[:], self.orad_hru.data[:] = self._ddsolrad_run(
-            dates=self._time,
+            dates=self._window_time,
             tmax_hru=self.tmaxf.data,
             hru_ppt=self.hru_ppt.data,
             soltab_potsw=ivd["soltab_potsw"].data,
@@ -630,7 +790,7 @@ class PRMSAtmosphere(Process):
             None
         """
         self.potet.data[:] = self._potet_jh_run(
-            dates=self._time,
+            dates=self._window_time,
             tavgc=self.tavgc.data,
             swrad=self.swrad.data,
             jh_coef=self.jh_coef,
@@ -683,20 +843,30 @@ class PRMSAtmosphere(Process):
 
         # candidate for worst code lines
         if self._params.parameters["temp_units"] == 0:
-            transp_tmax_f = self.transp_tmax
+            self._transp_tmax_f = self.transp_tmax
         else:
-            transp_tmax_f = (self.transp_tmax * (9.0 / 5.0)) + 32.0
-
-        transp_check = self.transp_on.current.copy()  # dim nhrus only
-        tmax_sum = self.transp_on.current.copy().astype(
-            "float64"
-        )  # dim nhrus only
+            self._transp_tmax_f = (self.transp_tmax * (9.0 / 5.0)) + 32.0
+
+        # the first window initializes the switches from the start month,
+        # unless they were restored from a checkpoint at the time step before
+        # the window (a warm start). Following windows continue from the
+        # state at the end of the previous window, the current state.
+        first_window = (
+            self._window_start == 0 and self._restart_itime_step != -1
+        )
+        if first_window:
+            transp_check = np.zeros(self.nhru, dtype="int64")
+            tmax_sum = np.zeros(self.nhru, dtype="float64")
+        else:
+            transp_on_last = self.transp_on.current.copy()
+            transp_check = self._transp_check.copy()
+            tmax_sum = self._tmax_sum.copy()
         start_day = self.control.start_doy
         start_month = self.control.start_month
 
         motmp = start_month + self.nmonth
 
-        for hh in range(self.nhru):
+        for hh in range(self.nhru if first_window else 0):
             if start_month == self.transp_beg[hh]:
                 # rsr, why 10? if transp_tmax < 300, should be < 10
                 if start_day > 10:
@@ -715,174 +885,104 @@ class PRMSAtmosphere(Process):
                 ):
                     self.transp_on.data[0, hh] = 1
 
-        # vectorize
-        ntime = self.transp_on.data.shape[0]
-        # _transp_check = self.transp_on.data.copy()
-        # self._transp_beg = tile_space_to_time(self.transp_beg, ntime)
-        # self._transp_end = tile_space_to_time(self.transp_end, ntime)
+        # The current state of the switches is carried on each time step as
+        # the model advances (_advance_variables) from the state before the
+        # window. A resume within the window of all time keeps the restored
+        # current state.
+        if self.control.itime_step <= self._window_start:
+            self._transp_check[:] = transp_check
+            self._tmax_sum[:] = tmax_sum
 
         # RUN: Process_flag == RUN
         # Set switch for active transpiration period
+        ntime = self.transp_on.data.shape[0]
         for tt in range(ntime):
-            for hh in range(self.nhru):
-                if tt > 0:
-                    self.transp_on.data[tt, hh] = self.transp_on.data[
-                        tt - 1, hh
-                    ]
-
-                # check for month to turn check switch on or
-                # transpiration switch off
-                if self._dom[tt] == 1:
-                    # check for end of period
-                    if self._month[tt] == self.transp_end[hh]:
-                        self.transp_on.data[tt, hh] = 0
-                        transp_check[hh] = 0
-                        tmax_sum[hh] = zero
-
-                    # <
-                    # check for month to turn transpiration switch on or off
-                    if self._month[tt] == self.transp_beg[hh]:
-                        transp_check[hh] = 1
-                        tmax_sum[hh] = zero
-
-                # <<
-                # If in checking period, then for each day
-                # sum maximum temperature until greater than temperature index
-                # parameter, at which time, turn transpiration switch on, check
-                # switch off freezing temperature assumed to be 32 degrees
-                # Fahrenheit
-                if transp_check[hh] == 1:
-                    if self.tmaxf.data[tt, hh] > 32.0:
-                        tmax_sum[hh] = tmax_sum[hh] + self.tmaxf.data[tt, hh]
-
-                    # <
-                    if tmax_sum[hh] > transp_tmax_f[hh]:
-                        self.transp_on.data[tt, hh] = 1
-                        transp_check[hh] = 0
-                        tmax_sum[hh] = 0.0
+            if tt > 0:
+                self.transp_on.data[tt] = self.transp_on.data[tt - 1]
+            elif not first_window:
+                self.transp_on.data[tt] = transp_on_last
 
-        # <<<
-        return
-
-    def _write_netcdf_timeseries(self) -> None:
-        if not self._netcdf_initialized:
-            return
-
-        if self._netcdf_separate:
-            for var in self.variables:
-                if var not in self._netcdf_output_vars:
-                    continue
-                nc_path = self._netcdf_output_dir / f"{var}.nc"
-
-                nc = NetCdfWrite(
-                    nc_path,
-                    self._params.coords,
-                    [var],
-                    {var: self.meta[var]},
-                )
-                nc.add_all_data(
-                    var,
-                    self[var].data,
-                    self._time,
-                )
-                nc.close()
-                assert nc_path.exists()
-                print(f"Wrote file: {nc_path}")
-
-        else:
-            nc_path = self._netcdf_output_dir / f"{self.name}.nc"
-            nc = NetCdfWrite(
-                nc_path,
-                self._params.coords,
-                self._netcdf_output_vars,
-                self.meta,
+            self._switch_transp(
+                tt, self.transp_on.data[tt], transp_check, tmax_sum
             )
-            for var in self.variables:
-                if var not in self._netcdf_output_vars:
-                    continue
-                nc.add_all_data(
-                    var,
-                    self[var].data,
-                    self._time,
-                )
-
-            nc.close()
-            assert nc_path.exists()
-            print(f"Wrote file: {nc_path}")
 
-        self._finalize_netcdf()
+        # <<<
         return
 
-    def initialize_netcdf(
+    def _switch_transp(
         self,
-        output_dir: [str, pl.Path] = None,
-        separate_files: bool = None,
-        output_vars: list = None,
-        **kwargs,
-    ):
-        if (
-            self._netcdf_initialized
-            and "verbosity" in self.control.options.keys()
-            and self.control.options["verbosity"] > 5
-        ):
-            msg = (
-                f"{self.name} class previously initialized netcdf output "
-                f"in {self._netcdf_output_dir}"
-            )
-            warn(msg)
-            return
-
-        if (
-            "verbosity" in self.control.options.keys()
-            and self.control.options["verbosity"] > 5
-        ):
-            print(f"initializing netcdf output for: {self.name}")
-
-        (
-            output_dir,
-            output_vars,
-            separate_files,
-        ) = self._reconcile_nc_args_w_control_opts(
-            output_dir, output_vars, separate_files
-        )
-
-        # apply defaults if necessary
-        if output_dir is None:
-            msg = (
-                "An output directory is required to be specified for netcdf"
-                "initialization."
-            )
-            raise ValueError(msg)
-
-        if separate_files is None:
-            separate_files = True
+        tt: int,
+        transp_on: Union[np.ndarray, None],
+        transp_check: np.ndarray,
+        tmax_sum: np.ndarray,
+    ) -> None:
+        """Update the transpiration switches in place for a time of the window.
+
+        Args:
+            tt: the time index in the window.
+            transp_on: transp_on at the time, or None to update only the
+                check switch and the temperature sum.
+            transp_check: the check switch, at the previous time.
+            tmax_sum: the temperature sum, at the previous time.
+        """
+        # check for month to turn check switch on or
+        # transpiration switch off
+        if self._dom[tt] == 1:
+            # check for end of period
+            wh_end = self._month[tt] == self.transp_end
+            if transp_on is not None:
+                transp_on[wh_end] = 0
+            transp_check[wh_end] = 0
+            tmax_sum[wh_end] = zero
+
+            # check for month to turn transpiration switch on or off
+            wh_beg = self._month[tt] == self.transp_beg
+            transp_check[wh_beg] = 1
+            tmax_sum[wh_beg] = zero
+
+        # If in checking period, then for each day
+        # sum maximum temperature until greater than temperature index
+        # parameter, at which time, turn transpiration switch on, check
+        # switch off freezing temperature assumed to be 32 degrees
+        # Fahrenheit
+        tmaxf = self.tmaxf.data[tt]
+        checking = transp_check == 1
+        wh_sum = checking & (tmaxf > 32.0)
+        tmax_sum[wh_sum] = tmax_sum[wh_sum] + tmaxf[wh_sum]
+
+        wh_on = checking & (tmax_sum > self._transp_tmax_f)
+        if transp_on is not None:
+            transp_on[wh_on] = 1
+        transp_check[wh_on] = 0
+        tmax_sum[wh_on] = 0.0
+        return
 
-        self._netcdf_separate = separate_files
+    def _write_netcdf_blocks(self) -> None:
+        """Queue the writes of the time steps of the window not yet written.
 
-        self._netcdf_initialized = True
-        self._netcdf_output_dir = pl.Path(output_dir)
+        The variables are not copied for their writes, which complete in the
+        background. The writes must complete before the variables of a
+        following window are calculated, see _calculate_window.
+        """
+        if not self._netcdf_blocks() or self._window_start is None:
+            return
+        start = max(self._netcdf_written_stop, self._window_start)
+        stop = self._window_stop
+        if start >= stop:
+            return
 
-        if output_vars is None:
-            self._netcdf_output_vars = self.variables
-        else:
-            self._netcdf_output_vars = list(
-                set(output_vars).intersection(set(self.variables))
+        if self._verbose:
+            print(
+                f"Writing output time steps {start} to {stop} for: "
+                f"{self.name}",
+                flush=True,
             )
-            if len(self._netcdf_output_vars) == 0:
-                self._netcdf_initialized = False
-
-        return
-
-    def _finalize_netcdf(self) -> None:
-        self._netcdf_initialized = False
-        return
-
-    def output(self):
-        if self._netcdf_initialized:
-            if self._verbose:
-                print(
-                    f"Writing FULL timeseries output for: {self.name}",
-                    flush=True,
-                )
-            self._write_netcdf_timeseries()
+        for nc in self._netcdf_writers():
+            nc.add_time_block(start, self._time[start:stop])
+        iwindow = start - self._window_start
+        for var in self._netcdf_output_vars:
+            self._netcdf[var].add_data_block(
+                var, start, self[var].data[iwindow:]
+            )
+        self._netcdf_written_stop = stop
         return
@@ -1,16 +1,18 @@
+import hashlib
+import os
 import pathlib as pl
 import warnings
-from typing import Tuple
+from typing import Tuple, Union
 
 import numpy as np
 
-from pywatershed.base.process import Process
-from pywatershed.utils.netcdf_utils import NetCdfWrite
+from pywatershed.base.all_time_process import AllTimeProcess
 
 from ..base.control import Control
 from ..constants import dnearzero, nan, one, zero
 from ..parameters import Parameters
 from ..utils.prms5util import load_soltab_debug
+from ..version import __version__
 from .solar_constants import ndoy, pi, pi_12, r1, solar_declination, two_pi
 
 doy = np.arange(ndoy) + 1
@@ -28,7 +30,7 @@ def tile_space_to_time(arr: np.ndarray) -> np.ndarray:
 #    return np.transpose(np.tile(arr, (n_hru, 1)))
 
 
-class PRMSSolarGeometry(Process):
+class PRMSSolarGeometry(AllTimeProcess):
     """PRMS solar geometry.
 
     Implementation based on PRMS 5.2.1 with theoretical documentation given in
@@ -47,6 +49,12 @@ class PRMSSolarGeometry(Process):
     Primary reference: Appendix E of Dingman, S. L., 1994, Physical Hydrology.
     Englewood Cliffs, NJ: Prentice Hall, 575 p.
 
+    The solar tables depend only on the parameters hru_slope, hru_aspect, and
+    hru_lat. With a soltab_cache_dir, they are saved in that directory in a
+    file named by a hash of these parameters (and of the pywatershed
+    version) and later models of the same domain load them instead of
+    computing them again.
+
     Args:
         control: a Control object
         discretization: a discretization of class Parameters
@@ -54,6 +62,9 @@ class PRMSSolarGeometry(Process):
         verbose: Print extra information or not?
         from_prms_file: Load from a PRMS output file?
         from_nc_files_dir: [str, pl.Path] = None,
+        soltab_cache_dir: Optional directory of the cache of solar tables,
+            defaulting to the control option of the same name. None does not
+            cache.
 
     """
 
@@ -65,6 +76,7 @@ class PRMSSolarGeometry(Process):
         verbose: bool = False,
         from_prms_file: [str, pl.Path] = None,
         from_nc_files_dir: [str, pl.Path] = None,
+        soltab_cache_dir: [str, pl.Path] = None,
     ):
         # self._time is needed by Process for timeseries arrays
         # TODO: this is redundant because the parameter doy is set
@@ -135,8 +147,60 @@ class PRMSSolarGeometry(Process):
     def _set_initial_conditions(self):
         return
 
+    def _soltab_cache_file(self) -> Union[pl.Path, None]:
+        """The cache file of the solar tables of the parameters.
+
+        Returns:
+            None if caching is not enabled else the path of the (possibly
+            non-existent) cache file.
+        """
+        if self._soltab_cache_dir is None:
+            return None
+        hasher = hashlib.sha256(__version__.encode())
+        for name in ("hru_slope", "hru_aspect", "hru_lat"):
+            values = np.ascontiguousarray(self[name], dtype="float64")
+            hasher.update(values.tobytes())
+        return (
+            pl.Path(self._soltab_cache_dir)
+            / f"soltab_{hasher.hexdigest()[0:16]}.npz"
+        )
+
+    def _load_soltab_cache(self, cache_file: pl.Path) -> bool:
+        if not cache_file.exists():
+            return False
+        try:
+            with np.load(cache_file) as cached:
+                for var in self.variables:
+                    self[var].data[:] = cached[var]
+        except Exception:
+            # an unreadable cache is recomputed (and rewritten)
+            return False
+        return True
+
+    def _save_soltab_cache(self, cache_file: pl.Path) -> None:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            # write then rename so concurrent readers never see a partial file
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            with tmp_file.open("wb") as file:
+                np.savez(
+                    file, **{var: self[var].data for var in self.variables}
+                )
+            tmp_file.replace(cache_file)
+        except OSError:
+            # an unwritable cache is not an error
+            pass
+        return
+
     def _calculate_all_time(self):
         self._hru_cossl = np.cos(np.arctan(self["hru_slope"]))
+
+        cache_file = self._soltab_cache_file()
+        if cache_file is not None and self._load_soltab_cache(cache_file):
+            self._calculated = True
+            self._write_netcdf_blocks()
+            return
+
         # The potential radiation on horizontal surfce
         self.soltab_horad_potsw.data[:], _ = self.compute_soltab(
             np.zeros(self["nhru"]),
@@ -158,7 +222,11 @@ class PRMSSolarGeometry(Process):
             self.func3,
         )
 
+        if cache_file is not None:
+            self._save_soltab_cache(cache_file)
+
         self._calculated = True
+        self._write_netcdf_blocks()
         return
 
     def _advance_variables(self):
@@ -272,15 +340,16 @@ class PRMSSolarGeometry(Process):
             t3[wh_t3_lt_t2] = zero
 
         # This is if no other conditions are met
-        solt = func3(x2, x1, t3, t2)
+        # (computed once, it is the first term of the other conditions)
+        solt_t3_t2 = func3(x2, x1, t3, t2)
+        solt = solt_t3_t2.copy()
         sunh = (t3 - t2) * pi_12
 
         # t7 > t0
         wh_t7_gt_t0 = np.where(t7 > t0)
         if len(wh_t7_gt_t0[0]):
             solt[wh_t7_gt_t0] = (
-                func3(x2, x1, t3, t2)[wh_t7_gt_t0]
-                + func3(x2, x1, t7, t0)[wh_t7_gt_t0]
+                solt_t3_t2[wh_t7_gt_t0] + func3(x2, x1, t7, t0)[wh_t7_gt_t0]
             )
             sunh[wh_t7_gt_t0] = (t3 - t2 + t7 - t0)[wh_t7_gt_t0] * pi_12
 
@@ -288,18 +357,17 @@ class PRMSSolarGeometry(Process):
         wh_t6_lt_t1 = np.where(t6 < t1)
         if len(wh_t6_lt_t1[0]):
             solt[wh_t6_lt_t1] = (
-                func3(x2, x1, t3, t2)[wh_t6_lt_t1]
-                + func3(x2, x1, t1, t6)[wh_t6_lt_t1]
+                solt_t3_t2[wh_t6_lt_t1] + func3(x2, x1, t1, t6)[wh_t6_lt_t1]
             )
             sunh[wh_t6_lt_t1] = (t3 - t2 + t1 - t6)[wh_t6_lt_t1] * pi_12
 
         # The first condition checked
         mask_sl_lt_dnearzero = tile_space_to_time(np.abs(sl)) < dnearzero
-        solt = np.where(
-            mask_sl_lt_dnearzero, func3(np.zeros(nhru), x0, t1, t0), solt
-        )
-
-        sunh = np.where(mask_sl_lt_dnearzero, (t1 - t0) * pi_12, sunh)
+        if mask_sl_lt_dnearzero.any():
+            solt = np.where(
+                mask_sl_lt_dnearzero, func3(np.zeros(nhru), x0, t1, t0), solt
+            )
+            sunh = np.where(mask_sl_lt_dnearzero, (t1 - t0) * pi_12, sunh)
 
         mask_sunh_lt_dnearzero = sunh < dnearzero
         sunh = np.where(mask_sunh_lt_dnearzero, zero, sunh)
@@ -308,7 +376,7 @@ class PRMSSolarGeometry(Process):
         if len(wh_solt_lt_zero[0]):
             solt[wh_solt_lt_zero] = zero
             warnings.warn(
-                f"{len(wh_solt_lt_zero[0])}/{np.product(solt.shape)} "
+                f"{len(wh_solt_lt_zero[0])}/{np.prod(solt.shape)} "
                 f"locations-times with negative "
                 f"potential solar radiation."
             )
@@ -337,12 +405,8 @@ class PRMSSolarGeometry(Process):
 
         See reference: https://github.com/nhm-usgs/prms/blob/6.0.0_dev/src/prmslib/physics/sm_solar_radiation.f90
         """
-        nhru = len(lats)
-        lats_mat = np.tile(-1 * np.tan(lats), (ndoy, 1))
-        sol_dec_mat = np.transpose(
-            np.tile(np.tan(solar_declination), (nhru, 1))
-        )
-        tx = lats_mat * sol_dec_mat
+        # [ndoy, nhru] by broadcasting [nhru] and [ndoy, 1]
+        tx = (-1 * np.tan(lats)) * np.tan(solar_declination)[:, np.newaxis]
         # result = np.copy(tx)
         # result[np.where((tx >= (-1 * one)) & (tx <= one))] = np.arccos(
         #    tx[np.where((tx >= (-1 * one)) & (tx <= one))]
@@ -387,14 +451,13 @@ class PRMSSolarGeometry(Process):
         See also: https://github.com/nhm-usgs/prms/blob/6.0.0_dev/src/prmslib/physics/sm_solar_radiation.f90
         """
 
-        # Must alter the dimensions of the inputs to get the outputs.
-        nhru = len(v)
-        vv = np.tile(v, (ndoy, 1))
-        ww = np.tile(w, (ndoy, 1))
+        # The [nhru] and [ndoy] inputs are broadcast to [ndoy, nhru]
+        vv = v
+        ww = w
         # These are known at init time, not sure they are worth saving in self
         # and passing
-        rr = np.transpose(np.tile(r1, (nhru, 1)))
-        dd = np.transpose(np.tile(solar_declination, (nhru, 1)))
+        rr = r1[:, np.newaxis]
+        dd = solar_declination[:, np.newaxis]
 
         f3 = (
             rr
@@ -407,124 +470,24 @@ class PRMSSolarGeometry(Process):
 
         return f3
 
-    def _write_netcdf_timeseries(self) -> None:
-        if not self._netcdf_initialized:
-            return
-
-        if self._netcdf_separate:
-            for var in self.variables:
-                if var not in self._netcdf_output_vars:
-                    continue
-                nc_path = self._netcdf_output_dir / f"{var}.nc"
-
-                nc = NetCdfWrite(
-                    nc_path,
-                    self._params.coords,
-                    [var],
-                    {var: self.meta[var]},
-                )
-                nc.add_all_data(
-                    var,
-                    self[var].data,
-                    self.doy,
-                    time_coord="doy",
-                )
-                nc.close()
-                assert nc_path.exists()
-                print(f"Wrote file: {nc_path}")
-
-        else:
-            nc_path = self._netcdf_output_dir / f"{self.name}.nc"
-            nc = NetCdfWrite(
-                nc_path,
-                self._params.coords,
-                self._netcdf_output_vars,
-                self.meta,
-            )
-            for var in self.variables:
-                if var not in self._netcdf_output_vars:
-                    continue
-                nc.add_all_data(
-                    var,
-                    self[var].data,
-                    self.doy,
-                    time_coord="doy",
-                )
-
-            nc.close()
-            assert nc_path.exists()
-            print(f"Wrote file: {nc_path}")
+    def _write_netcdf_blocks(self) -> None:
+        """Queue the writes of the calculated variables.
 
-        self._finalize_netcdf()
-        return
-
-    def _finalize_netcdf(self) -> None:
-        self._netcdf_initialized = False
-        return
-
-    def initialize_netcdf(
-        self,
-        output_dir: [str, pl.Path] = None,
-        separate_files: bool = None,
-        output_vars: list = None,
-        **kwargs,
-    ):
+        The variables are not copied for their writes, which complete in the
+        background and are waited for on finalize.
+        """
         if (
-            self._netcdf_initialized
-            and "verbosity" in self.control.options.keys()
-            and self.control.options["verbosity"] > 5
+            not self._netcdf_blocks()
+            or not self._calculated
+            or self._netcdf_written_stop
         ):
-            msg = (
-                f"{self.name} class previously initialized netcdf output "
-                f"in {self._netcdf_output_dir}"
-            )
-            warnings.warn(msg)
             return
 
-        if (
-            "verbosity" in self.control.options.keys()
-            and self.control.options["verbosity"] > 5
-        ):
-            print(f"initializing netcdf output for: {self.name}")
-
-        (
-            output_dir,
-            output_vars,
-            separate_files,
-        ) = self._reconcile_nc_args_w_control_opts(
-            output_dir, output_vars, separate_files
-        )
-
-        # apply defaults if necessary
-        if output_dir is None:
-            msg = (
-                "An output directory is required to be specified for netcdf"
-                "initialization."
-            )
-            raise ValueError(msg)
-
-        if separate_files is None:
-            separate_files = True
-
-        self._netcdf_separate = separate_files
-
-        self._netcdf_initialized = True
-        self._netcdf_output_dir = pl.Path(output_dir)
-
-        if output_vars is None:
-            self._netcdf_output_vars = self.variables
-        else:
-            self._netcdf_output_vars = list(
-                set(output_vars).intersection(set(self.variables))
-            )
-            if len(self._netcdf_output_vars) == 0:
-                self._netcdf_initialized = False
-
-        return
-
-    def output(self):
-        if self._netcdf_initialized:
-            if self._verbose:
-                print(f"writing FULL timeseries output for: {self.name}")
-            self._write_netcdf_timeseries()
+        if self._verbose:
+            print(f"writing FULL timeseries output for: {self.name}")
+        for nc in self._netcdf_writers():
+            nc.add_time_block(0, self.doy, time_coord="doy")
+        for var in self._netcdf_output_vars:
+            self._netcdf[var].add_data_block(var, 0, self[var].data)
+        self._netcdf_written_stop = len(self.doy)
         return
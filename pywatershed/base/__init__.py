@@ -1,23 +1,31 @@
 from .accessor import Accessor
 from .adapter import Adapter
+from .aggregation import TemporalAggregator
+from .all_time_process import AllTimeProcess
 from .budget import Budget
 from .conservative_process import ConservativeProcess
 from .control import Control
 from .data_model import DatasetDict
+from .memory_output import MemoryOutput
 from .model import Model
 from .parameters import Parameters
+from .partitioned_model import PartitionedModel
 from .process import Process
 from .timeseries import TimeseriesArray
 
 __all__ = (
     "Accessor",
     "Adapter",
+    "AllTimeProcess",
     "Budget",
     "ConservativeProcess",
     "Control",
     "DatasetDict",
+    "MemoryOutput",
     "Model",
     "Parameters",
+    "PartitionedModel",
     "Process",
+    "TemporalAggregator",
     "TimeseriesArray",
 )
@@ -54,6 +54,10 @@ class AdapterNetcdf(Adapter):
         type: a variable dtype
         control: a Control object
         load_n_time_batches: number of times to read from file.
+        load_n_times: number of times in each batch read from file, an
+            alternative to load_n_time_batches, see NetCdfRead.
+        prefetch_n_batches: number of time batches to read ahead in a
+            background thread, see NetCdfRead.
 
     """
 
@@ -63,6 +67,8 @@ class AdapterNetcdf(Adapter):
         variable: str,
         control: Control,
         load_n_time_batches: int = 1,
+        prefetch_n_batches: int = 0,
+        load_n_times: int = None,
     ) -> None:
         super().__init__(variable)
         self.name = "AdapterNetcdf"
@@ -76,7 +82,11 @@ class AdapterNetcdf(Adapter):
             fname,
             start_time=self._start_time,
             end_time=self._end_time,
-            load_n_time_batches=load_n_time_batches,
+            load_n_times=load_n_times,
+            load_n_time_batches=(
+                load_n_time_batches if load_n_times is None else None
+            ),
+            prefetch_n_batches=prefetch_n_batches,
         )
 
         # would like to make this a check if dim_sizes and type are available
@@ -106,12 +116,32 @@ class AdapterNetcdf(Adapter):
         )
         return None
 
+    def seek(self, itime_step: int) -> None:
+        """Position the adapter at a time step of the control.
+
+        The next advance reads the data for the time step after itime_step.
+
+        Args:
+            itime_step: The control time step, -1 is before the start time.
+        """
+        self._nc_read._itime_step[self._variable] = itime_step + 1
+        return None
+
     @property
     def data(self) -> np.array:
         """Return the data for the current time."""
         # TODO JLM: seems like we'd want to cache this data if we invoke once
         return self._nc_read.all_time(self._variable).data
 
+    def data_window(self, start: int, stop: int) -> np.ndarray:
+        """Return the data for a window of time steps of the control.
+
+        Args:
+            start: the first time step of the window.
+            stop: the time step after the last of the window.
+        """
+        return self._nc_read.get_time_window(self._variable, start, stop).data
+
 
 class AdapterOnedarray(Adapter):
     """Adapter subclass for an invariant 1-D numpy.array
@@ -147,7 +177,9 @@ def adapter_factory(
     var: adaptable,
     variable_name: str = None,
     control: Control = None,
-    load_n_time_batches: int = 1,
+    load_n_time_batches: int = None,
+    prefetch_n_batches: int = None,
+    load_n_times: int = None,
 ) -> "Adapter":
     """A function to return the appropriate subclass of Adapter
 
@@ -157,7 +189,12 @@ def adapter_factory(
        control: a Control object
        variable_dim_sizes: for an AdapterNetcdf
        variable_type: for an AdapterNetcdf
-       load_n_time_batches: for an AdapterNetcdf
+       load_n_time_batches: for an AdapterNetcdf, if None taken from the
+           control option of the same name, defaulting to 1.
+       prefetch_n_batches: for an AdapterNetcdf, if None taken from the
+           control option of the same name, defaulting to 0.
+       load_n_times: for an AdapterNetcdf, takes precedence over
+           load_n_time_batches when not None.
 
     """
     if isinstance(var, Adapter):
@@ -167,11 +204,18 @@ def adapter_factory(
     elif isinstance(var, (str, pl.Path)):
         # Paths and strings are considered paths to netcdf files
         if pl.Path(var).suffix == ".nc":
+            options = control.options if control is not None else {}
+            if load_n_time_batches is None:
+                load_n_time_batches = options.get("load_n_time_batches", 1)
+            if prefetch_n_batches is None:
+                prefetch_n_batches = options.get("prefetch_n_batches", 0)
             return AdapterNetcdf(
                 var,
                 variable=variable_name,
                 control=control,
                 load_n_time_batches=load_n_time_batches,
+                prefetch_n_batches=prefetch_n_batches,
+                load_n_times=load_n_times,
             )
 
     elif isinstance(var, np.ndarray) and len(var.shape) == 1:
@@ -0,0 +1,198 @@
+from typing import Union
+
+import numpy as np
+
+from ..base.control import Control
+
+aggregation_periods = ("month", "year", "water_year")
+aggregation_stats = ("sum", "mean", "min", "max")
+
+
+class TemporalAggregator:
+    """Accumulate statistics of variables over periods of time.
+
+    Each time step of the Control belongs to a period. Values of variables
+    are accumulated over the time steps of a period into running sums,
+    minimums and maximums. When the first time step of the following period
+    is reached, the statistics of the completed period are computed and are
+    available as records until the next period completes.
+
+    On each time step, call advance() once and then accumulate() for each
+    variable. The final period, which may be partial, is completed by
+    finalize().
+
+    Args:
+        control: The Control whose current time determines the period.
+        period: One of "month", "year" (calendar year), "water_year"
+            (October through September, found from Control.current_dowy),
+            or a numpy array of np.datetime64 period start times for custom
+            periods. With custom periods, each period lasts until the next
+            start time and times before the first start time form a period of
+            their own.
+        stats: A list of the statistics to compute, from "sum", "mean",
+            "min", and "max".
+
+    Examples:
+    ---------
+
+    >>> import numpy as np
+    >>> import pywatershed as pws
+    >>> control = pws.Control(
+    ...     start_time=np.datetime64("2000-01-30"),
+    ...     end_time=np.datetime64("2000-02-02"),
+    ...     time_step=np.timedelta64(1, "D"),
+    ... )
+    >>> agg = pws.TemporalAggregator(control, "month", ["sum", "max"])
+    >>> agg.add_variable("x", (2,))
+    >>> for istep in range(control.n_times):
+    ...     control.advance()
+    ...     if agg.advance():
+    ...         print(agg.record_time, agg.records["x"])
+    ...     agg.accumulate("x", np.array([1.0, istep]))
+    ...
+    2000-01-30 {'sum': array([2., 1.]), 'max': array([1., 1.])}
+    >>> _ = agg.finalize()
+    >>> print(agg.record_time, agg.records["x"])
+    2000-02-01 {'sum': array([2., 5.]), 'max': array([1., 3.])}
+    """
+
+    def __init__(
+        self,
+        control: Control,
+        period: Union[str, np.ndarray] = "month",
+        stats: list = ("mean",),
+    ):
+        if isinstance(period, str):
+            if period not in aggregation_periods:
+                msg = (
+                    f"period '{period}' is not one of {aggregation_periods} "
+                    "or an array of period start times"
+                )
+                raise ValueError(msg)
+        else:
+            period = np.sort(np.array(period, dtype="datetime64[s]"))
+
+        bad_stats = set(stats).difference(aggregation_stats)
+        if len(bad_stats):
+            msg = f"stats {sorted(bad_stats)} not in {aggregation_stats}"
+            raise ValueError(msg)
+
+        self.control = control
+        self.period = period
+        self.stats = list(stats)
+
+        self._sums = {}
+        self._mins = {}
+        self._maxs = {}
+        self._count = 0
+        self._period_key = None
+        self._period_start = None
+
+        self.records = {}
+        self.record_time = None
+        self.n_records = 0
+        return
+
+    @property
+    def variables(self) -> list:
+        """The names of the accumulated variables."""
+        return list(self._sums.keys())
+
+    def add_variable(
+        self, name: str, shape: tuple, dtype: np.dtype = np.float64
+    ) -> None:
+        """Allocate the accumulators of a variable.
+
+        Args:
+            name: The variable name.
+            shape: The shape of the variable on a time step.
+            dtype: The type of the variable, the sums and means are float64.
+        """
+        self._sums[name] = np.zeros(shape, dtype=np.float64)
+        self._mins[name] = np.zeros(shape, dtype=dtype)
+        self._maxs[name] = np.zeros(shape, dtype=dtype)
+        return
+
+    def _current_period_key(self):
+        time = self.control.current_time
+        if isinstance(self.period, np.ndarray):
+            return np.searchsorted(self.period, time, side="right")
+        elif self.period == "month":
+            return time.astype("datetime64[M]")
+        elif self.period == "year":
+            return time.astype("datetime64[Y]")
+        else:
+            # water_year: days of the water year run ahead of days of the
+            # calendar year only from October to December
+            year = self.control.current_year
+            if self.control.current_dowy <= self.control.current_doy:
+                year += 1
+            return year
+
+    def advance(self) -> bool:
+        """Advance to the current time of the Control.
+
+        Returns:
+            True if the current time starts a new period after a previous
+            period was accumulated, whose statistics are then available in
+            records and record_time.
+        """
+        key = self._current_period_key()
+        completed = False
+        if self._count and key != self._period_key:
+            self._complete()
+            completed = True
+
+        if self._count == 0:
+            self._period_key = key
+            self._period_start = self.control.current_time
+
+        self._count += 1
+        return completed
+
+    def accumulate(self, name: str, values: np.ndarray) -> None:
+        """Accumulate the values of a variable for the current time step.
+
+        Args:
+            name: The variable name.
+            values: The values of the variable on the current time step.
+        """
+        if self._count == 1:
+            self._sums[name][:] = values
+            self._mins[name][:] = values
+            self._maxs[name][:] = values
+        else:
+            self._sums[name] += values
+            np.minimum(self._mins[name], values, out=self._mins[name])
+            np.maximum(self._maxs[name], values, out=self._maxs[name])
+        return
+
+    def finalize(self) -> bool:
+        """Complete the final period.
+
+        Returns:
+            True if there was a period with accumulated values, whose
+            statistics are then available in records and record_time.
+        """
+        if not self._count:
+            return False
+        self._complete()
+        return True
+
+    def _complete(self) -> None:
+        results = {
+            "sum": self._sums,
+            "mean": {
+                name: sums / self._count for name, sums in self._sums.items()
+            },
+            "min": self._mins,
+            "max": self._maxs,
+        }
+        self.records = {
+            name: {stat: results[stat][name].copy() for stat in self.stats}
+            for name in self.variables
+        }
+        self.record_time = self._period_start
+        self.n_records += 1
+        self._count = 0
+        return
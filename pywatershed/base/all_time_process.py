@@ -0,0 +1,180 @@
+import pathlib as pl
+from warnings import warn
+
+from ..utils.netcdf_utils import background_writer
+from ..utils.output_backends import get_output_backend
+from .process import Process
+
+
+class AllTimeProcess(Process):
+    """A Process calculating its variables for many time steps at once.
+
+    Processes such as PRMSSolarGeometry and PRMSAtmosphere calculate their
+    variables for all time (or for windows of time) rather than on each time
+    step. Their NetCDF output is written in blocks of time steps, as soon as
+    they are calculated, by writers created on initialize_netcdf. The blocks
+    are queued to the BackgroundWriter, so the writes overlap the time steps
+    of the model, and the writes are waited for on finalize.
+
+    Subclasses implement _write_netcdf_blocks, which queues the writes of
+    the calculated time steps not yet written (those before
+    self._netcdf_written_stop are written) to the writers of
+    self._netcdf_writers() and self._netcdf[var].
+
+    When output aggregation is requested, the statistics are instead
+    accumulated on each time step and written by Process, from the current
+    values of the variables.
+    """
+
+    def _netcdf_blocks(self) -> bool:
+        # is output written in blocks of time steps?
+        return self._netcdf_initialized and self._netcdf_aggregator is None
+
+    def _write_netcdf_blocks(self) -> None:
+        raise NotImplementedError("This must be overridden")
+
+    def _init_netcdf_writers(self) -> None:
+        write_class, suffix = get_output_backend(self._netcdf_backend)
+        # blocks of time steps are written in the background, overlapping
+        # the time steps of the model
+        writer = background_writer(
+            self.control.options.get("netcdf_write_queue_size")
+        )
+        if self._netcdf_separate:
+            files = {var: [var] for var in self._netcdf_output_vars}
+        else:
+            files = {self.name: self._netcdf_output_vars}
+
+        self._netcdf_output_dir.mkdir(parents=True, exist_ok=True)
+        self._netcdf = {}
+        for file_name, file_vars in files.items():
+            nc = write_class(
+                self._netcdf_output_dir / f"{file_name}{suffix}",
+                self._params.coords,
+                file_vars,
+                {var: self.meta[var] for var in file_vars},
+                writer=writer,
+                spatial_subset=self._netcdf_spatial_subset(
+                    file_vars, self._netcdf_spatial_selection
+                ),
+                layout=self._netcdf_layout,
+            )
+            for var in file_vars:
+                self._netcdf[var] = nc
+
+        # the time steps before this are written
+        self._netcdf_written_stop = 0
+        return
+
+    def _netcdf_writers(self) -> list:
+        # the unique writers, a file may hold several variables
+        return list({id(nc): nc for nc in self._netcdf.values()}.values())
+
+    def initialize_netcdf(
+        self,
+        output_dir: [str, pl.Path] = None,
+        separate_files: bool = None,
+        output_vars: list = None,
+        **kwargs,
+    ):
+        aggregation = kwargs.get("aggregation")
+        if aggregation is None:
+            aggregation = self.control.options.get("netcdf_output_aggregation")
+        if aggregation is not None:
+            # statistics are accumulated on each time step, these processes
+            # have no budget
+            kwargs.pop("budget_args", None)
+            super().initialize_netcdf(
+                output_dir=output_dir,
+                separate_files=separate_files,
+                output_vars=output_vars,
+                **kwargs,
+            )
+            return
+
+        if (
+            self._netcdf_initialized
+            and "verbosity" in self.control.options.keys()
+            and self.control.options["verbosity"] > 5
+        ):
+            msg = (
+                f"{self.name} class previously initialized netcdf output "
+                f"in {self._netcdf_output_dir}"
+            )
+            warn(msg)
+            return
+
+        if (
+            "verbosity" in self.control.options.keys()
+            and self.control.options["verbosity"] > 5
+        ):
+            print(f"initializing netcdf output for: {self.name}")
+
+        (
+            output_dir,
+            output_vars,
+            separate_files,
+        ) = self._reconcile_nc_args_w_control_opts(
+            output_dir, output_vars, separate_files
+        )
+
+        # apply defaults if necessary
+        if output_dir is None:
+            msg = (
+                "An output directory is required to be specified for netcdf"
+                "initialization."
+            )
+            raise ValueError(msg)
+
+        if separate_files is None:
+            separate_files = True
+
+        self._netcdf_separate = separate_files
+
+        self._netcdf_initialized = True
+        self._netcdf_output_dir = pl.Path(output_dir)
+        self._netcdf_backend = kwargs.get("backend")
+        if self._netcdf_backend is None:
+            self._netcdf_backend = self.control.options.get("output_backend")
+        self._netcdf_spatial_selection = kwargs.get("spatial_subset")
+        self._netcdf_layout = kwargs.get("layout")
+        if self._netcdf_layout is None:
+            self._netcdf_layout = self.control.options.get(
+                "netcdf_output_layout"
+            )
+
+        if output_vars is None:
+            self._netcdf_output_vars = self.variables
+        else:
+            self._netcdf_output_vars = list(
+                set(output_vars).intersection(set(self.variables))
+            )
+            if len(self._netcdf_output_vars) == 0:
+                self._netcdf_initialized = False
+
+        if self._netcdf_initialized:
+            self._init_netcdf_writers()
+            # variables already calculated
+            self._write_netcdf_blocks()
+
+        return
+
+    def _finalize_netcdf(self) -> None:
+        if not self._netcdf_blocks():
+            super()._finalize_netcdf()
+            return
+        self._write_netcdf_blocks()
+        for nc in self._netcdf_writers():
+            # waits for the background writes
+            nc.close()
+        print(f"Wrote files for {self.name} in: {self._netcdf_output_dir}")
+        self._netcdf_initialized = False
+        return
+
+    def output(self):
+        if not self._netcdf_blocks():
+            super().output()
+            return
+        # the calculated time steps are written as blocks
+        self._write_netcdf_blocks()
+        return
@@ -3,14 +3,14 @@ from copy import deepcopy
 from typing import Literal, Union
 from warnings import warn
 
-import netCDF4 as nc4
 import numpy as np
 
 from pywatershed.base.control import Control
 
 from ..constants import zero
 from ..utils.formatting import pretty_print
-from ..utils.netcdf_utils import NetCdfWrite
+from ..utils.netcdf_utils import background_writer
+from ..utils.output_backends import get_output_backend
 from .accessor import Accessor
 from .parameters import Parameters
 
@@ -236,6 +236,35 @@ class Budget(Accessor):
         self._sum_component_accumulations()
         return
 
+    def get_checkpoint_state(self) -> dict:
+        """Get the accumulations of the Budget for a checkpoint.
+
+        Returns:
+            A dictionary with the accumulation start time and copies of the
+            accumulations of each component.
+        """
+        accumulations = {}
+        for component in self.components:
+            accumulations[component] = {
+                var: np.array(accum, copy=True)
+                for var, accum in self._accumulations[component].items()
+            }
+        return {
+            "accum_start_time": self._accum_start_time,
+            "accumulations": accumulations,
+        }
+
+    def set_checkpoint_state(self, state: dict) -> None:
+        """Set the accumulations of the Budget from a checkpoint.
+
+        Args:
+            state: A dictionary as returned by get_checkpoint_state.
+        """
+        self.set_initial_accumulations(
+            state["accumulations"], state["accum_start_time"]
+        )
+        return
+
     def advance(self):
         """Advance time (taken from storageUnit)"""
         if self._itime_step >= self.control.itime_step:
@@ -665,11 +694,22 @@ class Budget(Accessor):
         extra_coords: dict = None,
         write_sum_vars: Union[list, bool] = True,
         write_individual_vars: bool = False,
+        backend: str = None,
+        spatial_subset: dict = None,
+        layout: Union[str, dict] = None,
     ) -> None:
         """Initialize NetCDF output
 
         Args:
             output_dir: directory for NetCDF file
+            backend: the output backend, "netcdf" or "zarr", defaults to the
+                control option output_backend or else "netcdf".
+            spatial_subset: optional selection of the locations to write for
+                a unit basis budget, {coordinate name: IDs or mask}, see
+                NetCdfWrite. Ignored for a global basis.
+            layout: optional chunking and compression of the output, see
+                output_layout(), defaults to the control option
+                netcdf_output_layout.
 
         Returns:
             None
@@ -681,7 +721,12 @@ class Budget(Accessor):
         # make working directory
         output_dir = pl.Path(output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
-        nc_path = pl.Path(output_dir) / f"{self.description}_budget.nc"
+        if backend is None:
+            backend = self.control.options.get("output_backend")
+        write_class, suffix = get_output_backend(backend)
+        if layout is None:
+            layout = self.control.options.get("netcdf_output_layout")
+        nc_path = pl.Path(output_dir) / f"{self.description}_budget{suffix}"
 
         # Construct a dictionary of {term: var}. If the variables are not
         # in a term their term is None
@@ -729,19 +774,37 @@ class Budget(Accessor):
         if self.basis == "unit":
             coordinates = params.coords
             meta = self.meta
+            if spatial_subset is not None:
+                spatial_subset = {
+                    key: val
+                    for key, val in spatial_subset.items()
+                    if key in coordinates.keys()
+                }
         else:
+            spatial_subset = None
             coordinates = {"one": 0}
             meta = deepcopy(self.meta)
             for kk, vv in meta.items():
                 meta[kk]["dims"] = ("one",)
 
-        self._netcdf = NetCdfWrite(
+        writer = None
+        queue_size = self.control.options.get("netcdf_write_queue_size")
+        if queue_size:
+            writer = background_writer(queue_size)
+
+        self._netcdf = write_class(
             nc_path,
             coordinates,
             self._netcdf_output_var_dict,
             meta,
             extra_coords=extra_coords,
             global_attrs=global_attrs,
+            buffer_n_times=self.control.options.get(
+                "netcdf_buffer_n_times", 1
+            ),
+            writer=writer,
+            spatial_subset=spatial_subset,
+            layout=layout,
         )
 
         # todo jlm: put terms in to metadata
@@ -755,24 +818,21 @@ class Budget(Accessor):
 
         """
         if self._output_netcdf:
-            self._netcdf.time[self.control.itime_step] = nc4.date2num(
-                self.control.current_datetime, self._netcdf.time.units
+            self._netcdf.add_simulation_time(
+                self.control.itime_step, self.control.current_datetime
             )
             for nc_group, group_vars in self._netcdf_output_var_dict.items():
                 for nc_var in group_vars:
                     var_self_name = nc_var
 
                     if nc_group is None:
-                        var_path = nc_var
-                        self._netcdf.dataset[var_path][
-                            self.control.itime_step, :
-                        ] = self[var_self_name]
-
+                        value = self[var_self_name]
                     else:
-                        var_path = f"{nc_group}/{nc_var}"
-                        self._netcdf.dataset[var_path][
-                            self.control.itime_step, :
-                        ] = self[nc_group][var_self_name]
+                        value = self[nc_group][var_self_name]
+
+                    self._netcdf.add_data(
+                        nc_var, self.control.itime_step, np.atleast_1d(value)
+                    )
 
         return
 
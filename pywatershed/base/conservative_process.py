@@ -1,5 +1,5 @@
 import pathlib as pl
-from typing import Literal
+from typing import Literal, Union
 from warnings import warn
 
 from ..base import meta
@@ -217,6 +217,10 @@ class ConservativeProcess(Process):
         output_vars: list = None,
         extra_coords: dict = None,
         addtl_output_vars: list = None,
+        aggregation: dict = None,
+        backend: str = None,
+        spatial_subset: dict = None,
+        layout: Union[str, dict] = None,
     ) -> None:
         if self._netcdf_initialized:
             msg = (
@@ -232,6 +236,10 @@ class ConservativeProcess(Process):
             output_vars=output_vars,
             extra_coords=extra_coords,
             addtl_output_vars=addtl_output_vars,
+            aggregation=aggregation,
+            backend=backend,
+            spatial_subset=spatial_subset,
+            layout=layout,
         )
 
         if self.budget is not None:
@@ -239,6 +247,18 @@ class ConservativeProcess(Process):
                 budget_args = {}
             budget_args["output_dir"] = self._netcdf_output_dir
             budget_args["params"] = self._params
+            budget_args.setdefault("backend", self._netcdf_backend)
+            budget_args.setdefault("layout", self._netcdf_layout)
+            if spatial_subset is not None:
+                # only selections by coordinate apply to the budget
+                budget_args.setdefault(
+                    "spatial_subset",
+                    {
+                        key: val
+                        for key, val in spatial_subset.items()
+                        if key in self._params.coords.keys()
+                    },
+                )
 
             self.budget.initialize_netcdf(**budget_args)
 
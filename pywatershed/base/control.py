@@ -31,16 +31,26 @@ pws_control_options_avail = [
     "budget_type",
     "calc_method",
     "dprst_flag",
+    "forcing_memory_budget",
     # "restart",
     "input_dir",
-    # "load_n_time_batches",
+    "input_memory_budget",
+    "load_n_time_batches",
+    "netcdf_buffer_n_times",
+    "netcdf_output_aggregation",
     "netcdf_output_dir",
+    "netcdf_output_layout",
     "netcdf_output_var_names",
     "netcdf_output_separate_files",
+    "netcdf_write_queue_size",
+    "output_backend",
     "parameter_file",
+    "prefetch_n_batches",
+    "soltab_cache_dir",
     "start_time",
     "streamflow_module",
     "time_step_units",
+    "topology_cache_dir",
     "verbosity",
 ]
 
@@ -91,17 +101,47 @@ class Control(Accessor):
       * budget_type: one of [None, "warn", "error"]
       * calc_method: one of ["numpy", "numba", "fortran"]
       * dprst_flag: boolean if depression storage is included (true) or not.
+      * forcing_memory_budget: int number of bytes for the time windows in
+        which PRMSAtmosphere computes its forcings, see PRMSAtmosphere.
+        Default is None, all times are computed at once.
       * input_dir: str or pathlib.path directory to search for input data
+      * input_memory_budget: int number of bytes for the time batches of
+        the input files of a Model, sizing their time batches instead of
+        load_n_time_batches. See Model.
+      * load_n_time_batches: int number of time batches to read input files
+        in, see NetCdfRead. Default is 1, all times are read at once.
+      * netcdf_buffer_n_times: int number of time steps of NetCDF output to
+        buffer in memory and write as a block, see NetCdfWrite. Default is 1.
+      * netcdf_output_aggregation: dict of TemporalAggregator arguments to
+        write statistics over periods of time instead of every time step,
+        see Process.initialize_netcdf
       * netcdf_output_dir: str or pathlib.Path directory for output
+      * netcdf_output_layout: str profile name ("write-optimized",
+        "timeseries-read-optimized") or dict of the chunking and
+        compression of output variables, see output_layout
       * netcdf_output_var_names: a list of variable names to output
       * netcdf_output_separate_files: bool if output is grouped by Process or
         if each variable is written to an individual file
+      * netcdf_write_queue_size: int, if positive NetCDF output is written by
+        a background thread with at most this many pending writes, see
+        BackgroundWriter. Default is 0, output is written inline.
+      * output_backend: str name of the backend writing Process and Budget
+        output, "netcdf" (default) or "zarr", see get_output_backend.
       * parameter_file: the name of a parameter file to use
+      * prefetch_n_batches: int number of input time batches to read ahead
+        in a background thread, see NetCdfRead. Default is 0.
+      * soltab_cache_dir: str or pathlib.Path directory in which
+        PRMSSolarGeometry caches its solar tables, see PRMSSolarGeometry.
+        Default is None, no caching.
       * streamflow_module: the selected streamflow module in PRMS.
       * start_time: np.datetime64
       * end_time: np.datetime64
       * time_step_units: str containing single character code for
         np.timedelta64
+      * topology_cache_dir: str or pathlib.Path directory in which
+        PRMSChannel and FlowGraph cache the topology of their networks, see
+        pywatershed.utils.topology.TopologyIndex. Default is None, no
+        caching on disk.
       * verbosity: 0-10
 
     Available PRMS legacy options:
@@ -448,6 +488,33 @@ class Control(Accessor):
 
         return None
 
+    def set_current_time(self, current_time: np.datetime64) -> None:
+        """Set the current time, e.g. to restart from a checkpoint.
+
+        Args:
+            current_time: A time in [start_time, end_time] on the time step
+                or the init_time.
+        """
+        current_time = np.datetime64(current_time).astype(
+            self._start_time.dtype
+        )
+        n_steps = (current_time - self._start_time) / self._time_step
+        if (
+            n_steps != int(n_steps)
+            or current_time < self._init_time
+            or current_time > self._end_time
+        ):
+            msg = f"{current_time} is not a valid time for this Control"
+            raise ValueError(msg)
+
+        self._itime_step = int(n_steps)
+        self._current_time = current_time
+        if self._itime_step < 0:
+            self._previous_time = None
+        else:
+            self._previous_time = current_time - self._time_step
+        return None
+
     def edit_end_time(self, new_end_time: np.datetime64) -> None:
         """Supply a new end time for the simulation.
 
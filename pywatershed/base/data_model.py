@@ -1,15 +1,17 @@
 import warnings
 from copy import deepcopy
-from typing import Iterable, Literal
+from typing import TYPE_CHECKING, Iterable, Literal
 
 import cftime
 import netCDF4 as nc4
 import numpy as np
-import xarray as xr
 
 from ..constants import fileish, fill_values_dict, np_type_to_netcdf_type_dict
 from .accessor import Accessor
 
+if TYPE_CHECKING:
+    import xarray as xr
+
 # This file defines the data model for pywatershed. It is called a
 # "dataset_dict" and has a invertible mapping with non-hierarchical netcdf
 # or xarray datasets.
@@ -336,6 +338,8 @@ class DatasetDict(Accessor):
     def from_ds(cls, ds):
         """Get this class from a dataset (nc4 or xarray)."""
         # detect typ as xr or nc4
+        import xarray as xr
+
         if isinstance(ds, xr.Dataset):
             return cls(**xr_ds_to_dd(ds))
         elif isinstance(ds, nc4.Dataset):
@@ -354,7 +358,7 @@ class DatasetDict(Accessor):
         else:
             return cls(**nc4_ds_to_dd(nc_file, use_xr_enc=encoding))
 
-    def to_xr_ds(self) -> xr.Dataset:
+    def to_xr_ds(self) -> "xr.Dataset":
         """Export to an xarray Dataset"""
         return dd_to_xr_ds(self.data)
 
@@ -751,6 +755,8 @@ def xr_ds_to_dd(file_or_ds, schema_only=False, encoding=True) -> dict:
     var_metadata dictionary with the same keys found in the union of
     the keys of coords and data_vars.
     """
+    import xarray as xr
+
     if not isinstance(file_or_ds, xr.Dataset):
         xr_ds = xr.open_dataset(file_or_ds)
     else:
@@ -847,7 +853,7 @@ def dd_to_xr_dd(dd: dict) -> dict:
     return dd
 
 
-def dd_to_xr_ds(dd: dict) -> xr.Dataset:
+def dd_to_xr_ds(dd: dict) -> "xr.Dataset":
     """pywatershed dataset dict to xarray dataset
 
     The pyws data model moves metadata off the variables to a separate
@@ -855,6 +861,8 @@ def dd_to_xr_ds(dd: dict) -> xr.Dataset:
     the keys of coords and data_vars. This maps the metadata back to the
     variables.
     """
+    import xarray as xr
+
     return xr.Dataset.from_dict(dd_to_xr_dd(dd))
 
 
@@ -993,6 +1001,8 @@ def nc4_ds_to_xr_dd(file_or_ds, xr_enc: dict = None) -> dict:
 
 
 def _get_xr_encoding(nc_file) -> dict:
+    import xarray as xr
+
     ds = xr.open_dataset(nc_file)
     encoding = {}
     encoding["global"] = ds.encoding
@@ -1,16 +1,18 @@
 import pathlib as pl
-from typing import Literal
+from typing import Literal, Union
 from warnings import warn
 
-import networkx as nx
 import numpy as np
+from numba import prange
 
 from pywatershed.base.accessor import Accessor
 from pywatershed.base.adapter import adaptable
 from pywatershed.base.conservative_process import ConservativeProcess
 from pywatershed.base.control import Control
-from pywatershed.constants import nan, zero
+from pywatershed.constants import fileish, nan, numba_num_threads, zero
 from pywatershed.parameters import Parameters
+from pywatershed.utils.numba_utils import njit
+from pywatershed.utils.topology import TopologyIndex
 
 
 class FlowNode(Accessor):
@@ -91,9 +93,131 @@ class FlowNode(Accessor):
         raise Exception("This must be overridden")
 
 
+class FlowNodeArrays(Accessor):
+    """The FlowNodes of one kind as contiguous arrays.
+
+    FlowNodeArrays is the struct-of-arrays counterpart of :class:`FlowNode`
+    for the array engine of :class:`FlowGraph`. It represents all the
+    FlowNodes of a FlowNodeMaker in a FlowGraph: their state and parameters
+    are rows of matrices of shape [n_fields, nnodes] shared by all the
+    FlowNodeArrays of the graph and indexed by the graph index of the nodes.
+    Methods operate on all the nodes at once and properties are arrays over
+    the nodes, in the order of graph_indices.
+
+    The subtimestep calculation of a single node is the class attribute
+    kernel, a numba-compiled function (set as a staticmethod)
+
+        kernel(isubstep, inflow_upstream, inflow_lateral, state, params,
+               inode) -> outflow_substep
+
+    where state and params are the shared float64 matrices, of which the
+    node uses the rows given by state_names and param_names (in order) and
+    the column inode. FlowGraph calls the kernels of all the nodes for all
+    subtimesteps in a single compiled function: each node is calculated for
+    all subtimesteps once its upstream nodes are calculated, possibly
+    concurrently with other nodes (see flow_graph_sweep). A kernel must
+    therefore only write to the column inode of state.
+
+    See :class:`PassThroughFlowNodeArrays` for a simple example.
+    """
+
+    # The numba-compiled subtimestep calculation of a node.
+    kernel = None
+    # The names of the rows of the state matrix used by the kernel.
+    state_names = ()
+    # The names of the rows of the parameter matrix used by the kernel.
+    param_names = ()
+
+    def __init__(self, control: Control, n_nodes: int, params: dict = None):
+        """Initialize the FlowNodeArrays.
+
+        Args:
+          control: A Control object.
+          n_nodes: The number of nodes.
+          params: A dictionary of the arrays (over the nodes) of the
+            param_names.
+        """
+        self.control = control
+        self.n_nodes = n_nodes
+        self._param_values = {} if params is None else params
+        return
+
+    @staticmethod
+    def get_init_values() -> dict:
+        """The initial values of the state_names, zero if not given."""
+        return {}
+
+    def bind(
+        self, state: np.ndarray, params: np.ndarray, graph_indices: np.ndarray
+    ) -> None:
+        """Place the nodes in the state and parameter matrices of a graph.
+
+        Args:
+          state: The state matrix [n_fields, nnodes] of the graph.
+          params: The parameter matrix [n_fields, nnodes] of the graph.
+          graph_indices: The graph indices of the nodes.
+        """
+        self._state = state
+        self._params = params
+        self.graph_indices = graph_indices
+        init_values = self.get_init_values()
+        for irow, name in enumerate(self.state_names):
+            state[irow, graph_indices] = init_values.get(name, zero)
+        for irow, name in enumerate(self.param_names):
+            params[irow, graph_indices] = self._param_values[name]
+        return
+
+    def get_state(self, name: str) -> np.ndarray:
+        """Get a copy of a state variable of the nodes."""
+        irow = self.state_names.index(name)
+        return self._state[irow, self.graph_indices]
+
+    def set_state(self, name: str, values: np.ndarray) -> None:
+        """Set a state variable of the nodes."""
+        irow = self.state_names.index(name)
+        self._state[irow, self.graph_indices] = values
+        return
+
+    def prepare_timestep(self):
+        "Prepare the nodes for subtimestep calculations."
+        raise Exception("This must be overridden")
+
+    def advance(self):
+        "Advance the nodes to the next timestep."
+        raise Exception("This must be overridden")
+
+    def finalize_timestep(self):
+        "Finalize the current timestep at the nodes."
+        raise Exception("This must be overridden")
+
+    @property
+    def outflow(self) -> np.ndarray:
+        "The average outflows of the nodes over the current timestep."
+        raise Exception("This must be overridden")
+
+    @property
+    def storage_change(self) -> np.ndarray:
+        "The storage changes of the nodes at the current subtimestep."
+        raise Exception("This must be overridden")
+
+    @property
+    def storage(self) -> np.ndarray:
+        "The storages of the nodes at the current subtimestep."
+        raise Exception("This must be overridden")
+
+    @property
+    def sink_source(self) -> np.ndarray:
+        "The sink or source amounts of the nodes at the current subtimestep."
+        raise Exception("This must be overridden")
+
+
 class FlowNodeMaker(Accessor):
     """FlowNodeMaker instantiates FlowNodes with their data.
 
+    A FlowNodeMaker may also instantiate all of its nodes in a graph as
+    :class:`FlowNodeArrays` for the array engine of :class:`FlowGraph` by
+    overriding get_node_arrays.
+
     See :class:`FlowGraph` for related examples and discussion.
     """
 
@@ -121,6 +245,138 @@ class FlowNodeMaker(Accessor):
         """
         raise Exception("This must be overridden")
 
+    def get_node_arrays(
+        self, control: Control, indices: np.ndarray
+    ) -> Union[FlowNodeArrays, None]:
+        """Instantiate the FlowNodes at given indices as FlowNodeArrays.
+
+        Optional, FlowNodeMakers not overriding this are run by the FlowNode
+        engine of FlowGraph.
+
+        Args:
+          control: A Control object.
+          indices: The indices in the discretization and parameter data of
+            the nodes.
+
+        Returns:
+          The FlowNodeArrays of the nodes or None if not supported.
+        """
+        return None
+
+
+# The compiled sweeps of FlowGraph over the subtimesteps and nodes, keyed by
+# the tuple of kernels of the node kinds in the graph and parallel.
+_flow_graph_sweeps = {}
+
+
+def _kernel_dispatch(kernels: tuple) -> callable:
+    """A compiled function calling the kernel at a (kind) code."""
+    kernel = kernels[0]
+    if len(kernels) == 1:
+
+        def dispatch(code, isubstep, upstream, lateral, state, params, inode):
+            return kernel(isubstep, upstream, lateral, state, params, inode)
+
+        return njit(cache=False)(dispatch)
+
+    dispatch_rest = _kernel_dispatch(kernels[1:])
+
+    def dispatch(code, isubstep, upstream, lateral, state, params, inode):
+        if code == 0:
+            return kernel(isubstep, upstream, lateral, state, params, inode)
+        return dispatch_rest(
+            code - 1, isubstep, upstream, lateral, state, params, inode
+        )
+
+    return njit(cache=False)(dispatch)
+
+
+def flow_graph_sweep(kernels: tuple, parallel: bool = False) -> callable:
+    """The compiled sweep of a FlowGraph over subtimesteps and nodes.
+
+    The sweep has the signature
+
+        sweep(n_substeps, stage_offsets, task_offsets, task_nodes,
+              upstream_offsets, upstream_nodes, node_kernel, inflows, state,
+              params, upstream_inflow_sub, upstream_inflow_acc,
+              outflow_substep) -> None
+
+    and calculates the nodes on a schedule (see
+    pywatershed.utils.topology.routing_schedule): the stages in sequence,
+    the tasks of a stage concurrently (in parallel) and the nodes of a task
+    in order. Each node is calculated for all subtimesteps with its kernel
+    node_kernel[inode] of kernels, its upstream inflow on each subtimestep
+    being the sum, in routing order, of the subtimestep outflows of its
+    upstream nodes. The results are identical to calculating all nodes in
+    routing order on each subtimestep, as FlowGraph.calculate does for
+    FlowNodes.
+
+    Args:
+      kernels: A tuple of the kernels of FlowNodeArrays.
+      parallel: Calculate the tasks of a stage in parallel?
+
+    Returns:
+      The compiled sweep, created once for a tuple of kernels.
+    """
+    key = (kernels, parallel)
+    if key in _flow_graph_sweeps.keys():
+        return _flow_graph_sweeps[key]
+
+    dispatch = _kernel_dispatch(kernels)
+
+    def sweep(
+        n_substeps,
+        stage_offsets,
+        task_offsets,
+        task_nodes,
+        upstream_offsets,
+        upstream_nodes,
+        node_kernel,
+        inflows,
+        state,
+        params,
+        upstream_inflow_sub,
+        upstream_inflow_acc,
+        outflow_substep,
+    ):
+        # the subtimestep outflows of the nodes
+        outflow_sub = np.zeros((inflows.shape[0], n_substeps))
+        for istage in range(len(stage_offsets) - 1):
+            for itask in prange(
+                stage_offsets[istage], stage_offsets[istage + 1]
+            ):
+                for ii in range(task_offsets[itask], task_offsets[itask + 1]):
+                    inode = task_nodes[ii]
+                    upstream_acc = zero
+                    upstream = zero
+                    for istep in range(n_substeps):
+                        upstream = zero
+                        for kk in range(
+                            upstream_offsets[inode],
+                            upstream_offsets[inode + 1],
+                        ):
+                            upstream += outflow_sub[upstream_nodes[kk], istep]
+
+                        outflow_sub[inode, istep] = dispatch(
+                            node_kernel[inode],
+                            istep,
+                            upstream,
+                            inflows[inode],
+                            state,
+                            params,
+                            inode,
+                        )
+                        upstream_acc += upstream
+
+                    upstream_inflow_sub[inode] = upstream
+                    upstream_inflow_acc[inode] = upstream_acc
+                    outflow_substep[inode] = outflow_sub[inode, n_substeps - 1]
+
+        return
+
+    _flow_graph_sweeps[key] = njit(cache=False, parallel=parallel)(sweep)
+    return _flow_graph_sweeps[key]
+
 
 def type_check(scalar: float):
     assert isinstance(scalar, float)
@@ -186,6 +442,19 @@ class FlowGraph(ConservativeProcess):
     :class:`FlowNode` base class code and also the code for
     :class:`FlowNodeMaker`.
 
+    FlowGraph has two engines. The "nodes" engine calls the methods of each
+    :class:`FlowNode` on each subtimestep. The "arrays" engine is used when
+    every :class:`FlowNodeMaker` of the graph provides its nodes as
+    :class:`FlowNodeArrays`: the state of the nodes is held in contiguous
+    arrays and all subtimesteps over all nodes are calculated by a single
+    compiled function calling a compiled kernel for each kind of node, which
+    is much faster on large graphs. When NUMBA_NUM_THREADS > 1, the arrays
+    engine calculates independent basins (connected components of the
+    graph), balanced across the threads by number of nodes, in parallel or,
+    if a basin dominates the graph, the nodes of each topological level in
+    parallel. The "nodes" engine remains for FlowNodes without
+    arrays, such as custom FlowNodes.
+
     Examples:
     ---------
 
@@ -340,6 +609,8 @@ class FlowGraph(ConservativeProcess):
         budget_type: Literal["defer", None, "warn", "error"] = "defer",
         allow_disconnected_nodes: bool = False,
         type_check_nodes: bool = False,
+        engine: Literal[None, "arrays", "nodes"] = None,
+        topology_cache_dir: fileish = None,
         verbose: bool = None,
     ):
         """Initialize a FlowGraph.
@@ -372,7 +643,15 @@ class FlowGraph(ConservativeProcess):
               in PRMS, so allowing is a convenience but bad practive.
             type_check_nodes: Intended for debugging if FlowNodes are not
               compliant with their required float return values, which can
-              cause a lot or warnings or errors.
+              cause a lot or warnings or errors. Uses the "nodes" engine.
+            engine: One of [None, "arrays", "nodes"], the engine calculating
+              the nodes. None uses "arrays" when all the FlowNodeMakers
+              provide FlowNodeArrays (and nodes are not type checked) and
+              "nodes" otherwise.
+            topology_cache_dir: Optional directory in which the topology of
+              the graph (see pywatershed.utils.topology.TopologyIndex) is
+              cached, defaulting to the control option of the same name.
+              None does not cache on disk.
             verbose: Print extra diagnostic messages?
 
         The `parameters` argument is a :class:`Parameters` object which
@@ -473,6 +752,11 @@ class FlowGraph(ConservativeProcess):
         "A mask indicating on which nodes flow exits the graph."
         return self._outflow_mask
 
+    @property
+    def engine(self) -> str:
+        "The engine calculating the nodes, 'arrays' or 'nodes'."
+        return "nodes" if self._node_arrays is None else "arrays"
+
     def _set_initial_conditions(self) -> None:
         self._node_upstream_inflow_sub = np.zeros(self.nnodes) * nan
         self._node_upstream_inflow_acc = np.zeros(self.nnodes) * nan
@@ -481,55 +765,49 @@ class FlowGraph(ConservativeProcess):
 
     def _init_graph(self) -> None:
         params = self._params.parameters
-        # where do flows exit the graph?
-        self._outflow_mask = np.where(
-            params["to_graph_index"] == -1, True, False
+        self._to_graph_index = np.array(
+            params["to_graph_index"], dtype="int64"
         )
+        # where do flows exit the graph?
+        self._outflow_mask = self._to_graph_index == -1
 
-        # which nodes do not have upstream nodes?
-        self._headwater_nodes = set(range(self.nnodes)).difference(
-            set(params["to_graph_index"])
+        self._topology = TopologyIndex.from_to_index(
+            self._to_graph_index, cache_dir=self._topology_cache_dir
         )
 
-        connectivity = []
-        for inode in range(self.nnodes):
-            tonode = params["to_graph_index"][inode]
-            if tonode < 0:
-                continue
-            connectivity.append(
-                (
-                    inode,
-                    tonode,
-                )
-            )
-
-        # use networkx to calculate the Directed Acyclic Graph
-        if self.nnodes > 1:
-            self._graph = nx.DiGraph()
-            self._graph.add_edges_from(connectivity)
-            node_order = list(nx.topological_sort(self._graph))
-        else:
-            node_order = [0]
+        # which nodes do not have upstream nodes?
+        self._headwater_nodes = set(self._topology.headwaters.tolist())
 
-        # Check if the user is suppling disconnected nodes
-        disconnected_nodes_present = len(self._graph) != self.nnodes
+        # Check if the user is suppling disconnected nodes, these are
+        # headwaters at the top of the order
+        disconnected_nodes_present = (
+            self.nnodes > 1 and len(self._topology.isolated) > 0
+        )
 
         if disconnected_nodes_present:
             if not self._allow_disconnected_nodes:
                 raise ValueError("Disconnected nodes present in FlowGraph.")
             else:
                 warn("Disconnected nodes present in FlowGraph.")
-                wh_mask_set = set(np.where(self._outflow_mask)[0])
-                node_ord_set = set(node_order)
-                mask_not_node_ord = list(wh_mask_set - node_ord_set)
-                if len(mask_not_node_ord):
-                    node_order = mask_not_node_ord + node_order
 
-        self._node_order = np.array(node_order, dtype="int64")
+        self._node_order = self._topology.order
 
         # any performance for doing a hash table up front?
         # a hash {to_seg: [from_seg_0, ..., from_seg_n]}
 
+        if self._engine not in [None, "arrays", "nodes"]:
+            raise ValueError(f"Invalid engine: {self._engine}")
+        self._node_arrays = None
+        if self._engine == "arrays" or (
+            self._engine is None and not self._type_check_nodes
+        ):
+            self._init_node_arrays()
+            if self._engine == "arrays" and self._node_arrays is None:
+                msg = "Not all FlowNodeMakers provide FlowNodeArrays"
+                raise ValueError(msg)
+            if self._node_arrays is not None:
+                return
+
         # instatiate the nodes
         self._nodes = []
         for ii, (maker_name, maker_index) in enumerate(
@@ -575,6 +853,70 @@ class FlowGraph(ConservativeProcess):
             # nodes have the same variable and different metadata.
             self.meta[kk] = {"dims": ("nnodes",), "type": "float64"}
 
+    def _init_node_arrays(self) -> None:
+        params = self._params.parameters
+        maker_names = np.array(params["node_maker_name"])
+        maker_indices = np.array(params["node_maker_index"])
+
+        node_arrays = []
+        for maker_name in dict.fromkeys(maker_names.tolist()):
+            graph_indices = np.where(maker_names == maker_name)[0]
+            arrays = self._node_maker_dict[maker_name].get_node_arrays(
+                self.control, maker_indices[graph_indices]
+            )
+            if arrays is None:
+                return
+            node_arrays += [(arrays, graph_indices)]
+
+        # the state and parameters of all nodes, with rows for the kind of
+        # node with the most
+        n_state = max(len(arrays.state_names) for arrays, _ in node_arrays)
+        n_params = max(len(arrays.param_names) for arrays, _ in node_arrays)
+        self._node_state = np.zeros((max(n_state, 1), self.nnodes))
+        self._node_params = np.zeros((max(n_params, 1), self.nnodes))
+
+        kernels = []
+        self._node_kernel = np.zeros(self.nnodes, dtype="int64")
+        for arrays, graph_indices in node_arrays:
+            if arrays.kernel not in kernels:
+                kernels += [arrays.kernel]
+            self._node_kernel[graph_indices] = kernels.index(arrays.kernel)
+            arrays.bind(self._node_state, self._node_params, graph_indices)
+
+        self._node_arrays = [arrays for arrays, _ in node_arrays]
+        nb_parallel = (numba_num_threads is not None) and (
+            numba_num_threads > 1
+        )
+        self._sweep = flow_graph_sweep(tuple(kernels), parallel=nb_parallel)
+
+        # nodes are calculated concurrently on the threads
+        self._routing_schedule = self._topology.routing_schedule(
+            n_parts=numba_num_threads if nb_parallel else 1,
+        )
+        self._upstream_offsets = self._topology.upstream_offsets
+        self._upstream_nodes = self._topology.upstream_nodes
+
+        # the additional output variables are collected from the
+        # FlowNodeArrays having them, {var: [arrays, ...]}
+        if self._addtl_output_vars is None:
+            self._addtl_output_vars = []
+
+        self._addtl_output_vars_wh_collect = {}
+        for vv in self._addtl_output_vars:
+            has_vv = [
+                arrays for arrays in self._node_arrays if hasattr(arrays, vv)
+            ]
+            if len(has_vv):
+                self._addtl_output_vars_wh_collect[vv] = has_vv
+
+        msg = "Variable already set on FlowGraph."
+        for kk in self._addtl_output_vars_wh_collect.keys():
+            assert not hasattr(self, kk), msg
+            self[kk] = np.full([self.nnodes], np.nan)
+            self.meta[kk] = {"dims": ("nnodes",), "type": "float64"}
+
+        return
+
     def initialize_netcdf(
         self,
         output_dir: [str, pl.Path] = None,
@@ -582,6 +924,10 @@ class FlowGraph(ConservativeProcess):
         budget_args: dict = None,
         output_vars: list = None,
         extra_coords: dict = None,
+        aggregation: dict = None,
+        backend: str = None,
+        spatial_subset: dict = None,
+        layout: Union[str, dict] = None,
     ) -> None:
         if self._netcdf_initialized:
             msg = (
@@ -611,11 +957,20 @@ class FlowGraph(ConservativeProcess):
             output_vars=output_vars,
             extra_coords=extra_coords,
             addtl_output_vars=list(self._addtl_output_vars_wh_collect.keys()),
+            aggregation=aggregation,
+            backend=backend,
+            spatial_subset=spatial_subset,
+            layout=layout,
         )
 
         return
 
     def _advance_variables(self) -> None:
+        if self._node_arrays is not None:
+            for arrays in self._node_arrays:
+                arrays.advance()
+            return
+
         for node in self._nodes:
             node.advance()
 
@@ -623,6 +978,66 @@ class FlowGraph(ConservativeProcess):
         return
 
     def calculate(self, time_length: float, n_substeps: int = 24) -> None:
+        if self._node_arrays is None:
+            self._calculate_nodes(n_substeps)
+        else:
+            self._calculate_node_arrays(n_substeps)
+
+        self.node_negative_sink_source[:] = -1 * self.node_sink_source
+
+        # global mass balance term
+        self.outflows[:] = np.where(
+            self._outflow_mask, self.node_outflows, zero
+        )
+
+        if self.budget is not None:
+            self.budget.advance()
+            self.budget.calculate()
+
+        return
+
+    def _calculate_node_arrays(self, n_substeps: int) -> None:
+        for arrays in self._node_arrays:
+            arrays.prepare_timestep()
+
+        self._sweep(
+            n_substeps,
+            *self._routing_schedule,
+            self._upstream_offsets,
+            self._upstream_nodes,
+            self._node_kernel,
+            np.ascontiguousarray(self.inflows, dtype="float64"),
+            self._node_state,
+            self._node_params,
+            self._node_upstream_inflow_sub,
+            self._node_upstream_inflow_acc,
+            self._node_outflow_substep,
+        )
+
+        for arrays in self._node_arrays:
+            arrays.finalize_timestep()
+
+        self.node_upstream_inflows[:] = (
+            self._node_upstream_inflow_acc / n_substeps
+        )
+
+        for arrays in self._node_arrays:
+            graph_indices = arrays.graph_indices
+            self.node_outflows[graph_indices] = arrays.outflow
+            self.node_storage_changes[graph_indices] = arrays.storage_change
+            self.node_storages[graph_indices] = arrays.storage
+            self.node_sink_source[graph_indices] = arrays.sink_source
+
+        for (
+            add_var_name,
+            add_var_arrays,
+        ) in self._addtl_output_vars_wh_collect.items():
+            for arrays in add_var_arrays:
+                self[add_var_name][arrays.graph_indices] = arrays[add_var_name]
+
+        return
+
+    def _calculate_nodes(self, n_substeps: int) -> None:
         params = self._params.parameters
 
         for node in self._nodes:
@@ -686,17 +1101,6 @@ class FlowGraph(ConservativeProcess):
             for ii in add_var_inds:
                 self[add_var_name][ii] = self._nodes[ii][add_var_name]
 
-        self.node_negative_sink_source[:] = -1 * self.node_sink_source
-
-        # global mass balance term
-        self.outflows[:] = np.where(
-            self._outflow_mask, self.node_outflows, zero
-        )
-
-        if self.budget is not None:
-            self.budget.advance()
-            self.budget.calculate()
-
         return
 
 
@@ -0,0 +1,164 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from ..base.control import Control
+from ..base.meta import meta_dimensions
+from ..base.timeseries import TimeseriesArray
+from ..utils.netcdf_utils import spatial_coordinate_name
+
+if TYPE_CHECKING:
+    import xarray as xr
+
+
+class MemoryOutput:
+    """Hold the time steps of variables of processes in memory.
+
+    An output sink which does not touch disk, e.g. for calibration loops
+    needing a few variables back as numpy arrays. Arrays of shape (n_times,
+    nspace) are preallocated for the requested variables and, on each call
+    of record(), the current values of the variables are copied into the
+    row of the time step. The arrays are returned by to_dict() or, with
+    their time and spatial coordinates, by to_xarray().
+
+    Args:
+        control: The Control whose current time is recorded.
+        processes: A dictionary of processes, e.g. Model.processes, searched
+            in order for the variables.
+        variables: The names of the variables to hold.
+        n_times: The number of time steps to hold, defaults to the remaining
+            time steps of the control.
+        dtype: An optional type of all the arrays, e.g. np.float32 to halve
+            the memory of float64 variables. Defaults to the type of each
+            variable.
+
+    Examples:
+    ---------
+
+    >>> import numpy as np
+    >>> import pywatershed as pws
+    >>> class Counter:
+    ...     variables = ["count"]
+    ...     meta = {"count": {"dims": ("nhru",)}}
+    ...     count = np.zeros(2)
+    ...
+    >>> control = pws.Control(
+    ...     start_time=np.datetime64("2000-01-01"),
+    ...     end_time=np.datetime64("2000-01-03"),
+    ...     time_step=np.timedelta64(1, "D"),
+    ... )
+    >>> counter = Counter()
+    >>> memory = pws.MemoryOutput(control, {"Counter": counter}, ["count"])
+    >>> for istep in range(control.n_times):
+    ...     control.advance()
+    ...     counter.count += 1
+    ...     memory.record()
+    ...
+    >>> memory.to_dict()["count"]
+    array([[1., 1.],
+           [2., 2.],
+           [3., 3.]])
+    """
+
+    def __init__(
+        self,
+        control: Control,
+        processes: dict,
+        variables: list,
+        n_times: int = None,
+        dtype: np.dtype = None,
+    ):
+        if n_times is None:
+            n_times = control.n_times - control.itime_step - 1
+
+        self.control = control
+        self.n_times = n_times
+        self.time = np.empty(n_times, dtype="datetime64[s]")
+        self.arrays = {}
+
+        # [(process, variable name, array)]
+        self._sources = []
+        self._dims = {}
+        self._coords = {}
+        for var in variables:
+            proc = None
+            for candidate in processes.values():
+                if var in candidate.variables:
+                    proc = candidate
+                    break
+            if proc is None:
+                msg = f"Variable '{var}' is not a variable of the processes"
+                raise ValueError(msg)
+
+            value = self._current(proc, var)
+            var_dtype = value.dtype if dtype is None else dtype
+            self.arrays[var] = np.zeros(
+                (n_times, *value.shape), dtype=var_dtype
+            )
+            self._sources += [(proc, var, self.arrays[var])]
+
+            dims = ("time",)
+            if value.ndim:
+                coord_name = spatial_coordinate_name(
+                    meta_dimensions(proc.meta[var])
+                )
+                dims += (coord_name,)
+                params = getattr(proc, "_params", None)
+                if params is not None and coord_name in params.coords:
+                    self._coords[coord_name] = params.coords[coord_name]
+            self._dims[var] = dims
+
+        self.n_records = 0
+        return
+
+    @staticmethod
+    def _current(proc, var: str) -> np.ndarray:
+        value = getattr(proc, var)
+        if isinstance(value, TimeseriesArray):
+            value = value.current
+        return np.asarray(value)
+
+    def record(self) -> None:
+        """Copy the current values of the variables."""
+        itime = self.n_records
+        if itime >= self.n_times:
+            msg = f"MemoryOutput is full with {self.n_times} time steps"
+            raise ValueError(msg)
+
+        self.time[itime] = self.control.current_time
+        for proc, var, array in self._sources:
+            value = getattr(proc, var)
+            if isinstance(value, TimeseriesArray):
+                value = value.current
+            array[itime] = value
+        self.n_records += 1
+        return
+
+    def to_dict(self) -> dict:
+        """The recorded time steps of the variables.
+
+        Returns:
+            A dictionary of {variable name: array}, the arrays are views of
+            the recorded time steps of the preallocated arrays.
+        """
+        return {
+            var: array[: self.n_records] for var, array in self.arrays.items()
+        }
+
+    def to_xarray(self) -> "xr.Dataset":
+        """The recorded time steps of the variables as an xarray.Dataset.
+
+        Returns:
+            An xarray.Dataset of the variables (without copying them) with
+            the coordinates time and, where available, the spatial
+            coordinates of the processes (e.g. nhm_id).
+        """
+        import xarray as xr
+
+        coords = {"time": self.time[: self.n_records]}
+        coords.update(self._coords)
+        data_vars = {
+            var: (self._dims[var], array)
+            for var, array in self.to_dict().items()
+        }
+        return xr.Dataset(data_vars, coords=coords)
@@ -8,13 +8,17 @@ not a class.
 
 """
 
+import hashlib
+import os
 import pathlib as pl
+import pickle
 from typing import Iterable, Union
 
 import numpy as np
 import yaml
 
 from ..constants import __pywatershed_root__
+from ..version import __version__
 
 varoptions = Union[str, list, tuple]
 
@@ -22,6 +26,18 @@ dims_file = __pywatershed_root__ / "static/metadata/dimensions.yaml"
 control_file = __pywatershed_root__ / "static/metadata/control.yaml"
 params_file = __pywatershed_root__ / "static/metadata/parameters.yaml"
 vars_file = __pywatershed_root__ / "static/metadata/variables.yaml"
+meta_files = (dims_file, control_file, params_file, vars_file)
+
+# The parsed metadata are cached (pickled) in this directory, the default is
+# taken from the environment variable PYWATERSHED_CACHE_DIR if set, else
+# $XDG_CACHE_HOME/pywatershed or ~/.cache/pywatershed.
+cache_dir = pl.Path(
+    os.getenv(
+        "PYWATERSHED_CACHE_DIR",
+        pl.Path(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")))
+        / "pywatershed",
+    )
+)
 
 
 def load_yaml_file(the_file: pl.Path) -> dict:
@@ -34,8 +50,10 @@ def load_yaml_file(the_file: pl.Path) -> dict:
         data: dictionary with metadata in a metadata yaml file
 
     """
+    # the C loader (libyaml) is much faster, when available
+    loader = getattr(yaml, "CLoader", yaml.Loader)
     with pl.Path(the_file).open("r") as file_stream:
-        data = yaml.load(file_stream, Loader=yaml.Loader)
+        data = yaml.load(file_stream, Loader=loader)
     return data
 
 
@@ -53,10 +71,61 @@ def _dims_to_tuples(dd):
     return result
 
 
-dimensions = _dims_to_tuples(load_yaml_file(dims_file))
-control = _dims_to_tuples(load_yaml_file(control_file))
-parameters = _dims_to_tuples(load_yaml_file(params_file))
-variables = _dims_to_tuples(load_yaml_file(vars_file))
+def metadata_cache_file() -> pl.Path:
+    """The cache file for the metadata in the current metadata files.
+
+    The file name contains a hash of the contents of the metadata yaml files
+    and of the pywatershed version, so edits to the files invalidate the
+    cache.
+
+    Returns:
+        The path of the (possibly non-existent) cache file.
+    """
+    hasher = hashlib.sha256(__version__.encode())
+    for meta_file in meta_files:
+        hasher.update(meta_file.read_bytes())
+    return cache_dir / f"metadata_{hasher.hexdigest()[0:16]}.pickle"
+
+
+def _load_metadata() -> tuple:
+    """Load the metadata from the cache if available, else parse the
+    yaml files and try to write the cache."""
+    cache_file = metadata_cache_file()
+    if cache_file.exists():
+        try:
+            with cache_file.open("rb") as file:
+                return pickle.load(file)
+        except Exception:
+            pass
+
+    metadata = tuple(
+        _dims_to_tuples(load_yaml_file(meta_file)) for meta_file in meta_files
+    )
+
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename so concurrent readers never see a partial file
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_file.open("wb") as file:
+            pickle.dump(metadata, file, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_file.replace(cache_file)
+    except OSError:
+        # an unwritable cache is not an error, the yaml is parsed next time
+        pass
+
+    return metadata
+
+
+dimensions, control, parameters, variables = _load_metadata()
+
+# An index of all names for find_variables, with the precedence of variables
+# over dimensions over control over parameters.
+_index = {
+    **parameters,
+    **control,
+    **dimensions,
+    **variables,
+}
 
 
 def meta_netcdf_type(meta_item: dict) -> str:
@@ -143,20 +212,14 @@ def is_available(variable_name: str) -> bool:
         avail: boolean indicating of the variable name is available
 
     """
-    if (
-        variable_name in variables.keys()
-        or variable_name in dimensions.keys()
-        or variable_name in control.keys()
-        or variable_name in parameters.keys()
-    ):
-        avail = True
-    else:
-        avail = False
-    return avail
+    return variable_name in _index.keys()
 
 
 def _get_meta_in_list(meta_dict: dict, the_list: Iterable) -> dict:
-    return {key: value for key, value in meta_dict.items() if key in the_list}
+    if isinstance(the_list, str):
+        the_list = [the_list]
+    the_set = set(the_list)
+    return {key: value for key, value in meta_dict.items() if key in the_set}
 
 
 def get_dims(var_list: Iterable) -> dict:
@@ -233,17 +296,8 @@ def find_variables(vars: varoptions) -> dict:
     """
     if isinstance(vars, str):
         vars = [vars]
-    variable_dict = {}
-    for variable_name in vars:
-        if variable_name in variables.keys():
-            variable_dict[variable_name] = variables[variable_name]
-        elif variable_name in dimensions.keys():
-            variable_dict[variable_name] = dimensions[variable_name]
-        elif variable_name in control.keys():
-            variable_dict[variable_name] = control[variable_name]
-        elif variable_name in parameters.keys():
-            variable_dict[variable_name] = parameters[variable_name]
-    return variable_dict
+    index = _index
+    return {name: index[name] for name in vars if name in index}
 
 
 def get_units(vars: varoptions, to_pint: bool = False) -> dict:
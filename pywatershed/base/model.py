@@ -1,15 +1,22 @@
 import pathlib as pl
 from copy import deepcopy
 from datetime import datetime
+from functools import partial
 from typing import Union
 
+import numpy as np
 from tqdm.auto import tqdm
 
 from ..base.adapter import adapter_factory
+from ..base.conservative_process import ConservativeProcess
 from ..base.control import Control
+from ..base.memory_output import MemoryOutput
+from ..base.process import Process
 from ..constants import fileish
 from ..parameters import Parameters, PrmsParameters
+from ..utils.netcdf_utils import plan_time_batches
 from ..utils.path import path_rel_to_yaml
+from ..utils.profiling import PhaseTimers
 
 # This is a convenience
 process_order_nhm = [
@@ -51,6 +58,15 @@ class Model:
            convenience when lost of in-memory manipulations may be made before
            passing to the model. The output file name has the form
            %Y-%m-%dT%H:%M:%S.model_control.yaml
+        input_memory_budget: Optional number of bytes for the time batches
+           of all the input files, defaults to the control option of the same
+           name. When set, the number of times in each batch read from the
+           input files is sized from the variable shapes and dtypes, the
+           number of input files and the control option prefetch_n_batches,
+           replacing the control option load_n_time_batches. The plan is
+           available as Model.input_batch_plan and is reported in the
+           annotations of Model.timers when profiling. See
+           pywatershed.utils.plan_time_batches.
 
     PRMS-legacy instantiation
     -----------------------------
@@ -285,9 +301,12 @@ class Model:
         parameters: Union[Parameters, dict[Parameters]] = None,
         find_input_files: bool = True,
         write_control: Union[bool, str, pl.Path] = False,
+        input_memory_budget: int = None,
     ):
         self.control = control
         self.parameters = parameters
+        self._input_memory_budget = input_memory_budget
+        self.input_batch_plan = {}
 
         # This is for backwards compatibility: make a method?
         msg = "Inputs are inconsistent"
@@ -336,6 +355,8 @@ class Model:
             self._find_input_files()
 
         self._netcdf_initialized = False
+        self.timers = None
+        self.cprofile = None
         opts = self.control.options
         if "netcdf_output_dir" in opts.keys():
             self._default_nc_out_dir = opts["netcdf_output_dir"]
@@ -519,12 +540,33 @@ class Model:
 
     def _find_input_files(self) -> None:
         file_inputs = {}
-        for name in self._file_input_names:
-            nc_path = self._input_dir / f"{name}.nc"
+        nc_paths = {
+            name: self._input_dir / f"{name}.nc"
+            for name in self._file_input_names
+        }
+
+        memory_budget = self._input_memory_budget
+        if memory_budget is None:
+            memory_budget = self.control.options.get("input_memory_budget")
+        if memory_budget is not None:
+            self.input_batch_plan = plan_time_batches(
+                nc_paths,
+                memory_budget,
+                self.control.n_times,
+                prefetch_n_batches=(
+                    self.control.options.get("prefetch_n_batches") or 0
+                ),
+            )
+
+        for name, nc_path in nc_paths.items():
+            load_n_times = None
+            if name in self.input_batch_plan.keys():
+                load_n_times = self.input_batch_plan[name]["load_n_times"]
             file_inputs[name] = adapter_factory(
                 nc_path,
                 name,
                 control=self.control,
+                load_n_times=load_n_times,
             )
         for process in self.process_order:
             for input, frm in self._inputs_from[process].items():
@@ -535,6 +577,7 @@ class Model:
                         input, file_inputs[input]
                     )
 
+        self._file_input_adapters = file_inputs
         self._found_input_files = True
         return
 
@@ -641,12 +684,150 @@ class Model:
         """
         return Model(Model.model_dict_from_yaml(yaml_file))
 
+    @staticmethod
+    def from_checkpoint(
+        checkpoint_file: fileish,
+        process_list_or_model_dict: Union[list, dict],
+        control: Control = None,
+        parameters: Union[Parameters, dict[Parameters]] = None,
+    ):
+        """Instantiate a Model and restart it from a checkpoint file.
+
+        The first arguments after checkpoint_file are those of Model. The
+        model must have the same processes as the model which wrote the
+        checkpoint. See load_checkpoint for the times at which the control
+        may start.
+
+        Args:
+            checkpoint_file: str or pl.Path of a file written by checkpoint.
+            process_list_or_model_dict: See Model.
+            control: See Model.
+            parameters: See Model.
+
+        Returns:
+            An instance of Model.
+        """
+        model = Model(
+            process_list_or_model_dict,
+            control=control,
+            parameters=parameters,
+        )
+        model.load_checkpoint(checkpoint_file)
+        return model
+
+    def checkpoint(self, checkpoint_file: fileish) -> None:
+        """Write the model state at the current time to a checkpoint file.
+
+        The checkpoint is a NetCDF file with a group for each process holding
+        its state (see Process.get_checkpoint_state) and a "budget" subgroup
+        holding the budget accumulations. The control time is a global
+        attribute. Restart from the file with from_checkpoint or
+        load_checkpoint.
+
+        Args:
+            checkpoint_file: str or pl.Path of the file to write.
+        """
+        import netCDF4 as nc4
+
+        with nc4.Dataset(checkpoint_file, "w") as ds:
+            ds.current_time = str(self.control.current_time)
+            ds.time_step_seconds = self.control.time_step_seconds
+            for cls in self.process_order:
+                proc = self.processes[cls]
+                group = ds.createGroup(cls)
+                _write_checkpoint_arrays(
+                    group, proc.get_checkpoint_state(), proc.meta
+                )
+
+                budget = getattr(proc, "budget", None)
+                if budget is None:
+                    continue
+                budget_state = budget.get_checkpoint_state()
+                budget_group = group.createGroup("budget")
+                if budget_state["accum_start_time"] is not None:
+                    budget_group.accum_start_time = str(
+                        budget_state["accum_start_time"]
+                    )
+                for comp, accums in budget_state["accumulations"].items():
+                    _write_checkpoint_arrays(
+                        budget_group.createGroup(comp), accums, proc.meta
+                    )
+
+        return
+
+    def load_checkpoint(self, checkpoint_file: fileish) -> None:
+        """Restart the model from a checkpoint file.
+
+        The state of the processes and their budgets is set from the file
+        and the control, processes, and input files are positioned at the
+        checkpoint time so that the next time step is the one after the
+        checkpoint. The checkpoint time must either be a time of the control
+        (resuming a run) or its init_time, one time step before its
+        start_time (a warm start of a new run).
+
+        Args:
+            checkpoint_file: str or pl.Path of a file written by checkpoint.
+        """
+        import netCDF4 as nc4
+
+        with nc4.Dataset(checkpoint_file, "r") as ds:
+            ds.set_auto_mask(False)
+            if ds.time_step_seconds != self.control.time_step_seconds:
+                msg = "The checkpoint and control time steps differ"
+                raise ValueError(msg)
+
+            missing = set(self.process_order).difference(ds.groups.keys())
+            if missing:
+                msg = f"Processes not found in checkpoint file: {missing}"
+                raise ValueError(msg)
+
+            self.control.set_current_time(np.datetime64(ds.current_time))
+            itime_step = self.control.itime_step
+
+            if not self._found_input_files:
+                self._find_input_files()
+            for adapter in self._file_input_adapters.values():
+                adapter.seek(itime_step)
+
+            for cls in self.process_order:
+                proc = self.processes[cls]
+                group = ds.groups[cls]
+                proc._itime_step = itime_step
+                proc.set_checkpoint_state(_read_checkpoint_arrays(group))
+
+                budget = getattr(proc, "budget", None)
+                if budget is None:
+                    continue
+                budget_group = group.groups["budget"]
+                accum_start_time = None
+                if "accum_start_time" in budget_group.ncattrs():
+                    accum_start_time = np.datetime64(
+                        budget_group.accum_start_time
+                    )
+                budget._itime_step = itime_step
+                budget._time = self.control.current_time
+                budget.set_checkpoint_state(
+                    {
+                        "accum_start_time": accum_start_time,
+                        "accumulations": {
+                            comp: _read_checkpoint_arrays(comp_group)
+                            for comp, comp_group in budget_group.groups.items()
+                        },
+                    }
+                )
+
+        return
+
     def initialize_netcdf(
         self,
         output_dir: str = None,
         separate_files: bool = None,
         budget_args: dict = None,
         output_vars: list = None,
+        aggregation: dict = None,
+        backend: str = None,
+        spatial_subset: dict = None,
+        layout: Union[str, dict] = None,
     ):
         """Initialize NetCDF output files for model (all processes).
 
@@ -659,6 +840,18 @@ class Model:
             output_vars: A list of variables to write. Unrecognized variable
                 names are silently skipped. Defaults to None which writes
                 all variables for all Processes.
+            aggregation: Optionally write statistics of the variables over
+                periods of time instead of every time step, see
+                Process.initialize_netcdf(). Defaults to None.
+            backend: The output backend, "netcdf" or "zarr", see
+                Process.initialize_netcdf(). Defaults to None, which uses the
+                control option output_backend or else "netcdf".
+            spatial_subset: Optionally write only selected locations, e.g.
+                {"nhm_seg": gauge_segment_ids}, see
+                Process.initialize_netcdf(). Defaults to None.
+            layout: The chunking and compression of the output, e.g.
+                "timeseries-read-optimized", see Process.initialize_netcdf().
+                Defaults to None.
         """
         print("model initializing NetCDF output")
 
@@ -671,6 +864,10 @@ class Model:
                 separate_files=separate_files,
                 budget_args=budget_args,
                 output_vars=output_vars,
+                aggregation=aggregation,
+                backend=backend,
+                spatial_subset=spatial_subset,
+                layout=layout,
             )
         self._netcdf_initialized = True
         return
@@ -681,6 +878,13 @@ class Model:
         finalize: bool = True,
         n_time_steps: int = None,
         output_vars: list = None,
+        profile: bool = False,
+        profile_window: tuple = None,
+        profile_file: fileish = None,
+        output_aggregation: dict = None,
+        memory_vars: list = None,
+        memory_dtype: np.dtype = None,
+        memory_as_xarray: bool = False,
     ):
         """Run the model.
 
@@ -697,29 +901,211 @@ class Model:
                netcdf and outputs at each timestep).
             finalize: option to not finalize at the end of the time loop.
                Default is to finalize.
-            n_time_steps: the number of timesteps to run
+            n_time_steps: the number of timesteps to run, defaults to the
+               remaining time steps of the control.
             output_vars: the vars to output to the netcdf_dir
+            profile: Time the advance, calculate, and output phases of each
+               process and of its budget (phases "budget_advance",
+               "budget_calculate", and "budget_output"), the advance of each
+               input file adapter, and the finalize of each process. The
+               times are accumulated over the run in Model.timers, a
+               PhaseTimers object which can be queried with to_dict(),
+               to_dataframe(), and to_json(). The phases are called through
+               their bound methods, with the input file adapters advanced
+               ahead of their processes so they can be timed separately.
+               Default is False.
+            profile_window: A tuple (start, stop) of time step indices of
+               this run (stop exclusive) over which to run cProfile. The
+               cProfile.Profile is available as Model.cprofile after the run.
+               Default is None for no cProfile.
+            profile_file: A file to which the cProfile statistics are dumped
+               (see cProfile.Profile.dump_stats) when profile_window is set.
+            output_aggregation: Optionally write statistics of the output
+               variables over periods of time (e.g. {"period": "month",
+               "stats": ["mean", "sum"]}) instead of every time step, see
+               Process.initialize_netcdf(). Defaults to None.
+            memory_vars: Optionally hold the time steps of these variables in
+               memory, in arrays preallocated for the time steps of the run
+               and filled on each time step (see MemoryOutput). The arrays
+               are returned by run() and the MemoryOutput is available as
+               Model.memory_output. Defaults to None.
+            memory_dtype: The type of the arrays of memory_vars, e.g.
+               np.float32. Defaults to the type of each variable.
+            memory_as_xarray: Return the memory_vars as an xarray.Dataset
+               instead of a dictionary of numpy arrays. Default is False.
+
+        Returns:
+            None or, if memory_vars are requested, a dictionary of arrays
+            or an xarray.Dataset of the variables.
         """
         if netcdf_dir or (
             not self._netcdf_initialized
             and self._default_nc_out_dir is not None
         ):
-            self.initialize_netcdf(netcdf_dir, output_vars=output_vars)
+            self.initialize_netcdf(
+                netcdf_dir,
+                output_vars=output_vars,
+                aggregation=output_aggregation,
+            )
 
         if not n_time_steps:
-            n_time_steps = self.control.n_times
+            n_time_steps = self.control.n_times - self.control.itime_step - 1
+
+        step = None
+        if profile:
+            self.timers = PhaseTimers()
+            step = self._prebound_step(timers=self.timers)
+            for name, plan in self.input_batch_plan.items():
+                self.timers.annotate(f"AdapterNetcdf:{name}", plan)
+
+        memory = None
+        if memory_vars is not None:
+            memory = MemoryOutput(
+                self.control,
+                self.processes,
+                memory_vars,
+                n_times=n_time_steps,
+                dtype=memory_dtype,
+            )
+            self.memory_output = memory
+
+        cprofile = None
+        if profile_window is not None:
+            import cProfile
+
+            cprofile = cProfile.Profile()
+            self.cprofile = cprofile
 
         for istep in tqdm(range(n_time_steps)):
-            self.advance()
-            self.calculate()
-            self.output()
+            if cprofile is not None and istep == profile_window[0]:
+                cprofile.enable()
+
+            if step is not None:
+                step()
+            else:
+                self.advance()
+                self.calculate()
+                self.output()
+
+            if memory is not None:
+                memory.record()
+
+            if cprofile is not None and istep == profile_window[1] - 1:
+                cprofile.disable()
+
+        if cprofile is not None:
+            cprofile.disable()
+            if profile_file is not None:
+                cprofile.dump_stats(profile_file)
 
         if finalize:
             print("model.run(): finalizing")
-            self.finalize()
-
+            if profile:
+                for cls in self.process_order:
+                    proc = self.processes[cls]
+                    self.timers.timed(cls, "finalize", proc.finalize)()
+            else:
+                self.finalize()
+
+        if memory is not None:
+            if memory_as_xarray:
+                return memory.to_xarray()
+            return memory.to_dict()
         return
 
+    def _prebound_step(self, timers: PhaseTimers = None):
+        """Build a function that advances, calculates, and outputs all
+        processes for a single time step.
+
+        The bound methods for each phase of each process are looked up once
+        here so that the time loop only makes the calls that do work. Processes
+        which override calculate() or output() are called through those
+        methods. Input file finding and netcdf initialization are resolved
+        before the step function is returned.
+
+        Args:
+            timers: Optional PhaseTimers with which to time each call. The
+                input file adapters are then advanced (and timed) before the
+                processes, which skip advancing them again.
+        """
+        if not self._found_input_files:
+            self._find_input_files()
+
+        if (
+            not self._netcdf_initialized
+            and self._default_nc_out_dir is not None
+        ):
+            self.initialize_netcdf()
+
+        base_calculates = (Process.calculate, ConservativeProcess.calculate)
+        base_outputs = (Process.output, ConservativeProcess.output)
+
+        if timers is None:
+
+            def timed(component, phase, func):
+                return func
+
+        else:
+            timed = timers.timed
+
+        advances = []
+        calculates = []
+        outputs = []
+        if timers is not None:
+            for name, adapter in self._file_input_adapters.items():
+                advances += [
+                    timed(
+                        f"{type(adapter).__name__}:{name}",
+                        "advance",
+                        adapter.advance,
+                    )
+                ]
+
+        for cls in self.process_order:
+            proc = self.processes[cls]
+            advances += [timed(cls, "advance", proc.advance)]
+
+            budget = getattr(proc, "budget", None)
+
+            if type(proc).calculate in base_calculates:
+                calculates += [
+                    timed(cls, "calculate", partial(proc._calculate, 1.0))
+                ]
+                if budget is not None:
+                    calculates += [
+                        timed(cls, "budget_advance", budget.advance),
+                        timed(cls, "budget_calculate", budget.calculate),
+                    ]
+            else:
+                calculates += [
+                    timed(cls, "calculate", partial(proc.calculate, 1.0))
+                ]
+
+            if type(proc).output in base_outputs:
+                if proc._netcdf_initialized:
+                    outputs += [timed(cls, "output", proc._output_netcdf)]
+                if budget is not None and budget._output_netcdf:
+                    outputs += [timed(cls, "budget_output", budget.output)]
+            else:
+                outputs += [timed(cls, "output", proc.output)]
+
+        # <<
+        control_advance = timed("Control", "advance", self.control.advance)
+        advances = tuple(advances)
+        calculates = tuple(calculates)
+        outputs = tuple(outputs)
+
+        def step():
+            control_advance()
+            for advance in advances:
+                advance()
+            for calculate in calculates:
+                calculate()
+            for output in outputs:
+                output()
+
+        return step
+
     def advance(self):
         """Advance the model in time."""
         if not self._found_input_files:
@@ -753,3 +1139,28 @@ class Model:
         for cls in self.process_order:
             self.processes[cls].finalize()
         return
+
+
+def _write_checkpoint_arrays(group, arrays: dict, meta: dict) -> None:
+    """Write a dictionary of arrays to a NetCDF group of a checkpoint file,
+    using the dimension names in meta when available."""
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        dims = tuple(meta.get(name, {}).get("dims", ()))
+        if len(dims) != array.ndim:
+            dims = tuple(f"{name}_dim_{ii}" for ii in range(array.ndim))
+        for dim, size in zip(dims, array.shape):
+            if dim not in group.dimensions.keys():
+                group.createDimension(dim, size)
+        # NetCDF has no boolean type
+        if array.dtype == bool:
+            array = array.astype("i1")
+        var = group.createVariable(name, array.dtype, dims)
+        var[...] = array
+
+    return
+
+
+def _read_checkpoint_arrays(group) -> dict:
+    """Read the arrays in a NetCDF group of a checkpoint file."""
+    return {name: var[...] for name, var in group.variables.items()}
@@ -1,13 +1,15 @@
 import pathlib as pl
 from copy import deepcopy
 from types import MappingProxyType
-from typing import Union
+from typing import TYPE_CHECKING, Union
 
 import numpy as np
-import xarray as xr
 
 from .data_model import DatasetDict, dd_to_nc4_ds, dd_to_xr_ds
 
+if TYPE_CHECKING:
+    import xarray as xr
+
 # MappingProxyType used as per
 # https://adamj.eu/tech/2022/01/05/how-to-make-immutable-dict-in-python/
 
@@ -184,7 +186,7 @@ class Parameters(DatasetDict):
         else:
             return {kk: self.dims[kk] for kk in keys}
 
-    def to_xr_ds(self) -> xr.Dataset:
+    def to_xr_ds(self) -> "xr.Dataset":
         """Export Parameters to an xarray dataset"""
         return dd_to_xr_ds(_set_dict_read_write(self.data))
 
@@ -0,0 +1,424 @@
+import multiprocessing as mp
+import pathlib as pl
+import tempfile
+from copy import deepcopy
+from multiprocessing import shared_memory
+from typing import Union
+
+import numpy as np
+import yaml
+from tqdm.auto import tqdm
+
+from ..constants import fileish
+from ..parameters import PrmsParameters
+from ..utils.netcdf_utils import subset_netcdf_file
+from .control import Control
+from .model import Model, process_order_nhm
+
+# Dimensions which are aliases for nhru in the NHM
+hru_dims = ("nhru", "nssr", "ngw")
+
+
+class PartitionedModel:
+    """Run a PRMS-legacy model with its HRUs partitioned across processes.
+
+    HRU-based processes (e.g. PRMSSolarGeometry through PRMSGroundwater) are
+    column independent within a timestep: they only couple HRUs through the
+    channel routing. A PartitionedModel splits the nhru dimension into
+    n_partitions contiguous blocks and runs the HRU processes for each block
+    as a separate Model in its own worker process. The lateral inflows to the
+    router are gathered from the workers through shared memory at each
+    timestep and a single router (the process with an "nsegment" dimension,
+    typically PRMSChannel) runs in the main process.
+
+    The workers are built from a model yaml file for each partition (see
+    Model.from_yaml) written to a work directory along with the subset
+    parameters and the subset input files for each partition. The workers and
+    the router advance in lockstep, but the workers compute a timestep while
+    the router routes the previous one.
+
+    Args:
+        process_list: A list of PRMS process classes, as for Model.
+        control: A Control object, as for Model.
+        parameters: A PrmsParameters object, as for Model.
+        n_partitions: The number of HRU partitions (worker processes).
+        work_dir: Optional directory for the partition inputs, which is
+            kept. Defaults to a new temporary directory which is removed by
+            close(), when the model is finalized, or when the model is
+            garbage collected.
+
+    Examples:
+    ---------
+
+    >>> import pywatershed as pws
+    >>> test_data_dir = pws.constants.__pywatershed_root__ / "../test_data"
+    >>> domain_dir = test_data_dir / "drb_2yr"
+    >>> control = pws.Control.load_prms(
+    ...     domain_dir / "nhm.control", warn_unused_options=False
+    ... )
+    >>> control.options["input_dir"] = domain_dir
+    >>> params = pws.parameters.PrmsParameters.load(
+    ...     domain_dir / "myparam.param"
+    ... )
+    >>> model = pws.PartitionedModel(
+    ...     [
+    ...         pws.PRMSSolarGeometry,
+    ...         pws.PRMSAtmosphere,
+    ...         pws.PRMSCanopy,
+    ...         pws.PRMSSnow,
+    ...         pws.PRMSRunoff,
+    ...         pws.PRMSSoilzone,
+    ...         pws.PRMSGroundwater,
+    ...         pws.PRMSChannel,
+    ...     ],
+    ...     control=control,
+    ...     parameters=params,
+    ...     n_partitions=4,
+    ... )
+    >>> model.run()
+    """
+
+    def __init__(
+        self,
+        process_list: list,
+        control: Control,
+        parameters: PrmsParameters,
+        n_partitions: int,
+        work_dir: fileish = None,
+    ):
+        self.control = control
+        self.parameters = parameters
+        self.n_partitions = n_partitions
+
+        if n_partitions < 1:
+            raise ValueError("n_partitions must be at least 1")
+
+        if "input_dir" not in self.control.options.keys():
+            msg = "Required control option 'input_dir' not found"
+            raise ValueError(msg)
+        self._input_dir = pl.Path(self.control.options["input_dir"])
+
+        process_list = sorted(
+            process_list, key=lambda pp: process_order_nhm.index(pp.__name__)
+        )
+        router_list = [
+            pp for pp in process_list if "nsegment" in pp.get_dimensions()
+        ]
+        if len(router_list) != 1:
+            msg = "PartitionedModel requires exactly one routing process"
+            raise ValueError(msg)
+        self._router_class = router_list[0]
+        self._hru_process_list = [
+            pp for pp in process_list if pp is not self._router_class
+        ]
+
+        nhru = self.parameters.dims["nhru"]
+        if n_partitions > nhru:
+            raise ValueError("n_partitions exceeds nhru")
+        self.partition_inds = np.array_split(np.arange(nhru), n_partitions)
+
+        # inputs to the router and the HRU processes supplying them
+        self._router_inputs = {}
+        for input in self._router_class.get_inputs():
+            for proc in self._hru_process_list:
+                if input in proc.get_variables():
+                    self._router_inputs[input] = proc.__name__
+        missing = set(self._router_class.get_inputs()).difference(
+            self._router_inputs.keys()
+        )
+        if missing:
+            msg = f"Router inputs not supplied by HRU processes: {missing}"
+            raise ValueError(msg)
+
+        # the default work directory is owned and removed by the model
+        self._tmp_dir = None
+        if work_dir is None:
+            self._tmp_dir = tempfile.TemporaryDirectory(
+                prefix="pws_partitions_"
+            )
+            work_dir = self._tmp_dir.name
+        self._work_dir = pl.Path(work_dir)
+        try:
+            self._write_partitions()
+        except Exception:
+            self.close()
+            raise
+
+        # the router runs in this process on shared-memory inputs
+        self._router_input_names = list(self._router_inputs.keys())
+        self._router_input_arrays = {
+            input: np.zeros(nhru) for input in self._router_input_names
+        }
+        self.router = self._router_class(
+            control=self.control,
+            discretization=None,
+            parameters=self.parameters,
+            **self._router_input_arrays,
+        )
+
+        self._workers = None
+        self._netcdf_dir = None
+        return
+
+    def __del__(self):
+        self.close()
+        return
+
+    @property
+    def work_dir(self) -> pl.Path:
+        """The directory of the partition inputs."""
+        return self._work_dir
+
+    def close(self) -> None:
+        """Remove the work directory if it is the default temporary
+        directory. A work_dir passed to the model is kept."""
+        tmp_dir = getattr(self, "_tmp_dir", None)
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+            self._tmp_dir = None
+        return
+
+    def _hru_file_inputs(self) -> list:
+        """Inputs to HRU processes which are not supplied by other HRU
+        processes, these come from files."""
+        hru_vars = set()
+        for proc in self._hru_process_list:
+            hru_vars = hru_vars.union(proc.get_variables())
+        file_inputs = set()
+        for proc in self._hru_process_list:
+            file_inputs = file_inputs.union(
+                set(proc.get_inputs()).difference(hru_vars)
+            )
+        return sorted(file_inputs)
+
+    def _write_partitions(self) -> None:
+        """Write the model yaml files and their inputs for each partition."""
+        nhm_id = self.parameters.parameters["nhm_id"]
+        file_inputs = self._hru_file_inputs()
+        self._model_yaml_files = []
+        for ipart, inds in enumerate(self.partition_inds):
+            part_dir = self._work_dir / f"partition_{ipart}"
+            part_dir.mkdir(parents=True, exist_ok=True)
+
+            for name in file_inputs:
+                subset_netcdf_file(
+                    self._input_dir / f"{name}.nc",
+                    part_dir / f"{name}.nc",
+                    coord_dim_name="nhm_id",
+                    coord_dim_values_keep=nhm_id[inds],
+                )
+
+            params = subset_hru_parameters(self.parameters, inds)
+            params.to_netcdf(part_dir / "parameters.nc", use_xr=True)
+
+            control = deepcopy(self.control)
+            control.options["input_dir"] = part_dir
+            for opt in ["netcdf_output_dir", "netcdf_output_var_names"]:
+                if opt in control.options.keys():
+                    del control.options[opt]
+            control.to_yaml(part_dir / "control.yaml")
+
+            model_dict = {"control": "control.yaml"}
+            for proc in self._hru_process_list:
+                model_dict[proc.__name__] = {
+                    "class": proc.__name__,
+                    "parameters": "parameters.nc",
+                }
+            model_dict["model_order"] = [
+                proc.__name__ for proc in self._hru_process_list
+            ]
+            model_yaml = part_dir / "model.yaml"
+            with open(model_yaml, "w") as file:
+                _ = yaml.dump(model_dict, file)
+
+            self._model_yaml_files += [model_yaml]
+
+        return
+
+    def initialize_netcdf(self, output_dir: Union[str, pl.Path]) -> None:
+        """Initialize NetCDF output.
+
+        The router writes to output_dir. The HRU processes of each partition
+        write to the subdirectory output_dir/partition_<i>.
+
+        Args:
+            output_dir: pl.Path or str of the directory where to write files
+        """
+        self._netcdf_dir = pl.Path(output_dir)
+        self.router.initialize_netcdf(output_dir=self._netcdf_dir)
+        return
+
+    def _start_workers(self, n_time_steps: int) -> None:
+        ctx = mp.get_context()
+        nhru = self.parameters.dims["nhru"]
+        n_inputs = len(self._router_input_names)
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=n_inputs * nhru * np.dtype("float64").itemsize
+        )
+        self._shm_array = np.ndarray(
+            (n_inputs, nhru), dtype="float64", buffer=self._shm.buf
+        )
+        self._barrier = ctx.Barrier(self.n_partitions + 1)
+
+        self._workers = []
+        for ipart, inds in enumerate(self.partition_inds):
+            output_dir = None
+            if self._netcdf_dir is not None:
+                output_dir = self._netcdf_dir / f"partition_{ipart}"
+            worker = ctx.Process(
+                target=_partition_worker,
+                args=(
+                    self._model_yaml_files[ipart],
+                    inds,
+                    self._shm.name,
+                    (n_inputs, nhru),
+                    self._router_inputs,
+                    self._barrier,
+                    n_time_steps,
+                    output_dir,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self._workers += [worker]
+
+        # wait for the workers to build their models
+        self._barrier.wait()
+        return
+
+    def _stop_workers(self) -> None:
+        for worker in self._workers:
+            worker.join()
+        del self._shm_array
+        self._shm.close()
+        self._shm.unlink()
+        self._workers = None
+        return
+
+    def run(
+        self,
+        netcdf_dir: fileish = None,
+        finalize: bool = True,
+        n_time_steps: int = None,
+    ):
+        """Run the model.
+
+        Args:
+            netcdf_dir: optional directory to netcdf output files (initializes
+               netcdf and outputs at each timestep).
+            finalize: option to not finalize the router at the end of the time
+               loop. Default is to finalize, which also removes the default
+               work directory (see close).
+            n_time_steps: the number of timesteps to run
+        """
+        if netcdf_dir:
+            self.initialize_netcdf(netcdf_dir)
+
+        if not n_time_steps:
+            n_time_steps = self.control.n_times
+
+        self._start_workers(n_time_steps)
+        try:
+            for istep in tqdm(range(n_time_steps)):
+                # the workers have written the lateral inflows
+                self._barrier.wait()
+                for ii, input in enumerate(self._router_input_names):
+                    self._router_input_arrays[input][:] = self._shm_array[ii]
+                # release the workers to compute the next timestep
+                self._barrier.wait()
+
+                self.control.advance()
+                self.router.advance()
+                self.router.calculate(1.0)
+                self.router.output()
+
+        finally:
+            self._stop_workers()
+
+        if finalize:
+            print("model.run(): finalizing")
+            self.router.finalize()
+            self.close()
+
+        return
+
+
+def subset_hru_parameters(
+    parameters: PrmsParameters, hru_inds: np.ndarray
+) -> PrmsParameters:
+    """Subset PrmsParameters on the HRU dimension
+
+    Args:
+        parameters: The PrmsParameters to subset.
+        hru_inds: Integer indices of the HRUs to keep.
+
+    Returns:
+        PrmsParameters with all variables with HRU dimensions subset.
+    """
+    dd = parameters.to_dd().data
+    for dim in hru_dims:
+        if dim in dd["dims"].keys():
+            dd["dims"][dim] = len(hru_inds)
+
+    for cat in ["coords", "data_vars"]:
+        for name, data in dd[cat].items():
+            dims = dd["metadata"][name]["dims"]
+            for axis, dim in enumerate(dims):
+                if dim in hru_dims:
+                    data = np.take(data, hru_inds, axis=axis)
+            dd[cat][name] = data
+
+    return PrmsParameters(**dd)
+
+
+def _partition_worker(
+    model_yaml: pl.Path,
+    hru_inds: np.ndarray,
+    shm_name: str,
+    shm_shape: tuple,
+    router_inputs: dict,
+    barrier,
+    n_time_steps: int,
+    output_dir: pl.Path,
+) -> None:
+    """Run the HRU processes of a single partition in lockstep with the
+    router."""
+    try:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        shm_array = np.ndarray(shm_shape, dtype="float64", buffer=shm.buf)
+
+        model = Model.from_yaml(model_yaml)
+        if output_dir is not None:
+            model.initialize_netcdf(output_dir=output_dir)
+        step = model._prebound_step()
+        sources = [
+            model.processes[proc][input]
+            for input, proc in router_inputs.items()
+        ]
+
+    except Exception:
+        barrier.abort()
+        raise
+
+    barrier.wait()
+
+    try:
+        for istep in range(n_time_steps):
+            step()
+            # the router has copied the previous timestep
+            for ii, source in enumerate(sources):
+                shm_array[ii, hru_inds] = source
+            barrier.wait()
+            barrier.wait()
+
+        model.finalize()
+
+    except Exception:
+        barrier.abort()
+        raise
+
+    finally:
+        del shm_array
+        shm.close()
+
+    return
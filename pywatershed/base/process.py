@@ -1,17 +1,20 @@
+import datetime as dt
 import inspect
 import os
 import pathlib as pl
-from typing import Literal
+from typing import Literal, Union
 from warnings import warn
 
 import numpy as np
 
 from ..base import meta
 from ..base.adapter import Adapter, adapter_factory
+from ..base.aggregation import TemporalAggregator
 from ..base.data_model import _merge_dicts
 from ..base.timeseries import TimeseriesArray
 from ..parameters import Parameters
-from ..utils.netcdf_utils import NetCdfWrite
+from ..utils.netcdf_utils import background_writer, spatial_coordinate_name
+from ..utils.output_backends import get_output_backend
 from .accessor import Accessor
 from .control import Control
 
@@ -88,6 +91,10 @@ class Process(Accessor):
         How to handle metadata_patches conflicts. Experimental.
     """
 
+    # Private variables which carry state between time steps, these are
+    # included in checkpoints along with the public variables.
+    _checkpoint_private_variables = ()
+
     def __init__(
         self,
         control: Control,
@@ -103,6 +110,9 @@ class Process(Accessor):
 
         # netcdf output variables
         self._netcdf_initialized = False
+        self._netcdf_aggregator = None
+        self._netcdf_backend = None
+        self._netcdf_layout = None
 
         self._itime_step = -1
 
@@ -376,6 +386,44 @@ class Process(Accessor):
         self[input_variable_name] = adapter.current
         return
 
+    def get_checkpoint_state(self) -> dict:
+        """Get the state of the Process for a checkpoint.
+
+        The state is all public variables, which includes the prognostic
+        variables and their values at the previous time (e.g. pkwater_ante),
+        and the private variables listed in _checkpoint_private_variables.
+        For variables with a time dimension (TimeseriesArrays) the state is
+        their value at the current time. See Model.checkpoint.
+
+        Returns:
+            A dictionary of copies of the state arrays keyed by variable name.
+        """
+        state = {}
+        for name in (*self.variables, *self._checkpoint_private_variables):
+            value = self[name]
+            if isinstance(value, TimeseriesArray):
+                state[name] = value.current.copy()
+            elif isinstance(value, np.ndarray):
+                state[name] = value.copy()
+        return state
+
+    def set_checkpoint_state(self, state: dict) -> None:
+        """Set the state of the Process from a checkpoint.
+
+        The values are set in place so that references to the variables held
+        by other Processes and the budget remain valid.
+
+        Args:
+            state: A dictionary of arrays keyed by variable name as returned
+                by get_checkpoint_state.
+        """
+        for name, value in state.items():
+            if isinstance(self[name], TimeseriesArray):
+                self[name].current[:] = value
+            else:
+                self[name][:] = value
+        return
+
     def advance(self):
         """
         Advance the Process in time.
@@ -469,6 +517,10 @@ class Process(Accessor):
         output_vars: list = None,
         extra_coords: dict = None,
         addtl_output_vars: list = None,
+        aggregation: dict = None,
+        backend: str = None,
+        spatial_subset: dict = None,
+        layout: Union[str, dict] = None,
     ) -> None:
         """Initialize NetCDF output.
 
@@ -479,6 +531,33 @@ class Process(Accessor):
                 variables should be written to a separate file for each
                 variable
             output_vars: list of variable names to outuput.
+            aggregation: optional dictionary of arguments to a
+                TemporalAggregator, e.g. {"period": "water_year", "stats":
+                ["mean", "max"]}, defaulting to the control option
+                netcdf_output_aggregation. When supplied, statistics of the
+                output variables over each period are written instead of
+                every time step. For each variable "var" and statistic
+                "stat" the variable "var_stat" is written with the
+                attribute cell_methods = "time: stat" and the time
+                coordinate is the first time of each period.
+            backend: optional name of the output backend, "netcdf" or
+                "zarr" (or one added with register_output_backend),
+                defaulting to the control option output_backend and then to
+                "netcdf".
+            spatial_subset: optional dictionary of the locations to write,
+                keyed by variable name or by spatial coordinate name
+                ("nhm_id", "nhm_seg", ...) for all the variables on that
+                coordinate, with a variable name taking precedence. The
+                values are arrays of coordinate values (IDs) or boolean
+                masks over the coordinate. Only the selected locations are
+                written and the coordinates in the files are subset to
+                match. When separate_files is False, the selections of
+                variables on the same coordinate must be the same.
+            layout: optional chunking and compression of the output
+                variables, "write-optimized", "timeseries-read-optimized",
+                or a dictionary of explicit settings, see output_layout().
+                Defaults to the control option netcdf_output_layout and
+                then to the defaults of the backend.
 
         Returns:
             None
@@ -530,19 +609,52 @@ class Process(Accessor):
         if addtl_output_vars is not None:
             self._netcdf_output_vars += addtl_output_vars
 
+        if aggregation is None:
+            aggregation = self.control.options.get("netcdf_output_aggregation")
+        nc_vars = {var: [var] for var in self._netcdf_output_vars}
+        nc_meta = self.meta
+        self._netcdf_aggregator = None
+        if aggregation is not None:
+            self._netcdf_aggregator = TemporalAggregator(
+                self.control, **aggregation
+            )
+            nc_vars, nc_meta = self._init_netcdf_aggregation()
+
+        if backend is None:
+            backend = self.control.options.get("output_backend")
+        write_class, suffix = get_output_backend(backend)
+        self._netcdf_backend = backend
+        if layout is None:
+            layout = self.control.options.get("netcdf_output_layout")
+        self._netcdf_layout = layout
+
         self._netcdf = {}
+        buffer_n_times = self.control.options.get("netcdf_buffer_n_times", 1)
+        writer = None
+        queue_size = self.control.options.get("netcdf_write_queue_size")
+        if queue_size:
+            writer = background_writer(queue_size)
 
         if self._netcdf_separate:
             self._netcdf_output_dir.mkdir(parents=True, exist_ok=True)
             for variable_name in self._netcdf_output_vars:
-                nc_path = self._netcdf_output_dir / f"{variable_name}.nc"
-                self._netcdf[variable_name] = NetCdfWrite(
+                nc_path = self._netcdf_output_dir / f"{variable_name}{suffix}"
+                var_subset = self._netcdf_spatial_subset(
+                    [variable_name], spatial_subset
+                )
+                self._netcdf[variable_name] = write_class(
                     name=nc_path,
                     coordinates=self._params.coords,
-                    variables=[variable_name],
-                    var_meta={variable_name: self.meta[variable_name]},
+                    variables=nc_vars[variable_name],
+                    var_meta={
+                        name: nc_meta[name] for name in nc_vars[variable_name]
+                    },
                     extra_coords=extra_coords,
                     global_attrs={"process class": self.name},
+                    buffer_n_times=buffer_n_times,
+                    writer=writer,
+                    spatial_subset=var_subset,
+                    layout=layout,
                 )
 
         else:
@@ -553,19 +665,115 @@ class Process(Accessor):
 
             initial_variable = the_out_vars[0]
             self._netcdf_output_dir.mkdir(parents=True, exist_ok=True)
-            self._netcdf[initial_variable] = NetCdfWrite(
-                name=self._netcdf_output_dir / f"{self.name}.nc",
+            self._netcdf[initial_variable] = write_class(
+                name=self._netcdf_output_dir / f"{self.name}{suffix}",
                 coordinates=self._params.coords,
-                variables=self._netcdf_output_vars,
-                var_meta=self.meta,
+                variables=[
+                    name
+                    for var in self._netcdf_output_vars
+                    for name in nc_vars[var]
+                ],
+                var_meta=nc_meta,
                 extra_coords=extra_coords,
                 global_attrs={"process class": self.name},
+                buffer_n_times=buffer_n_times,
+                writer=writer,
+                spatial_subset=self._netcdf_spatial_subset(
+                    self._netcdf_output_vars, spatial_subset
+                ),
+                layout=layout,
             )
             for variable in the_out_vars[1:]:
                 self._netcdf[variable] = self._netcdf[initial_variable]
 
         return
 
+    def _netcdf_spatial_subset(
+        self, variables: list, spatial_subset: dict
+    ) -> dict:
+        """The spatial_subset of output writers for variables in one file.
+
+        Args:
+            variables: the names of the variables written to the file.
+            spatial_subset: see initialize_netcdf.
+
+        Returns:
+            A dictionary {coordinate name: selection} of the file.
+        """
+        if spatial_subset is None:
+            return None
+        file_subset = {}
+        for var in variables:
+            coord_name = spatial_coordinate_name(
+                meta.meta_dimensions(self.meta[var])
+            )
+            selection = spatial_subset.get(var, spatial_subset.get(coord_name))
+            if selection is None:
+                continue
+            if coord_name in file_subset.keys() and not np.array_equal(
+                file_subset[coord_name], selection
+            ):
+                msg = (
+                    f"{self.name}: variables on the coordinate {coord_name} "
+                    "have different spatial selections, which requires "
+                    "separate_files=True"
+                )
+                raise ValueError(msg)
+            file_subset[coord_name] = selection
+        return file_subset
+
+    def _init_netcdf_aggregation(self) -> tuple[dict, dict]:
+        # the names and metadata of the aggregated output variables
+        aggregator = self._netcdf_aggregator
+        nc_vars = {}
+        nc_meta = {}
+        for var in self._netcdf_output_vars:
+            value = self._output_value(var)
+            aggregator.add_variable(var, value.shape, value.dtype)
+            nc_vars[var] = []
+            for stat in aggregator.stats:
+                name = f"{var}_{stat}"
+                nc_vars[var] += [name]
+                nc_meta[name] = {
+                    **self.meta[var],
+                    "cell_methods": f"time: {stat}",
+                }
+                if stat == "mean":
+                    nc_meta[name]["type"] = "float64"
+        return nc_vars, nc_meta
+
+    def _output_netcdf_aggregated(self) -> None:
+        aggregator = self._netcdf_aggregator
+        if aggregator.advance():
+            self._write_netcdf_aggregated()
+        for variable in self._netcdf_output_vars:
+            aggregator.accumulate(variable, self._output_value(variable))
+        return
+
+    def _write_netcdf_aggregated(self) -> None:
+        # write the records of the last completed period
+        aggregator = self._netcdf_aggregator
+        irecord = aggregator.n_records - 1
+        time_added = False
+        for variable in self._netcdf_output_vars:
+            if not time_added or self._netcdf_separate:
+                time_added = True
+                self._netcdf[variable].add_simulation_time(
+                    irecord, aggregator.record_time.astype(dt.datetime)
+                )
+            for stat, data in aggregator.records[variable].items():
+                self._netcdf[variable].add_data(
+                    f"{variable}_{stat}", irecord, data
+                )
+        return
+
+    def _output_value(self, variable: str) -> np.ndarray:
+        # the value of a variable on the current time step
+        value = getattr(self, variable)
+        if isinstance(value, TimeseriesArray):
+            return value.current
+        return value
+
     def _output_netcdf(self) -> None:
         """Output variable data to NetCDF for a time step.
 
@@ -573,6 +781,11 @@ class Process(Accessor):
             None
 
         """
+        if self._netcdf_aggregator is not None:
+            if self._netcdf_initialized:
+                self._output_netcdf_aggregated()
+            return
+
         if self._netcdf_initialized:
             time_added = False
             for variable in self._netcdf_output_vars:
@@ -584,7 +797,7 @@ class Process(Accessor):
                 self._netcdf[variable].add_data(
                     variable,
                     self._itime_step,
-                    getattr(self, variable),
+                    self._output_value(variable),
                 )
 
         return
@@ -596,15 +809,27 @@ class Process(Accessor):
             None
         """
         if self._netcdf_initialized:
+            aggregator = self._netcdf_aggregator
+            if aggregator is not None and aggregator.finalize():
+                self._write_netcdf_aggregated()
+
+            # close all the files before raising a failed (background) write
+            error = None
             for idx, variable in enumerate(self._netcdf_output_vars):
                 if (self._netcdf_output_vars is not None) and (
                     variable not in self._netcdf_output_vars
                 ):
                     continue
 
-                self._netcdf[variable].close()
+                try:
+                    self._netcdf[variable].close()
+                except RuntimeError as close_error:
+                    if error is None:
+                        error = close_error
                 if not self._netcdf_separate:
                     break
+            if error is not None:
+                raise error
         return
 
     def _reconcile_nc_args_w_control_opts(
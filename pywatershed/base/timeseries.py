@@ -20,6 +20,9 @@ class TimeseriesArray:
         self.variable_name = var_name
         self.time = time
         self.data = array
+        # the offset of the first time of data from the first time of time,
+        # when data holds a window of the times (see PRMSAtmosphere)
+        self.data_start = 0
 
         self._current = self.data[0, :].copy()  # copy is necessary
 
@@ -46,7 +49,9 @@ class TimeseriesArray:
 
             else:
                 # This is for datetime, which is float
-                if self.control.itime_step == 0:
+                if self.control.itime_step == 0 or not hasattr(
+                    self, "_init_time_ind"
+                ):
                     start_time_ind = np.where(
                         self.time == self.control._start_time
                     )[0]
@@ -56,7 +61,11 @@ class TimeseriesArray:
 
                     self._init_time_ind = start_time_ind[0]
 
-                time_ind = self._init_time_ind + self.control.itime_step
+                time_ind = (
+                    self._init_time_ind
+                    + self.control.itime_step
+                    - self.data_start
+                )
 
         self._current[:] = self.data[time_ind, :]
         return
@@ -1,5 +1,5 @@
 from .prms_canopy import PRMSCanopy
-from .prms_channel import PRMSChannel
+from .prms_channel import HruSegmentMap, PRMSChannel
 from .prms_channel_flow_graph import (
     HruNodeFlowExchange,
     HruSegmentFlowAdapter,
@@ -24,6 +24,7 @@ __all__ = (
     "PRMSChannelFlowNode",
     "PRMSChannelFlowNodeMaker",
     "HruSegmentFlowAdapter",
+    "HruSegmentMap",
     "HruNodeFlowExchange",
     "PRMSCanopy",
     "PRMSChannel",
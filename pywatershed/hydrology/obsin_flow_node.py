@@ -1,10 +1,13 @@
-import pandas as pd
+from typing import TYPE_CHECKING
 
 from pywatershed.base.control import Control
 from pywatershed.base.flow_graph import FlowNode, FlowNodeMaker
 from pywatershed.base.parameters import Parameters
 from pywatershed.constants import nan, zero
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 class ObsInFlowNode(FlowNode):
     """A FlowNode that takes inflows but returns observed/specified flows.
@@ -20,7 +23,7 @@ class ObsInFlowNode(FlowNode):
     def __init__(
         self,
         control: Control,
-        node_obs_data: pd.Series,
+        node_obs_data: "pd.Series",
     ):
         """Initialize an ObsInFlowNode.
 
@@ -99,7 +102,7 @@ class ObsInFlowNodeMaker(FlowNodeMaker):
     def __init__(
         self,
         parameters: Parameters,
-        obs_data: pd.DataFrame,
+        obs_data: "pd.DataFrame",
     ) -> None:
         """Initialize a ObsInFlowNodeMaker.
 
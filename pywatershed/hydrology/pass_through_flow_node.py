@@ -1,6 +1,9 @@
+import numpy as np
+
 from ..base.control import Control
-from ..base.flow_graph import FlowNode, FlowNodeMaker
+from ..base.flow_graph import FlowNode, FlowNodeArrays, FlowNodeMaker
 from ..constants import nan, zero
+from ..utils.numba_utils import njit
 
 
 class PassThroughFlowNode(FlowNode):
@@ -61,6 +64,65 @@ class PassThroughFlowNode(FlowNode):
         return zero
 
 
+def _pass_through_kernel_numba(
+    isubstep, inflow_upstream, inflow_lateral, state, params, inode
+):
+    inflow_subtimestep = inflow_upstream + inflow_lateral
+    state[0, inode] += inflow_subtimestep
+    state[1, inode] = inflow_subtimestep
+    state[2, inode] = state[0, inode] / (isubstep + 1)
+    return inflow_subtimestep
+
+
+_pass_through_kernel = njit(_pass_through_kernel_numba)
+
+
+class PassThroughFlowNodeArrays(FlowNodeArrays):
+    """PassThroughFlowNodes as arrays for the array engine of FlowGraph.
+
+    See :class:`FlowNodeArrays`.
+    """
+
+    state_names = ("accum_inflow", "inflow_subtimestep", "seg_outflow")
+    kernel = staticmethod(_pass_through_kernel)
+
+    def __init__(self, control: Control, n_nodes: int):
+        """Initialize PassThroughFlowNodeArrays.
+
+        Args:
+            control: A control object.
+            n_nodes: The number of nodes.
+        """
+        super().__init__(control, n_nodes)
+        return
+
+    def prepare_timestep(self):
+        self.set_state("accum_inflow", zero)
+        return
+
+    def finalize_timestep(self):
+        return
+
+    def advance(self):
+        return
+
+    @property
+    def outflow(self):
+        return self.get_state("seg_outflow")
+
+    @property
+    def storage_change(self):
+        return np.zeros(self.n_nodes)
+
+    @property
+    def storage(self):
+        return np.full(self.n_nodes, nan)
+
+    @property
+    def sink_source(self):
+        return np.zeros(self.n_nodes)
+
+
 class PassThroughFlowNodeMaker(FlowNodeMaker):
     """A FlowNodeMaker of PassThroughFlowNodes.
 
@@ -75,3 +137,6 @@ class PassThroughFlowNodeMaker(FlowNodeMaker):
 
     def get_node(self, control: Control, index: int):
         return PassThroughFlowNode(control)
+
+    def get_node_arrays(self, control: Control, indices):
+        return PassThroughFlowNodeArrays(control, len(indices))
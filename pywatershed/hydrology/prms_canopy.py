@@ -16,6 +16,7 @@ from ..constants import (
     zero,
 )
 from ..parameters import Parameters
+from ..utils.numba_utils import bind_functions, njit_functions
 
 try:
     from ..prms_canopy_f import canopy
@@ -189,8 +190,6 @@ class PRMSCanopy(ConservativeProcess):
             self._calc_method = "numba"
 
         if self._calc_method.lower() in ["numba"]:
-            import numba as nb
-
             numba_msg = f"{self.name} jit compiling with numba "
             nb_parallel = (numba_num_threads is not None) and (
                 numba_num_threads > 1
@@ -221,7 +220,6 @@ class PRMSCanopy(ConservativeProcess):
             #     ),
             #     fastmath=True,
             # )(self._intercept)
-            self._intercept = nb.njit(fastmath=True)(self._intercept)
 
             # self._calculate_numba = nb.njit(
             #     nb.types.Tuple(
@@ -278,9 +276,16 @@ class PRMSCanopy(ConservativeProcess):
             #     ),
             #     fastmath=True,
             # )(self._calculate_procedural)
-            self._calculate_canopy = nb.njit(
-                fastmath=True, parallel=nb_parallel
-            )(self._calculate_numpy)
+            # the kernel calls _intercept by its global name
+            self._calculate_canopy = njit_functions(
+                {
+                    "_calculate_numpy": (
+                        self._calculate_numpy,
+                        {"fastmath": True, "parallel": nb_parallel},
+                    ),
+                    "_intercept": (self._intercept, {"fastmath": True}),
+                }
+            )["_calculate_numpy"]
 
         elif self._calc_method.lower() == "fortran":
             pass
@@ -290,7 +295,12 @@ class PRMSCanopy(ConservativeProcess):
             # self._calculate_gw = _calculate_fortran
 
         else:
-            self._calculate_canopy = self._calculate_numpy
+            self._calculate_canopy = bind_functions(
+                {
+                    "_calculate_numpy": (self._calculate_numpy, {}),
+                    "_intercept": (self._intercept, {}),
+                }
+            )["_calculate_numpy"]
 
         return
 
@@ -364,7 +374,6 @@ class PRMSCanopy(ConservativeProcess):
                 snow=np.int32(SNOW),
                 off=np.int32(OFF),
                 active=np.int32(ACTIVE),
-                intercept=self._intercept,
             )
 
         else:
@@ -465,7 +474,6 @@ class PRMSCanopy(ConservativeProcess):
         snow,
         off,
         active,
-        intercept,
     ):
         # TODO: would be nice to alphabetize the arguments
         #       probably while keeping constants at the end.
@@ -537,7 +545,7 @@ class PRMSCanopy(ConservativeProcess):
                             # intercept(
                             #     Hru_rain(i), stor_max_rain, cov, intcpstor,
                             #     netrain)
-                            intcpstor, netrain = intercept(
+                            intcpstor, netrain = _intercept(
                                 hru_rain[i],
                                 stor_max_rain,
                                 cov,
@@ -553,7 +561,7 @@ class PRMSCanopy(ConservativeProcess):
                             if (
                                 pk_ice_prev[i] + freeh2o_prev[i]
                             ) < dnearzero and netsnow < nearzero:
-                                intcpstor, netrain = intercept(
+                                intcpstor, netrain = _intercept(
                                     hru_rain[i],
                                     stor_max_rain,
                                     cov,
@@ -565,7 +573,7 @@ class PRMSCanopy(ConservativeProcess):
             if hru_snow[i] > 0.0:
                 if cov > 0.0:
                     if cov_type[i] > GRASSES:
-                        intcpstor, netsnow = intercept(
+                        intcpstor, netsnow = _intercept(
                             hru_snow[i],
                             snow_intcp[i],
                             cov,
@@ -666,3 +674,8 @@ class PRMSCanopy(ConservativeProcess):
                 net_precip[i] += (intcp_stor[i] - stor_max[i]) * covden[i]
                 intcp_stor[i] = stor_max[i]
         return
+
+
+# The kernel calls the helper by its global name, so that the jitted kernel
+# can be cached on disk (see njit_functions).
+_intercept = PRMSCanopy._intercept
@@ -1,14 +1,16 @@
 from typing import Literal, Tuple
 from warnings import warn
 
-import networkx as nx
 import numpy as np
+from numba import prange
 
 from ..base.adapter import adaptable
 from ..base.conservative_process import ConservativeProcess
 from ..base.control import Control
-from ..constants import SegmentType, nan, zero
+from ..constants import SegmentType, fileish, nan, numba_num_threads, zero
 from ..parameters import Parameters
+from ..utils.numba_utils import njit
+from ..utils.topology import TopologyIndex
 
 try:
     from ..prms_channel_f import calc_muskingum_mann as _calculate_fortran
@@ -18,6 +20,110 @@ except ImportError:
     has_prmschannel_f = False
 
 
+class HruSegmentMap:
+    """Map values on HRUs to the PRMS segments to which the HRUs flow.
+
+    The mapping is built once from hru_segment so that the values of all
+    HRUs are summed onto the segments in a single numpy.bincount call, for a
+    single time step or for a batch of time steps (or of flow components).
+    The values of each segment are summed in HRU order, as by a loop over
+    the HRUs. HRUs with an hru_segment of zero do not flow to a segment and
+    are not mapped, see unmapped().
+
+    Args:
+        hru_segment: The one-based index of the segment of each HRU, as the
+            PRMS parameter hru_segment.
+        nsegment: The number of segments (or nodes) mapped to.
+        hru_area: Optional weights by which the values on the HRUs are
+            multiplied, e.g. the HRU areas to map depths to volumes.
+
+    Examples:
+    ---------
+
+    >>> import numpy as np
+    >>> from pywatershed.hydrology.prms_channel import HruSegmentMap
+    >>> hru_segment_map = HruSegmentMap(np.array([2, 0, 2, 1]), 3)
+    >>> hru_segment_map.segment_sums(np.array([1.0, 2.0, 3.0, 4.0]))
+    array([4., 4., 0.])
+    >>> hru_segment_map.segment_sums(np.ones((2, 4)))
+    array([[1., 2., 0.],
+           [1., 2., 0.]])
+    >>> hru_segment_map.unmapped(np.array([1.0, 2.0, 3.0, 4.0]))
+    array([0., 2., 0., 0.])
+    """
+
+    def __init__(
+        self,
+        hru_segment: np.ndarray,
+        nsegment: int,
+        hru_area: np.ndarray = None,
+    ):
+        hru_segment = np.asarray(hru_segment, dtype="int64") - 1
+        self.nhru = len(hru_segment)
+        self.nsegment = nsegment
+        self.mapped = hru_segment >= 0
+        self._hrus = np.where(self.mapped)[0]
+        self._segments = hru_segment[self._hrus]
+        self._weights = None
+        if hru_area is not None:
+            self._weights = np.asarray(hru_area, dtype="float64")
+        return
+
+    def segment_sums(
+        self, hru_values: np.ndarray, out: np.ndarray = None
+    ) -> np.ndarray:
+        """Sum the values on the HRUs onto their segments.
+
+        Args:
+            hru_values: The values on the HRUs, the last dimension being
+                nhru, e.g. of shape (nhru,) for a time step or (ntime, nhru)
+                for a batch of time steps.
+            out: An optional array for the result.
+
+        Returns:
+            The sums on the segments, the last dimension of hru_values
+            replaced by nsegment.
+        """
+        hru_values = np.asarray(hru_values, dtype="float64")
+        batch_shape = hru_values.shape[:-1]
+        values = hru_values[..., self._hrus]
+        if self._weights is not None:
+            values = values * self._weights[self._hrus]
+
+        # a batch is mapped to consecutive blocks of segments
+        n_batch = int(np.prod(batch_shape))
+        index = self._segments
+        if n_batch != 1:
+            index = index + self.nsegment * np.arange(n_batch)[:, np.newaxis]
+
+        sums = np.bincount(
+            index.ravel(),
+            weights=values.ravel(),
+            minlength=n_batch * self.nsegment,
+        ).reshape(*batch_shape, self.nsegment)
+
+        if out is None:
+            return sums
+        out[...] = sums
+        return out
+
+    def unmapped(self, hru_values: np.ndarray) -> np.ndarray:
+        """The values on the HRUs which are not mapped, zero elsewhere.
+
+        Args:
+            hru_values: The values on the HRUs, the last dimension being
+                nhru.
+
+        Returns:
+            The (weighted) values of hru_values on HRUs not flowing to a
+            segment and zero on the others.
+        """
+        hru_values = np.asarray(hru_values, dtype="float64")
+        if self._weights is not None:
+            hru_values = hru_values * self._weights
+        return np.where(self.mapped, zero, hru_values)
+
+
 class PRMSChannel(ConservativeProcess):
     """PRMS channel flow (muskingum_mann).
 
@@ -86,16 +192,34 @@ class PRMSChannel(ConservativeProcess):
             available. When control.options["budget_type"] is not avaiable,
             budget_type is set to "warn".
         calc_method: one of ["fortran", "numba", "numpy"]. None defaults to
-            "numba".
+            "numba". When NUMBA_NUM_THREADS > 1, the numba method routes
+            independent basins (connected components of the network),
+            balanced across the threads by number of segments, concurrently
+            or, if a basin dominates the network, the segments at each
+            topological level concurrently (see
+            pywatershed.utils.topology.routing_schedule). Results are
+            identical to routing in segment order.
         adjust_parameters: one of ["warn", "error", "no"]. Default is "warn",
             the code edits the parameters and issues a warning. If "error" is
             selected the the code issues warnings about all edited parameters
             before raising the error to give you information. If "no" is
             selected then no parameters are adjusted and there will be no
             warnings or errors.
+        topology_cache_dir: Optional directory in which the topology of the
+            segments (see pywatershed.utils.topology.TopologyIndex) is
+            cached, defaulting to the control option of the same name. None
+            does not cache on disk.
         verbose: Print extra information or not?
     """
 
+    # the Muskingum solution carries these from one time step to the next
+    _checkpoint_private_variables = (
+        "_seg_inflow",
+        "_inflow_ts",
+        "_outflow_ts",
+        "_seg_current_sum",
+    )
+
     def __init__(
         self,
         control: Control,
@@ -107,6 +231,7 @@ class PRMSChannel(ConservativeProcess):
         budget_type: Literal["defer", None, "warn", "error"] = "defer",
         calc_method: Literal["fortran", "numba", "numpy"] = None,
         adjust_parameters: Literal["warn", "error", "no"] = "warn",
+        topology_cache_dir: fileish = None,
         verbose: bool = None,
     ) -> None:
         super().__init__(
@@ -198,44 +323,21 @@ class PRMSChannel(ConservativeProcess):
 
         # convert prms data to zero-based
         self._hru_segment = self.hru_segment - 1
+        self._hru_segment_map = HruSegmentMap(self.hru_segment, self.nsegment)
         self._tosegment = self.tosegment - 1
         self._tosegment = self._tosegment.astype("int64")
 
-        # calculate connectivity
-        self._outflow_mask = np.full((len(self._tosegment)), False)
-        connectivity = []
-        for iseg in range(self.nsegment):
-            tosegment = self._tosegment[iseg]
-            if tosegment < 0:
-                self._outflow_mask[iseg] = True
-                continue
-            connectivity.append(
-                (
-                    iseg,
-                    tosegment,
-                )
-            )
-
-        # use networkx to calculate the Directed Acyclic Graph
-        if self.nsegment > 1:
-            self._graph = nx.DiGraph()
-            self._graph.add_edges_from(connectivity)
-            segment_order = list(nx.topological_sort(self._graph))
-        else:
-            segment_order = [0]
-
-        # if the domain contains links with no upstream or
-        # downstream reaches, we just throw these back at the
-        # top of the order since networkx wont handle such nonsense
-        wh_mask_set = set(np.where(self._outflow_mask)[0])
-        seg_ord_set = set(segment_order)
-        mask_not_seg_ord = list(wh_mask_set - seg_ord_set)
-        if len(mask_not_seg_ord):
-            segment_order = mask_not_seg_ord + segment_order
-            # for pp in mask_not_seg_ord:
-            #    assert (tosegment[pp] == -1) and (not pp in tosegment)
+        self._outflow_mask = self._tosegment < 0
 
-        self._segment_order = np.array(segment_order, dtype="int64")
+        # the routing order (segments without upstream or downstream
+        # segments are headwaters at the top of the order) and the upstream
+        # segments of each segment for scheduled routing
+        self._topology = TopologyIndex.from_to_index(
+            self._tosegment, cache_dir=self._topology_cache_dir
+        )
+        self._segment_order = self._topology.order
+        self._upstream_offsets = self._topology.upstream_offsets
+        self._upstream_segments = self._topology.upstream_nodes
 
         # calculate the Muskingum parameters
         velocity = (
@@ -371,13 +473,25 @@ class PRMSChannel(ConservativeProcess):
             import numba as nb
 
             numba_msg = f"{self.name} jit compiling with numba "
-            # this method can not be parallelized (? true?)
+            nb_parallel = (numba_num_threads is not None) and (
+                numba_num_threads > 1
+            )
+            if nb_parallel:
+                numba_msg += f"and using {numba_num_threads} threads"
             print(numba_msg, flush=True)
 
-            self._muskingum_mann = nb.njit(
+            # route the segments concurrently on the threads
+            self._routing_schedule = self._topology.routing_schedule(
+                n_parts=numba_num_threads if nb_parallel else 1,
+            )
+
+            self._muskingum_mann = njit(
                 nb.types.UniTuple(nb.float64[:], 7)(
-                    nb.int64[:],  # _segment_order
-                    nb.int64[:],  # _tosegment
+                    nb.int64[:],  # stage_offsets
+                    nb.int64[:],  # task_offsets
+                    nb.int64[:],  # task_segments
+                    nb.int64[:],  # _upstream_offsets
+                    nb.int64[:],  # _upstream_segments
                     nb.float64[:],  # seg_lateral_inflow
                     nb.float64[:],  # _seg_inflow0
                     nb.float64[:],  # _outflow_ts
@@ -388,8 +502,8 @@ class PRMSChannel(ConservativeProcess):
                     nb.float64[:],  # _c2
                 ),
                 fastmath=True,
-                parallel=False,
-            )(self._muskingum_mann_numpy)
+                parallel=nb_parallel,
+            )(self._muskingum_mann_schedule)
 
         elif self._calc_method.lower() == "fortran":
             self._muskingum_mann = _calculate_fortran
@@ -407,36 +521,41 @@ class PRMSChannel(ConservativeProcess):
         # This could vary with timestep so leave here
         s_per_time = self.control.time_step_seconds
 
-        # WRITE a function for this?
         # calculate lateral flow term
-        self.seg_lateral_inflow[:] = 0.0
-        for ihru in range(self.nhru):
-            iseg = self._hru_segment[ihru]
-            if iseg < 0:
-                # This is bad, selective handling of fluxes is not cool,
-                # mass is being discarded in a way that has to be coordinated
-                # with other parts of the code.
-                # This code shuold be removed evenutally.
-                self.channel_sroff_vol[ihru] = zero
-                self.channel_ssres_flow_vol[ihru] = zero
-                self.channel_gwres_flow_vol[ihru] = zero
-                continue
-
-            else:
-                self.channel_sroff_vol[ihru] = self.sroff_vol[ihru]
-                self.channel_ssres_flow_vol[ihru] = self.ssres_flow_vol[ihru]
-                self.channel_gwres_flow_vol[ihru] = self.gwres_flow_vol[ihru]
-
-            # cubicfeet to cfs
-            lateral_inflow = (
-                self.channel_sroff_vol[ihru]
-                + self.channel_ssres_flow_vol[ihru]
-                + self.channel_gwres_flow_vol[ihru]
-            ) / (s_per_time)
+        # HRUs not flowing to a segment discard their flows. This is bad,
+        # selective handling of fluxes is not cool, mass is being discarded
+        # in a way that has to be coordinated with other parts of the code.
+        # This code shuold be removed evenutally.
+        mapped = self._hru_segment_map.mapped
+        self.channel_sroff_vol[:] = np.where(mapped, self.sroff_vol, zero)
+        self.channel_ssres_flow_vol[:] = np.where(
+            mapped, self.ssres_flow_vol, zero
+        )
+        self.channel_gwres_flow_vol[:] = np.where(
+            mapped, self.gwres_flow_vol, zero
+        )
 
-            self.seg_lateral_inflow[iseg] += lateral_inflow
+        # cubicfeet to cfs
+        self._hru_segment_map.segment_sums(
+            (
+                self.channel_sroff_vol
+                + self.channel_ssres_flow_vol
+                + self.channel_gwres_flow_vol
+            )
+            / s_per_time,
+            out=self.seg_lateral_inflow,
+        )
 
         # solve muskingum_mann routing
+        if self._calc_method.lower() == "numba":
+            topology = (
+                *self._routing_schedule,
+                self._upstream_offsets,
+                self._upstream_segments,
+            )
+        else:
+            topology = (self._segment_order, self._tosegment)
+
         (
             self.seg_upstream_inflow[:],
             self._seg_inflow0[:],
@@ -446,8 +565,7 @@ class PRMSChannel(ConservativeProcess):
             self._outflow_ts[:],
             self._seg_current_sum[:],
         ) = self._muskingum_mann(
-            self._segment_order,
-            self._tosegment,
+            *topology,
             self.seg_lateral_inflow,
             self._seg_inflow0,
             self._outflow_ts,
@@ -599,3 +717,121 @@ class PRMSChannel(ConservativeProcess):
             outflow_ts,
             seg_current_sum,
         )
+
+    @staticmethod
+    def _muskingum_mann_schedule(
+        stage_offsets: np.ndarray,
+        task_offsets: np.ndarray,
+        task_segments: np.ndarray,
+        upstream_offsets: np.ndarray,
+        upstream_segments: np.ndarray,
+        seg_lateral_inflow: np.ndarray,
+        seg_inflow0: np.ndarray,
+        outflow_ts: np.ndarray,
+        tsi: np.ndarray,
+        ts: np.ndarray,
+        c0: np.ndarray,
+        c1: np.ndarray,
+        c2: np.ndarray,
+    ) -> Tuple[
+        np.ndarray,
+        np.ndarray,
+        np.ndarray,
+        np.ndarray,
+        np.ndarray,
+        np.ndarray,
+        np.ndarray,
+    ]:
+        """
+        Muskingum routing on a schedule, see _muskingum_mann_numpy.
+
+        A segment depends only on the hourly outflows of its upstream
+        segments, so each segment is routed for all 24 hours once its
+        upstream segments are routed. The stages of the schedule (see
+        pywatershed.utils.topology.routing_schedule) are routed in sequence,
+        the tasks of a stage independently of each other (in parallel
+        when compiled with parallel=True) and the segments of a task in
+        order. The hourly upstream inflow of a segment is gathered from the
+        hourly outflows of its upstream segments in segment order, so the
+        results are identical to routing in segment order.
+
+        Args:
+            stage_offsets: offsets of the stages in the tasks
+            task_offsets: offsets of the tasks in task_segments
+            task_segments: the segments of each task
+            upstream_offsets: offsets of the segments in upstream_segments
+            upstream_segments: the upstream segments of each segment
+            seg_lateral_inflow: segment lateral inflow
+            seg_inflow0: previous segment inflow variable (internal
+                calculations)
+            outflow_ts: outflow timeseries variable (internal calculations)
+            tsi: integer flood wave travel time
+            ts: float version of integer flood wave travel time
+            c0: Muskingum c0 variable
+            c1: Muskingum c1 variable
+            c2: Muskingum c2 variable
+
+        Returns:
+            The returns of _muskingum_mann_numpy.
+        """
+        nseg = seg_inflow0.shape[0]
+        seg_inflow = np.zeros(nseg)
+        seg_outflow = np.zeros(nseg)
+        inflow_ts = np.zeros(nseg)
+        seg_current_sum = np.zeros(nseg)
+        # the hourly outflows of the segments
+        outflow_hr = np.zeros((nseg, 24))
+
+        for istage in range(len(stage_offsets) - 1):
+            for itask in prange(
+                stage_offsets[istage], stage_offsets[istage + 1]
+            ):
+                for ii in range(task_offsets[itask], task_offsets[itask + 1]):
+                    jseg = task_segments[ii]
+                    for ihr in range(24):
+                        upstream_inflow = zero
+                        for kk in range(
+                            upstream_offsets[jseg], upstream_offsets[jseg + 1]
+                        ):
+                            upstream_inflow += outflow_hr[
+                                upstream_segments[kk], ihr
+                            ]
+
+                        seg_current_inflow = (
+                            seg_lateral_inflow[jseg] + upstream_inflow
+                        )
+                        seg_inflow[jseg] += seg_current_inflow
+                        inflow_ts[jseg] += seg_current_inflow
+                        seg_current_sum[jseg] += upstream_inflow
+
+                        remainder = (ihr + 1) % tsi[jseg]
+                        if remainder == 0:
+                            inflow_ts[jseg] /= ts[jseg]
+                            if tsi[jseg] > 0:
+                                outflow_ts[jseg] = (
+                                    inflow_ts[jseg] * c0[jseg]
+                                    + seg_inflow0[jseg] * c1[jseg]
+                                    + outflow_ts[jseg] * c2[jseg]
+                                )
+                            else:
+                                outflow_ts[jseg] = inflow_ts[jseg]
+
+                            seg_inflow0[jseg] = inflow_ts[jseg]
+                            inflow_ts[jseg] = 0.0
+
+                        seg_outflow[jseg] += outflow_ts[jseg]
+                        outflow_hr[jseg, ihr] = outflow_ts[jseg]
+
+        seg_outflow /= 24.0
+        seg_inflow /= 24.0
+        seg_upstream_inflow = seg_current_sum.copy() / 24.0
+
+        return (
+            seg_upstream_inflow,
+            seg_inflow0,
+            seg_inflow,
+            seg_outflow,
+            inflow_ts,
+            outflow_ts,
+            seg_current_sum,
+        )
@@ -4,25 +4,26 @@ from typing import Literal, Union
 
 import numba as nb
 import numpy as np
-import xarray as xr
 
 from pywatershed.base.adapter import (
     Adapter,
     AdapterNetcdf,
     adaptable,
-    adapter_factory,
 )
 from pywatershed.base.conservative_process import ConservativeProcess
 from pywatershed.base.control import Control
 from pywatershed.base.flow_graph import (
     FlowGraph,
     FlowNode,
+    FlowNodeArrays,
     FlowNodeMaker,
     inflow_exchange_factory,
 )
 from pywatershed.constants import SegmentType, nan, zero
-from pywatershed.hydrology.prms_channel import PRMSChannel
+from pywatershed.hydrology.prms_channel import HruSegmentMap, PRMSChannel
 from pywatershed.parameters import Parameters
+from pywatershed.utils.numba_utils import njit
+from pywatershed.utils.topology import upstream_adjacency
 
 
 class PRMSChannelFlowNode(FlowNode):
@@ -156,6 +157,113 @@ class PRMSChannelFlowNode(FlowNode):
         return zero
 
 
+def _muskingum_mann_kernel_numba(
+    ihr, inflow_upstream, inflow_lateral, state, params, inode
+):
+    (
+        seg_inflow,
+        inflow_ts,
+        outflow_ts,
+        seg_inflow0,
+        seg_outflow,
+    ) = _calculate_subtimestep_numba(
+        ihr,
+        inflow_upstream,
+        inflow_lateral,
+        state[0, inode],
+        state[1, inode],
+        state[2, inode],
+        state[3, inode],
+        state[4, inode],
+        np.int64(params[0, inode]),
+        params[1, inode],
+        params[2, inode],
+        params[3, inode],
+        params[4, inode],
+    )
+    state[0, inode] = seg_inflow0
+    state[1, inode] = seg_inflow
+    state[2, inode] = inflow_ts
+    state[3, inode] = seg_outflow
+    state[4, inode] = outflow_ts
+    return outflow_ts
+
+
+# the kernel of PRMSChannelFlowNodeArrays, compiled on first use. It calls a
+# jitted function so is not cached to disk.
+_muskingum_mann_kernel = njit(cache=False)(_muskingum_mann_kernel_numba)
+
+
+class PRMSChannelFlowNodeArrays(FlowNodeArrays):
+    """PRMSChannelFlowNodes as arrays for the array engine of FlowGraph.
+
+    The struct-of-arrays counterpart of :class:`PRMSChannelFlowNode`, giving
+    identical results. See :class:`FlowNodeArrays`.
+    """
+
+    state_names = (
+        "seg_inflow0",
+        "seg_inflow",
+        "inflow_ts",
+        "seg_outflow",
+        "outflow_ts",
+    )
+    param_names = ("tsi", "ts", "c0", "c1", "c2")
+    kernel = staticmethod(_muskingum_mann_kernel)
+
+    def __init__(self, control: Control, n_nodes: int, params: dict):
+        """Initialize PRMSChannelFlowNodeArrays.
+
+        Args:
+          control: A :class:`Control` object.
+          n_nodes: The number of nodes.
+          params: A dictionary of the arrays of the parameters tsi, ts, c0,
+            c1, and c2 of :class:`PRMSChannelFlowNode` over the nodes.
+        """
+        super().__init__(control, n_nodes, params)
+        self.seg_stor_change = np.zeros(n_nodes)
+        return
+
+    def prepare_timestep(self):
+        for name in ["seg_inflow", "seg_outflow", "inflow_ts"]:
+            self.set_state(name, zero)
+        return
+
+    def finalize_timestep(self):
+        # get rid of the magic 24 with argument?
+        seg_outflow = self.get_state("seg_outflow") / 24.0
+        seg_inflow = self.get_state("seg_inflow") / 24.0
+        self.set_state("seg_outflow", seg_outflow)
+        self.set_state("seg_inflow", seg_inflow)
+        self.seg_stor_change = seg_inflow - seg_outflow
+        return
+
+    def advance(self):
+        self.set_state("seg_inflow0", self.get_state("seg_inflow"))
+        return
+
+    @property
+    def outflow(self):
+        """The average outflow over the timestep in cubic feet per second."""
+        return self.get_state("seg_outflow")
+
+    @property
+    def storage_change(self):
+        """The volumetric storage change in cubic feet."""
+        return self.seg_stor_change
+
+    @property
+    def storage(self):
+        """The volumetric storage in millions of cubic feet.
+        Not defined for PRMSChannel.
+        """
+        return np.full(self.n_nodes, nan)
+
+    @property
+    def sink_source(self):
+        return np.zeros(self.n_nodes)
+
+
 class PRMSChannelFlowNodeMaker(FlowNodeMaker):
     """A FlowNodeMaker for PRMSChannelFlowNodes.
 
@@ -206,6 +314,21 @@ class PRMSChannelFlowNodeMaker(FlowNodeMaker):
             calc_method=self._calc_method,
         )
 
+    def get_node_arrays(self, control, indices) -> PRMSChannelFlowNodeArrays:
+        if self._calc_method not in [None, "numba"]:
+            return None
+        return PRMSChannelFlowNodeArrays(
+            control=control,
+            n_nodes=len(indices),
+            params={
+                "tsi": self._tsi[indices],
+                "ts": self._ts[indices],
+                "c0": self._c0[indices],
+                "c1": self._c1[indices],
+                "c2": self._c2[indices],
+            },
+        )
+
     def _set_data(self, discretization, parameters):
         self._parameters = parameters
         self._discretization = discretization
@@ -386,7 +509,7 @@ def _calculate_subtimestep_numpy(
 numba_msg = "prms_channel_flow_graph jit compiling with numba"
 print(numba_msg, flush=True)
 
-_calculate_subtimestep_numba = nb.njit(
+_calculate_subtimestep_numba = njit(
     nb.types.UniTuple(nb.float64, 5)(
         nb.int64,  # ihr
         nb.float64,  # inflow_upstream
@@ -459,7 +582,9 @@ class HruSegmentFlowAdapter(Adapter):
         # self.current_value (provided in the super) is the lateral flows
         self._current_value = np.zeros(self._nsegment) * nan
 
-        self._hru_segment = self._parameters.parameters["hru_segment"] - 1
+        self._hru_segment_map = HruSegmentMap(
+            self._parameters.parameters["hru_segment"], self._nsegment
+        )
 
         return
 
@@ -483,18 +608,13 @@ class HruSegmentFlowAdapter(Adapter):
 
     def _calculate_segment_lateral_inflows(self):
         """Map HRU inflows to lateral inflows on segments/nodes"""
-        self._current_value[:] = zero
-        for ihru in range(self._nhru):
-            iseg = self._hru_segment[ihru]
-            if iseg < 0:
-                # This is bad, selective handling of fluxes is not cool,
-                # mass is being discarded in a way that has to be
-                # coordinated with other parts of the code.
-                # This code should be removed evenutally.
-                continue
-
-            self._current_value[iseg] += self._inflows[ihru]
-
+        # Inflows of HRUs not mapped to segments are dropped. This is bad,
+        # selective handling of fluxes is not cool, mass is being discarded
+        # in a way that has to be coordinated with other parts of the code.
+        # This code should be removed evenutally.
+        self._hru_segment_map.segment_sums(
+            self._inflows, out=self._current_value
+        )
         return
 
 
@@ -545,7 +665,7 @@ class HruNodeFlowExchange(ConservativeProcess):
         self._set_inputs(locals())
         self._set_options(locals())
 
-        self._hru_segment = self.hru_segment - 1
+        self._hru_segment_map = HruSegmentMap(self.hru_segment, self.nnodes)
 
         self._set_budget(basis="global")
 
@@ -604,14 +724,9 @@ class HruNodeFlowExchange(ConservativeProcess):
             / s_per_time
         )
 
-        self.inflows[:] = zero
-        self.sinks[:] = zero  # this is an HRU variable
-        for ihru in range(self.nhru):
-            iseg = self._hru_segment[ihru]
-            if iseg < 0:
-                self.sinks[ihru] += self._inputs_sum[ihru]
-            else:
-                self.inflows[iseg] += self._inputs_sum[ihru]
+        self._hru_segment_map.segment_sums(self._inputs_sum, out=self.inflows)
+        # this is an HRU variable
+        self.sinks[:] = self._hru_segment_map.unmapped(self._inputs_sum)
 
         self.inflows_vol[:] = self.inflows * s_per_time
         self.sinks_vol[:] = self.sinks * s_per_time
@@ -816,27 +931,24 @@ def prms_channel_flow_graph_to_model_dict(
         new_nodes_flow_to_nhm_seg,
     )
 
+    # Exchange parameters
+    nnodes = params_flow_graph.dims["nnodes"]
+    hru_segment_map = HruSegmentMap(
+        prms_channel_params.parameters["hru_segment"], nnodes
+    )
+
     def exchange_calculation(self) -> None:
-        _hru_segment = self.hru_segment - 1
         s_per_time = self.control.time_step_seconds
         self._inputs_sum = (
             sum([vv.current for vv in self._input_variables_dict.values()])
             / s_per_time
         )
 
-        # This zeros in at the end mean that zero inflows and sinks in added
-        # nodes
-        self.inflows[:] = zero
+        # The added nodes at the end receive zero inflows
+        hru_segment_map.segment_sums(self._inputs_sum, out=self.inflows)
         # sinks is an HRU variable, its accounting in budget is fine because
         # global collapses it to a scalar before summing over variables
-        self.sinks[:] = zero
-
-        for ihru in range(self.nhru):
-            iseg = _hru_segment[ihru]
-            if iseg < 0:
-                self.sinks[ihru] += self._inputs_sum[ihru]
-            else:
-                self.inflows[iseg] += self._inputs_sum[ihru]
+        self.sinks[:] = hru_segment_map.unmapped(self._inputs_sum)
 
         self.inflows_vol[:] = self.inflows * s_per_time
         self.sinks_vol[:] = self.sinks * s_per_time
@@ -863,8 +975,6 @@ def prms_channel_flow_graph_to_model_dict(
         calculation=exchange_calculation,
     )  # get the budget type into the exchange too: exchange_budget_type
 
-    # Exchange parameters
-    nnodes = params_flow_graph.dims["nnodes"]
     params_ds = prms_channel_params.to_xr_ds().copy()
     params_ds["node_coord"] = xr.Variable(
         dims="nnodes",
@@ -940,6 +1050,16 @@ def _build_flow_graph_inputs(
     tosegment = dis_params["tosegment"] - 1  # fortan to python indexing
     to_graph_index[0:nseg] = tosegment
 
+    # The prms_channel nodes are the first nseg nodes of the graph, segment
+    # iseg is graph index iseg. Look up the segment of each nhm_seg and the
+    # segments flowing into each segment once rather than searching.
+    nhm_seg_index = {
+        seg: iseg for iseg, seg in enumerate(dis_params["nhm_seg"].tolist())
+    }
+    upstream_offsets, upstream_segments = upstream_adjacency(
+        np.arange(nseg), tosegment
+    )
+
     # The new nodes which flow to other new_nodes have to be added after
     # the nodes flowing to existing nodes with nhm_seg ids.
     to_new_nodes_inds_in_added = {}
@@ -951,22 +1071,13 @@ def _build_flow_graph_inputs(
             to_new_nodes_inds_in_added[ii] = -1 * nhm_seg
             continue
 
-        wh_intervene_above_nhm = np.where(dis_params["nhm_seg"] == nhm_seg)
-        wh_intervene_below_nhm = np.where(
-            tosegment == wh_intervene_above_nhm[0][0]
-        )
-        # have to map to the graph from an index found in prms_channel
-        wh_intervene_above_graph = np.where(
-            (node_maker_name == "prms_channel")
-            & (node_maker_index == wh_intervene_above_nhm[0][0])
-        )
-        wh_intervene_below_graph = np.where(
-            (node_maker_name == "prms_channel")
-            & np.isin(node_maker_index, wh_intervene_below_nhm)
-        )
+        intervene_above = nhm_seg_index[nhm_seg]
+        start = upstream_offsets[intervene_above]
+        end = upstream_offsets[intervene_above + 1]
+        intervene_below = upstream_segments[start:end]
 
-        to_graph_index[nseg + ii] = wh_intervene_above_graph[0][0]
-        to_graph_index[wh_intervene_below_graph] = nseg + ii
+        to_graph_index[nseg + ii] = intervene_above
+        to_graph_index[intervene_below] = nseg + ii
         added_new_nodes_inds_in_graph[ii] = nseg + ii
 
     # <
@@ -1031,21 +1142,26 @@ def prms_segment_lateral_inflow_components_to_netcdf(
     input_dir: pl.Path,
     nc_out_file_path: str,
     output_sum: bool = False,
+    batch_n_times: int = 366,
 ) -> None:
     """Write to NetCDf the components of lateral flow on PRMS segments.
 
     This helper function takes the PRMS lateral flows from HRUs (sroff_vol,
     ssres_flow_vol, and gwres_flow_vol) and maps them individually to the
-    PRMS segments.
+    PRMS segments. The components are mapped together for batches of time
+    steps with a :class:`HruSegmentMap`. The control is advanced through all
+    its times, as when the lateral flows are mapped one time step at a time.
 
     Args:
-      control: A Control object for the input files selected.
+      control: A Control object for the input files selected, which is
+        advanced to its end time.
       parameters: A Parameters object with both nhru and nsegment dimensions.
       input_dir: The directory to look for the inputs files: sroff_vol.nc,
         ssres_flow_vol.nc, and gwres_flow_vol.nc.
       nc_out_file_path: The path of the output netcdf file.
       output_sum: Also include the sum of the lateral flow components in the
         output file (named 'lateral_inflow_vol').
+      batch_n_times: The number of time steps mapped at once.
 
     Examples
     ---------
@@ -1097,45 +1213,28 @@ def prms_segment_lateral_inflow_components_to_netcdf(
 
     """  # noqa: E501
 
+    import xarray as xr
+
     time = np.arange(
         control.start_time,
         control.end_time + control.time_step,  # per arange construction
         control.time_step,
     ).astype("datetime64[ns]")
     nhm_seg = parameters.parameters["nhm_seg"]
-    nhm_id = parameters.parameters["nhm_id"]
 
     ntime = len(time)
     nsegment = len(nhm_seg)
-    nhru = len(nhm_id)
-
-    zero_adapter = adapter_factory(np.zeros(nhru), "zero", control)
 
+    components = ["sroff_vol", "ssres_flow_vol", "gwres_flow_vol"]
     input_adapters = {}
-    for vv in ["sroff_vol", "ssres_flow_vol", "gwres_flow_vol"]:
+    for vv in components:
         nc_path = input_dir / f"{vv}.nc"
         input_adapters[vv] = AdapterNetcdf(nc_path, vv, control)
 
-    exch_sroff = HruSegmentFlowAdapter(
-        parameters=parameters,
-        sroff_vol=input_adapters["sroff_vol"],
-        ssres_flow_vol=zero_adapter,
-        gwres_flow_vol=zero_adapter,
-    )
-
-    exch_ssres = HruSegmentFlowAdapter(
-        parameters=parameters,
-        sroff_vol=zero_adapter,
-        ssres_flow_vol=input_adapters["ssres_flow_vol"],
-        gwres_flow_vol=zero_adapter,
-    )
-
-    exch_gwres = HruSegmentFlowAdapter(
-        parameters=parameters,
-        sroff_vol=zero_adapter,
-        ssres_flow_vol=zero_adapter,
-        gwres_flow_vol=input_adapters["gwres_flow_vol"],
+    hru_segment_map = HruSegmentMap(
+        parameters.parameters["hru_segment"], nsegment
     )
+    s_per_time = control.time_step_seconds
 
     data_vars = dict(
         sroff_vol=(
@@ -1168,18 +1267,26 @@ def prms_segment_lateral_inflow_components_to_netcdf(
             units="cubic feet",
         ),
     )
-    for tt in range(control.n_times):
-        control.advance()
-        exch_sroff.advance()
-        exch_ssres.advance()
-        exch_gwres.advance()
-        seg_lateral_inflow["sroff_vol"][tt, :] = exch_sroff.current
-        seg_lateral_inflow["ssres_flow_vol"][tt, :] = exch_ssres.current
-        seg_lateral_inflow["gwres_flow_vol"][tt, :] = exch_gwres.current
+    for start in range(0, ntime, batch_n_times):
+        stop = min(start + batch_n_times, ntime)
+        # flows as by HruSegmentFlowAdapter: [component, time, nhm_seg]
+        seg_flows = hru_segment_map.segment_sums(
+            np.stack(
+                [
+                    input_adapters[vv].data_window(start, stop)
+                    for vv in components
+                ]
+            )
+            / s_per_time
+        )
+        for _ in range(start, stop):
+            control.advance()
+        for vv, flows in zip(components, seg_flows):
+            seg_lateral_inflow[vv][start:stop, :] = flows
         # sum
         if output_sum:
-            seg_lateral_inflow["lateral_inflow_vol"][tt, :] = (
-                exch_sroff.current + exch_ssres.current + exch_gwres.current
+            seg_lateral_inflow["lateral_inflow_vol"][start:stop, :] = (
+                seg_flows[0] + seg_flows[1] + seg_flows[2]
             )
 
     seg_lateral_inflow.to_netcdf(nc_out_file_path)
@@ -8,6 +8,7 @@ from ..base.conservative_process import ConservativeProcess
 from ..base.control import Control
 from ..constants import nan, numba_num_threads
 from ..parameters import Parameters
+from ..utils.numba_utils import njit
 
 try:
     from ..prms_groundwater_f import calc_groundwater as _calculate_fortran
@@ -178,7 +179,7 @@ class PRMSGroundwater(ConservativeProcess):
                 numba_msg += f"and using {numba_num_threads} threads"
             print(numba_msg, flush=True)
 
-            self._calculate_gw = nb.njit(
+            self._calculate_gw = njit(
                 nb.types.UniTuple(nb.float64[:], 5)(
                     nb.types.Array(nb.types.float64, 1, "C", readonly=True),
                     nb.float64[:],
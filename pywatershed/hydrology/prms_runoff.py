@@ -9,6 +9,7 @@ from ..base.conservative_process import ConservativeProcess
 from ..base.control import Control
 from ..constants import HruType, dnearzero, nearzero, numba_num_threads, zero
 from ..parameters import Parameters
+from ..utils.numba_utils import bind_functions, njit_functions
 
 RAIN = 0
 SNOW = 1
@@ -400,9 +401,16 @@ class PRMSRunoff(ConservativeProcess):
             warn(msg, UserWarning)
             self._calc_method = "numba"
 
-        if self._calc_method.lower() == "numba":
-            import numba as nb
+        # the kernel and helpers call the helpers by their global names
+        fns = [
+            "check_capacity",
+            "perv_comp",
+            "compute_infil",
+            "dprst_comp",
+            "imperv_et",
+        ]
 
+        if self._calc_method.lower() == "numba":
             numba_msg = f"{self.name} jit compiling with numba "
             nb_parallel = (numba_num_threads is not None) and (
                 numba_num_threads > 1
@@ -411,17 +419,21 @@ class PRMSRunoff(ConservativeProcess):
                 numba_msg += f"and using {numba_num_threads} threads"
             print(numba_msg, flush=True)
 
-            self._calculate_runoff = nb.njit(
-                self._calculate_numpy, parallel=nb_parallel
+            functions = {f"_{fn}": (getattr(self, fn), {}) for fn in fns}
+            functions["_calculate_numpy"] = (
+                self._calculate_numpy,
+                {"parallel": nb_parallel},
             )
-            self.check_capacity = nb.njit(self.check_capacity)
-            self.perv_comp = nb.njit(self.perv_comp)
-            self.compute_infil = nb.njit(self.compute_infil)
-            self.dprst_comp = nb.njit(self.dprst_comp)
-            self.imperv_et = nb.njit(self.imperv_et)
+            self._calculate_runoff = njit_functions(functions)[
+                "_calculate_numpy"
+            ]
 
         else:
-            self._calculate_runoff = self._calculate_numpy
+            functions = {f"_{fn}": (getattr(self, fn), {}) for fn in fns}
+            functions["_calculate_numpy"] = (self._calculate_numpy, {})
+            self._calculate_runoff = bind_functions(functions)[
+                "_calculate_numpy"
+            ]
 
         return
 
@@ -517,11 +529,6 @@ class PRMSRunoff(ConservativeProcess):
             dprst_seep_rate_clos=self.dprst_seep_rate_clos,
             sroff=self.sroff,
             hru_impervstor=self.hru_impervstor,
-            check_capacity=self.check_capacity,
-            perv_comp=self.perv_comp,
-            compute_infil=self.compute_infil,
-            dprst_comp=self.dprst_comp,
-            imperv_et=self.imperv_et,
             through_rain=self.through_rain,
             dprst_flag=self._dprst_flag,
         )
@@ -605,12 +612,6 @@ class PRMSRunoff(ConservativeProcess):
         dprst_seep_rate_clos,
         sroff,
         hru_impervstor,
-        # functions at end
-        check_capacity,
-        perv_comp,
-        compute_infil,
-        dprst_comp,
-        imperv_et,
         through_rain,
         dprst_flag,
     ):
@@ -650,7 +651,7 @@ class PRMSRunoff(ConservativeProcess):
                 imperv_stor[i],
                 infil[i],
                 contrib_fraction[i],
-            ) = compute_infil(
+            ) = _compute_infil(
                 contrib_fraction=contrib_fraction[i],
                 soil_moist_prev=soil_moist_prev[i],
                 soil_moist_max=soil_moist_max[i],
@@ -672,8 +673,6 @@ class PRMSRunoff(ConservativeProcess):
                 hruarea_imperv=hruarea_imperv,
                 sri=sri,
                 srp=srp,
-                check_capacity=check_capacity,
-                perv_comp=perv_comp,
                 through_rain=through_rain[i],
             )
 
@@ -702,7 +701,7 @@ class PRMSRunoff(ConservativeProcess):
                             dprst_vol_clos_frac[i],
                             dprst_vol_frac[i],
                             dprst_stor_hru[i],
-                        ) = dprst_comp(
+                        ) = _dprst_comp(
                             dprst_vol_clos=dprst_vol_clos[i],
                             dprst_area_clos_max=dprst_area_clos_max[i],
                             dprst_area_clos=dprst_area_clos[i],
@@ -757,7 +756,7 @@ class PRMSRunoff(ConservativeProcess):
             # Compute evaporation from impervious area
             if hruarea_imperv > 0.0:
                 if imperv_stor[i] > 0.0:
-                    imperv_stor[i], imperv_evap[i] = imperv_et(
+                    imperv_stor[i], imperv_evap[i] = _imperv_et(
                         imperv_stor[i],
                         potet[i],
                         imperv_evap[i],
@@ -838,8 +837,6 @@ class PRMSRunoff(ConservativeProcess):
         hruarea_imperv,
         sri,
         srp,
-        check_capacity,
-        perv_comp,
         through_rain,
     ):
         isglacier = False  # todo -- hardwired
@@ -858,7 +855,7 @@ class PRMSRunoff(ConservativeProcess):
             avail_water = avail_water + intcp_changeover
             infil = infil + intcp_changeover
             if hru_flag == 1:
-                infil, srp, contrib_fraction = perv_comp(
+                infil, srp, contrib_fraction = _perv_comp(
                     soil_moist_prev,
                     carea_max,
                     smidx_coef,
@@ -880,7 +877,7 @@ class PRMSRunoff(ConservativeProcess):
             avail_water = avail_water + through_rain
             infil = infil + through_rain
             if hru_flag == 1:
-                infil, srp, contrib_fraction = perv_comp(
+                infil, srp, contrib_fraction = _perv_comp(
                     soil_moist_prev,
                     carea_max,
                     smidx_coef,
@@ -910,7 +907,7 @@ class PRMSRunoff(ConservativeProcess):
             if hru_flag == 1:
                 if (pkwater_equiv > 0.0) or (net_rain < nearzero):
                     # Pervious area computations
-                    infil, srp = check_capacity(
+                    infil, srp = _check_capacity(
                         soil_moist_prev,
                         soil_moist_max,
                         snowinfil_max,
@@ -924,7 +921,7 @@ class PRMSRunoff(ConservativeProcess):
                     # if double_counting > 1:
                     #     print("snowmelt")
 
-                    infil, srp, contrib_fraction = perv_comp(
+                    infil, srp, contrib_fraction = _perv_comp(
                         soil_moist_prev,
                         carea_max,
                         smidx_coef,
@@ -952,7 +949,7 @@ class PRMSRunoff(ConservativeProcess):
                 # if double_counting > 1:
                 #     print("cond4")
                 if hru_flag == 1:
-                    infil, srp, contrib_fraction = perv_comp(
+                    infil, srp, contrib_fraction = _perv_comp(
                         soil_moist_prev,
                         carea_max,
                         smidx_coef,
@@ -968,7 +965,7 @@ class PRMSRunoff(ConservativeProcess):
         # on a snowfree surface.
         elif infil > 0.0:
             if hru_flag == 1:
-                infil, srp = check_capacity(
+                infil, srp = _check_capacity(
                     soil_moist_prev,
                     soil_moist_max,
                     snowinfil_max,
@@ -1285,3 +1282,12 @@ class PRMSRunoff(ConservativeProcess):
                 imperv_evap = avail_et / imperv_frac
             imperv_stor = imperv_stor - imperv_evap
         return imperv_stor, imperv_evap
+
+
+# The kernel and helpers call the helpers by their global names, so that the
+# jitted kernel can be cached on disk (see njit_functions).
+_check_capacity = PRMSRunoff.check_capacity
+_perv_comp = PRMSRunoff.perv_comp
+_compute_infil = PRMSRunoff.compute_infil
+_dprst_comp = PRMSRunoff.dprst_comp
+_imperv_et = PRMSRunoff.imperv_et
@@ -298,11 +298,6 @@ class PRMSRunoffNoDprst(PRMSRunoff):
             dprst_seep_rate_clos=zero_array.copy(),
             sroff=self.sroff,
             hru_impervstor=self.hru_impervstor,
-            check_capacity=self.check_capacity,
-            perv_comp=self.perv_comp,
-            compute_infil=self.compute_infil,
-            dprst_comp=self.dprst_comp,
-            imperv_et=self.imperv_et,
             through_rain=self.through_rain,
             dprst_flag=self._dprst_flag,
         )
@@ -19,6 +19,7 @@ from ..constants import (
     zero,
 )
 from ..parameters import Parameters
+from ..utils.numba_utils import bind_functions, njit_functions
 
 # These are constants used like variables (on self) in PRMS6
 # They dont appear on any LHS, so it seems they are constants
@@ -336,8 +337,9 @@ class PRMSSnow(ConservativeProcess):
             self.hru_deplcrv = self.hru_deplcrv.astype("int64")
 
         if True:
-            # For now there is no restart capability. we'll use the following
-            # line above when there is
+            # Restarts set the state after initialization, see
+            # Model.load_checkpoint. For PRMS restart files we'd use the
+            # following line
             # if self.control.options["restart"] in [0, 2, 3]:
 
             # The super().__init__ already set_initial_conditions using its
@@ -442,9 +444,20 @@ class PRMSSnow(ConservativeProcess):
             warn(msg, UserWarning)
             self._calc_method = "numba"
 
-        if self._calc_method.lower() == "numba":
-            import numba as nb
+        # the kernel and helpers call the helpers by their global names
+        fns = [
+            "_calc_calin",
+            "_calc_caloss",
+            "_calc_ppt_to_pack",
+            "_calc_sca_deplcrv",
+            "_calc_snalbedo",
+            "_calc_snowbal",
+            "_calc_snowcov",
+            "_calc_snowevap",
+            "_calc_step_4",
+        ]
 
+        if self._calc_method.lower() == "numba":
             numba_msg = f"{self.name} jit compiling with numba "
             nb_parallel = (numba_num_threads is not None) and (
                 numba_num_threads > 1
@@ -453,30 +466,23 @@ class PRMSSnow(ConservativeProcess):
                 numba_msg += f"and using {numba_num_threads} threads"
             print(numba_msg, flush=True)
 
-            self._calculate_snow = nb.njit(
-                fastmath=True, parallel=nb_parallel
-            )(self._calculate_numpy)
-
-            fns = [
-                "_calc_calin",
-                "_calc_caloss",
-                "_calc_ppt_to_pack",
-                "_calc_sca_deplcrv",
-                "_calc_snalbedo",
-                "_calc_snowbal",
-                "_calc_snowcov",
-                "_calc_snowevap",
-                "_calc_step_4",
+            functions = {
+                fn: (getattr(self, fn), {"fastmath": True}) for fn in fns
+            }
+            functions["_calculate_numpy"] = (
+                self._calculate_numpy,
+                {"fastmath": True, "parallel": nb_parallel},
+            )
+            self._calculate_snow = njit_functions(functions)[
+                "_calculate_numpy"
             ]
-            for fn in fns:
-                setattr(
-                    self,
-                    fn,
-                    nb.njit(fastmath=True)(getattr(self, fn)),
-                )
 
         else:
-            self._calculate_snow = self._calculate_numpy
+            functions = {fn: (getattr(self, fn), {}) for fn in fns}
+            functions["_calculate_numpy"] = (self._calculate_numpy, {})
+            self._calculate_snow = bind_functions(functions)[
+                "_calculate_numpy"
+            ]
 
         return
 
@@ -530,15 +536,6 @@ class PRMSSnow(ConservativeProcess):
             albset_sna=self.albset_sna,
             albset_snm=self.albset_snm,
             amlt_init=amlt_init,
-            calc_calin=self._calc_calin,
-            calc_caloss=self._calc_caloss,
-            calc_ppt_to_pack=self._calc_ppt_to_pack,
-            calc_sca_deplcrv=self._calc_sca_deplcrv,
-            calc_snalbedo=self._calc_snalbedo,
-            calc_snowbal=self._calc_snowbal,
-            calc_snowcov=self._calc_snowcov,
-            calc_snowevap=self._calc_snowevap,
-            calc_step_4=self._calc_step_4,
             cecn_coef=self.cecn_coef,
             cov_type=self.cov_type,
             covden_sum=self.covden_sum,
@@ -629,15 +626,6 @@ class PRMSSnow(ConservativeProcess):
         albset_sna,
         albset_snm,
         amlt_init,
-        calc_calin,
-        calc_caloss,
-        calc_ppt_to_pack,
-        calc_snalbedo,
-        calc_sca_deplcrv,
-        calc_snowbal,
-        calc_snowcov,
-        calc_snowevap,
-        calc_step_4,
         cecn_coef,
         cov_type,
         covden_sum,
@@ -823,9 +811,7 @@ class PRMSSnow(ConservativeProcess):
                 pss[jj],
                 pst[jj],
                 snowmelt[jj],
-            ) = calc_ppt_to_pack(
-                calc_calin=calc_calin,
-                calc_caloss=calc_caloss,
+            ) = _calc_ppt_to_pack(
                 den_max=den_max[jj],
                 denmaxinv=denmaxinv[jj],
                 freeh2o=freeh2o[jj],
@@ -874,7 +860,7 @@ class PRMSSnow(ConservativeProcess):
                     scrv[jj],
                     snowcov_area[jj],
                     snowcov_areasv[jj],
-                ) = calc_snowcov(
+                ) = _calc_snowcov(
                     ai=ai[jj],
                     frac_swe=frac_swe[jj],
                     hru_deplcrv=hru_deplcrv[jj],
@@ -884,7 +870,6 @@ class PRMSSnow(ConservativeProcess):
                     pksv=pksv[jj],
                     pkwater_equiv=pkwater_equiv[jj],
                     pst=pst[jj],
-                    calc_sca_deplcrv=calc_sca_deplcrv,
                     scrv=scrv[jj],
                     snarea_curve=snarea_curve_2d[hru_deplcrv[jj] - 1, :],
                     snarea_thresh=snarea_thresh[jj],
@@ -905,7 +890,7 @@ class PRMSSnow(ConservativeProcess):
                     salb[jj],
                     slst[jj],
                     snsv[jj],
-                ) = calc_snalbedo(
+                ) = _calc_snalbedo(
                     acum_init=acum_init,
                     albedo=albedo[jj],
                     albset_rna=albset_rna,
@@ -949,11 +934,8 @@ class PRMSSnow(ConservativeProcess):
                     pss[jj],
                     tcal[jj],
                     snowmelt[jj],
-                ) = calc_step_4(
+                ) = _calc_step_4(
                     trd[jj],
-                    calc_calin=calc_calin,
-                    calc_caloss=calc_caloss,
-                    calc_snowbal=calc_snowbal,
                     canopy_covden=canopy_covden[jj],
                     albedo=albedo[jj],
                     cecn_coef=cecn_coef[current_month - 1, jj],
@@ -1011,7 +993,7 @@ class PRMSSnow(ConservativeProcess):
                             pk_temp[jj],
                             pkwater_equiv[jj],
                             snow_evap[jj],
-                        ) = calc_snowevap(
+                        ) = _calc_snowevap(
                             freeh2o=freeh2o[jj],
                             hru_intcpevap=hru_intcpevap[jj],
                             pk_def=pk_def[jj],
@@ -1202,8 +1184,6 @@ class PRMSSnow(ConservativeProcess):
 
     @staticmethod
     def _calc_ppt_to_pack(
-        calc_calin,
-        calc_caloss,
         den_max,
         denmaxinv,
         freeh2o,
@@ -1419,7 +1399,7 @@ class PRMSSnow(ConservativeProcess):
                             pst,
                             snowmelt,
                             pkwater_equiv,
-                        ) = calc_calin(
+                        ) = _calc_calin(
                             cal=calpr,
                             den_max=den_max,
                             denmaxinv=denmaxinv,
@@ -1464,7 +1444,7 @@ class PRMSSnow(ConservativeProcess):
                         pst,
                         snowmelt,
                         pkwater_equiv,
-                    ) = calc_calin(
+                    ) = _calc_calin(
                         cal=calpr,
                         den_max=den_max,
                         denmaxinv=denmaxinv,
@@ -1539,7 +1519,7 @@ class PRMSSnow(ConservativeProcess):
                         pk_ice,
                         pk_temp,
                         pkwater_equiv,
-                    ) = calc_caloss(
+                    ) = _calc_caloss(
                         cal=calps,
                         freeh2o=freeh2o,
                         pk_def=pk_def,
@@ -1850,7 +1830,6 @@ class PRMSSnow(ConservativeProcess):
     @staticmethod
     def _calc_snowcov(
         ai,
-        calc_sca_deplcrv,
         frac_swe,
         hru_deplcrv,
         iasw,
@@ -2113,7 +2092,7 @@ class PRMSSnow(ConservativeProcess):
             # JLM: better to just call this explicitly above, with each regime
             #      and make a case for no new snow and not interpolating?
             #      could also make this a function...
-            snowcov_area = calc_sca_deplcrv(snarea_curve, frac_swe)
+            snowcov_area = _calc_sca_deplcrv(snarea_curve, frac_swe)
 
         # <
         return (
@@ -2435,9 +2414,6 @@ class PRMSSnow(ConservativeProcess):
     @staticmethod
     def _calc_step_4(
         trd,
-        calc_calin,
-        calc_caloss,
-        calc_snowbal,
         canopy_covden,
         albedo,
         cecn_coef,  # control.current_month
@@ -2616,7 +2592,7 @@ class PRMSSnow(ConservativeProcess):
                 pst,
                 snowmelt,
                 pkwater_equiv,
-            ) = calc_snowbal(
+            ) = _calc_snowbal(
                 niteda=niteda,
                 cec=cec,
                 cst=cst,
@@ -2624,8 +2600,6 @@ class PRMSSnow(ConservativeProcess):
                 sw=sw,
                 temp=temp,
                 trd=trd,
-                calc_calin=calc_calin,
-                calc_caloss=calc_caloss,
                 canopy_covden=canopy_covden,
                 den_max=den_max,
                 denmaxinv=denmaxinv,
@@ -2677,7 +2651,7 @@ class PRMSSnow(ConservativeProcess):
                 pst,
                 snowmelt,
                 pkwater_equiv,
-            ) = calc_snowbal(
+            ) = _calc_snowbal(
                 niteda=niteda,
                 cec=cec,
                 cst=cst,
@@ -2685,8 +2659,6 @@ class PRMSSnow(ConservativeProcess):
                 sw=sw,
                 temp=temp,
                 trd=trd,
-                calc_calin=calc_calin,
-                calc_caloss=calc_caloss,
                 canopy_covden=canopy_covden,
                 den_max=den_max,
                 denmaxinv=denmaxinv,
@@ -2739,8 +2711,6 @@ class PRMSSnow(ConservativeProcess):
         sw,
         temp,
         trd,
-        calc_calin,
-        calc_caloss,
         canopy_covden,
         den_max,
         denmaxinv,
@@ -2881,7 +2851,7 @@ class PRMSSnow(ConservativeProcess):
                 pst,
                 snowmelt,
                 pkwater_equiv,
-            ) = calc_calin(
+            ) = _calc_calin(
                 cal=cal,
                 den_max=den_max,
                 denmaxinv=denmaxinv,
@@ -2960,7 +2930,7 @@ class PRMSSnow(ConservativeProcess):
                     pk_ice,
                     pk_temp,
                     pkwater_equiv,
-                ) = calc_caloss(
+                ) = _calc_caloss(
                     cal=qcond,
                     freeh2o=freeh2o,
                     pk_def=pk_def,
@@ -2999,7 +2969,7 @@ class PRMSSnow(ConservativeProcess):
                         pst,
                         snowmelt,
                         pkwater_equiv,
-                    ) = calc_calin(
+                    ) = _calc_calin(
                         cal=cal,
                         den_max=den_max,
                         denmaxinv=denmaxinv,
@@ -3260,3 +3230,16 @@ class PRMSSnow(ConservativeProcess):
             ai,
             frac_swe,
         )
+
+
+# The kernel and helpers call the helpers by their global names, so that the
+# jitted kernel can be cached on disk (see njit_functions).
+_calc_calin = PRMSSnow._calc_calin
+_calc_caloss = PRMSSnow._calc_caloss
+_calc_ppt_to_pack = PRMSSnow._calc_ppt_to_pack
+_calc_sca_deplcrv = PRMSSnow._calc_sca_deplcrv
+_calc_snalbedo = PRMSSnow._calc_snalbedo
+_calc_snowbal = PRMSSnow._calc_snowbal
+_calc_snowcov = PRMSSnow._calc_snowcov
+_calc_snowevap = PRMSSnow._calc_snowevap
+_calc_step_4 = PRMSSnow._calc_step_4
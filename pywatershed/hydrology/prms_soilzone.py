@@ -18,6 +18,7 @@ from ..constants import (
     zero,
 )
 from ..parameters import Parameters
+from ..utils.numba_utils import bind_functions, njit_functions
 
 ONETHIRD = 1 / 3
 TWOTHIRDS = 2 / 3
@@ -312,8 +313,9 @@ class PRMSSoilzone(ConservativeProcess):
 
         # variables
         if True:
-            # For now there is no restart capability. we'll use the following
-            # line when there is
+            # Restarts set the state after initialization, see
+            # Model.load_checkpoint. For PRMS restart files we'd use the
+            # following line
             # if self.control.options["restart"] in [0, 2, 5]:
 
             # these are set in sm_climateflow
@@ -336,8 +338,9 @@ class PRMSSoilzone(ConservativeProcess):
 
         # ssres_stor
         if True:
-            # For now there is no restart capability. we'll use the following
-            # line when there is
+            # Restarts set the state after initialization, see
+            # Model.load_checkpoint. For PRMS restart files we'd use the
+            # following line
             # if self.control.options["restart"] in [0, 2, 5]:
 
             self.ssres_stor = self.ssstor_init_frac * self._sat_threshold
@@ -487,8 +490,9 @@ class PRMSSoilzone(ConservativeProcess):
 
         # can this one be combined with the restart read logic above?
         if True:
-            # For now there is no restart capability. we'll use the following
-            # line when there is
+            # Restarts set the state after initialization, see
+            # Model.load_checkpoint. For PRMS restart files we'd use the
+            # following line
             # if self.control.options["restart"] in [0, 2, 5]:
 
             wh_land_or_swale = np.where(
@@ -547,9 +551,15 @@ class PRMSSoilzone(ConservativeProcess):
             warn(msg, UserWarning)
             self._calc_method = "numba"
 
-        if self._calc_method.lower() == "numba":
-            import numba as nb
+        # the kernel calls the helpers by their global names
+        fns = [
+            "_compute_gwflow",
+            "_compute_interflow",
+            "_compute_soilmoist",
+            "_compute_szactet",
+        ]
 
+        if self._calc_method.lower() == "numba":
             numba_msg = f"{self.name} jit compiling with numba "
             nb_parallel = (numba_num_threads is not None) and (
                 numba_num_threads > 1
@@ -558,23 +568,23 @@ class PRMSSoilzone(ConservativeProcess):
                 numba_msg += f"and using {numba_num_threads} threads"
             print(numba_msg, flush=True)
 
-            self._calculate_soilzone = nb.njit(
-                fastmath=True, parallel=nb_parallel
-            )(self._calculate_numpy)
-
-            self._compute_gwflow = nb.njit(fastmath=True)(self._compute_gwflow)
-            self._compute_interflow = nb.njit(fastmath=True)(
-                self._compute_interflow
-            )
-            self._compute_soilmoist = nb.njit(fastmath=True)(
-                self._compute_soilmoist
-            )
-            self._compute_szactet = nb.njit(fastmath=True)(
-                self._compute_szactet
+            functions = {
+                fn: (getattr(self, fn), {"fastmath": True}) for fn in fns
+            }
+            functions["_calculate_numpy"] = (
+                self._calculate_numpy,
+                {"fastmath": True, "parallel": nb_parallel},
             )
+            self._calculate_soilzone = njit_functions(functions)[
+                "_calculate_numpy"
+            ]
 
         else:
-            self._calculate_soilzone = self._calculate_numpy
+            functions = {fn: (getattr(self, fn), {}) for fn in fns}
+            functions["_calculate_numpy"] = (self._calculate_numpy, {})
+            self._calculate_soilzone = bind_functions(functions)[
+                "_calculate_numpy"
+            ]
 
         return
 
@@ -628,10 +638,6 @@ class PRMSSoilzone(ConservativeProcess):
             _soil2gw_flag=self._soil2gw_flag,
             cap_infil_tot=self.cap_infil_tot,
             cap_waterin=self.cap_waterin,
-            compute_gwflow=self._compute_gwflow,
-            compute_interflow=self._compute_interflow,
-            compute_soilmoist=self._compute_soilmoist,
-            compute_szactet=self._compute_szactet,
             cov_type=self.cov_type,
             current_time=self.control.current_time,
             dprst_evap_hru=self.dprst_evap_hru,
@@ -715,10 +721,6 @@ class PRMSSoilzone(ConservativeProcess):
         _soil2gw_flag,
         cap_infil_tot,
         cap_waterin,
-        compute_gwflow,
-        compute_interflow,
-        compute_soilmoist,
-        compute_szactet,
         cov_type,
         current_time,
         dprst_evap_hru,
@@ -905,7 +907,7 @@ class PRMSSoilzone(ConservativeProcess):
                     soil_rechr[hh],
                     soil_to_gw[hh],
                     soil_to_ssr[hh],
-                ) = compute_soilmoist(
+                ) = _compute_soilmoist(
                     _soil2gw_flag[hh],
                     hru_frac_perv[hh],
                     soil_moist_max[hh],
@@ -980,7 +982,7 @@ class PRMSSoilzone(ConservativeProcess):
                     (
                         slow_stor[hh],
                         slow_flow[hh],
-                    ) = compute_interflow(
+                    ) = _compute_interflow(
                         slowcoef_lin[hh],
                         slowcoef_sq[hh],
                         ssresin,
@@ -997,7 +999,7 @@ class PRMSSoilzone(ConservativeProcess):
                 (
                     ssr_to_gw[hh],
                     slow_stor[hh],
-                ) = compute_gwflow(
+                ) = _compute_gwflow(
                     ssr2gw_rate[hh],
                     ssr2gw_exp[hh],
                     slow_stor[hh],
@@ -1029,7 +1031,7 @@ class PRMSSoilzone(ConservativeProcess):
                     (
                         pref_flow_stor[hh],
                         prefflow,
-                    ) = compute_interflow(
+                    ) = _compute_interflow(
                         fastcoef_lin[hh],
                         fastcoef_sq[hh],
                         pref_flow_in[hh],
@@ -1053,7 +1055,7 @@ class PRMSSoilzone(ConservativeProcess):
                     potet_rechr[hh],
                     potet_lower[hh],
                     perv_actet[hh],
-                ) = compute_szactet(
+                ) = _compute_szactet(
                     transp_on[hh],
                     cov_type[hh],
                     soil_type[hh],
@@ -1454,3 +1456,11 @@ class PRMSSoilzone(ConservativeProcess):
             potet_lower,
             et,  # -> perv_actet
         )
+
+
+# The kernel calls the helpers by their global names, so that the jitted
+# kernel can be cached on disk (see njit_functions).
+_compute_gwflow = PRMSSoilzone._compute_gwflow
+_compute_interflow = PRMSSoilzone._compute_interflow
+_compute_soilmoist = PRMSSoilzone._compute_soilmoist
+_compute_szactet = PRMSSoilzone._compute_szactet
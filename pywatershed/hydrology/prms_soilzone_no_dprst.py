@@ -271,10 +271,6 @@ class PRMSSoilzoneNoDprst(PRMSSoilzone):
             _soil2gw_flag=self._soil2gw_flag,
             cap_infil_tot=self.cap_infil_tot,
             cap_waterin=self.cap_waterin,
-            compute_gwflow=self._compute_gwflow,
-            compute_interflow=self._compute_interflow,
-            compute_soilmoist=self._compute_soilmoist,
-            compute_szactet=self._compute_szactet,
             cov_type=self.cov_type,
             current_time=self.control.current_time,
             dprst_evap_hru=zero_array.copy(),
@@ -4,10 +4,7 @@ import urllib
 from typing import Union
 from warnings import warn
 
-import geopandas as gpd
 import numpy as np
-import pandas as pd
-import xarray as xr
 
 from ..base.data_model import DatasetDict
 from ..base.parameters import Parameters
@@ -243,6 +240,8 @@ class StarfitParameters(Parameters):
 
         """  # noqa: E501
 
+        import xarray as xr
+
         grand_ds = _get_grand(grand_file)
         istarf_ds = _get_istarf_conus(istarf_file, files_directory)
 
@@ -290,6 +289,8 @@ class StarfitParameters(Parameters):
 
 
 def _get_grand(grand_file):
+    import geopandas as gpd
+
     if grand_file is None:
         msg = (
             "You must acquire the GRanD file manually at\n"
@@ -312,6 +313,8 @@ def _get_grand(grand_file):
 
 
 def _get_istarf_conus(istarf_file, files_directory):
+    import pandas as pd
+
     files_directory_in = files_directory
     istarf_file_in = istarf_file
 
@@ -1,7 +1,15 @@
-from .cbh_utils import cbh_file_to_netcdf
 from .control import ControlVariables, compare_control_files
-from .csv_utils import CsvFile
-from .netcdf_utils import NetCdfRead, NetCdfWrite
+from .netcdf_utils import (
+    BackgroundWriter,
+    NetCdfRead,
+    NetCdfWrite,
+    OutputWrite,
+    background_writer,
+    output_layout,
+    plan_time_batches,
+)
+from .numba_utils import get_numba_cache_dir, set_numba_cache_dir
+from .output_backends import get_output_backend, register_output_backend
 from .prms5_file_util import PrmsFile
 from .prms5util import (
     Soltab,
@@ -9,24 +17,72 @@ from .prms5util import (
     load_prms_statscsv,
     load_wbl_output,
 )
-from .separate_nhm_params import separate_domain_params_dis_to_ncdf
+from .profiling import PhaseTimers
 from .utils import timer
 
 from .optional_import import import_optional_dependency  # isort:skip
 
 __all__ = (
+    "BackgroundWriter",
+    "background_writer",
     "cbh_file_to_netcdf",
     "ControlVariables",
     "compare_control_files",
     "CsvFile",
     "NetCdfRead",
     "NetCdfWrite",
+    "OutputWrite",
+    "output_layout",
+    "get_numba_cache_dir",
+    "get_output_backend",
+    "set_numba_cache_dir",
     "PrmsFile",
+    "PhaseTimers",
+    "register_output_backend",
+    "plan_time_batches",
     "Soltab",
     "load_prms_output",
     "load_prms_statscsv",
     "load_wbl_output",
     "separate_domain_params_dis_to_ncdf",
     "timer",
+    "ZarrWrite",
     "import_optional_dependency",
 )
+
+# Attributes requiring pandas or xarray are imported on first access
+_lazy_imports = {
+    "cbh_file_to_netcdf": ".cbh_utils",
+    "CsvFile": ".csv_utils",
+    "separate_domain_params_dis_to_ncdf": ".separate_nhm_params",
+    "ZarrWrite": ".zarr_utils",
+}
+_lazy_submodules = (
+    "cbh_utils",
+    "csv_utils",
+    "mmr_to_mf6_dfw",
+    "mmr_to_mf6_mmr",
+    "separate_nhm_params",
+    "zarr_utils",
+)
+
+
+def __getattr__(name: str):
+    if name in _lazy_imports.keys():
+        import importlib
+
+        module = importlib.import_module(_lazy_imports[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+
+    if name in _lazy_submodules:
+        import importlib
+
+        return importlib.import_module(f".{name}", __name__)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals().keys()).union(__all__))
@@ -1,22 +1,34 @@
 import datetime as dt
 import pathlib as pl
-from math import ceil
-from typing import Union
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from math import ceil, prod
+from typing import TYPE_CHECKING, Union
+from warnings import warn
 
 import netCDF4 as nc4
 import numpy as np
-import xarray as xr
 
 from ..base.accessor import Accessor
 from ..base.meta import meta_dimensions, meta_netcdf_type
 from ..constants import np_type_to_netcdf_type_dict
 from ..utils.time_utils import datetime_doy
 
+if TYPE_CHECKING:
+    import xarray as xr
+
 fileish = Union[str, pl.Path]
 listish = Union[list, tuple]
 arrayish = Union[list, tuple, np.ndarray]
 ATOL = np.finfo(np.float32).eps
 
+# The netCDF/HDF5 libraries are not thread safe and netCDF4 releases the GIL,
+# reads and writes done in background threads (and in the main thread while
+# they run) are serialized with this lock.
+_nc_lock = threading.RLock()
+
 # JLM TODO: the implied time dimension seems like a bad idea, it should be
 #    an argument.
 
@@ -42,6 +54,15 @@ class NetCdfRead(Accessor):
         _load_n_time_batches are None, then no time batching is used. This has
         proven an inefficient pattern. The time batching is not implemented for
         DOY (cyclic) variables, only for variables with time dimension "time".
+      prefetch_n_batches: optional integer for the number of time batches to
+        read ahead of the current batch in a background thread. Default is 0,
+        all reads happen on demand in the calling thread. With a positive
+        value, the next batches are read from the file while the current
+        batch is being consumed, so the caller does not wait on the file at
+        batch boundaries. Memory use is bounded by prefetch_n_batches + 1
+        batches per variable. Only applies when time batching is used. Reads
+        and writes of netCDF files from all threads are serialized with a
+        lock, as the netCDF library is not thread safe.
     """
 
     def __init__(
@@ -52,6 +73,7 @@ class NetCdfRead(Accessor):
         nc_read_vars: list = None,
         load_n_times: int = None,
         load_n_time_batches: int = 1,
+        prefetch_n_batches: int = 0,
     ) -> "NetCdfRead":
         self.name = "NetCdfRead"
         self._nc_file = name
@@ -59,6 +81,16 @@ class NetCdfRead(Accessor):
         self._start_time = start_time
         self._end_time = end_time
 
+        if prefetch_n_batches is None:
+            prefetch_n_batches = 0
+        if prefetch_n_batches < 0:
+            msg = "prefetch_n_batches must be non-negative"
+            raise ValueError(msg)
+        self._prefetch_n_batches = prefetch_n_batches
+        self._lock = _nc_lock
+        self._executor = None
+        self._prefetched = {}
+
         if (load_n_times is not None) and (load_n_time_batches is not None):
             msg = "Can only specify one of load_n_times or load_ntime_batches"
             raise ValueError(msg)
@@ -75,7 +107,11 @@ class NetCdfRead(Accessor):
         self.close()
 
     def close(self):
-        if self.dataset.isopen():
+        if getattr(self, "_executor", None) is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self._prefetched = {}
+        if hasattr(self, "dataset") and self.dataset.isopen():
             self.dataset.close()
 
     def _open_nc_file(self):
@@ -119,7 +155,11 @@ class NetCdfRead(Accessor):
                 self._load_n_times = ceil(
                     self._ntimes / self._load_n_time_batches
                 )
+                self._load_time_batches = ceil(
+                    self._ntimes / self._load_n_times
+                )
                 self._data_loaded = {}
+                self._batch_loaded = {}
 
             elif self._load_n_times is not None:
                 # Use ceil to account for the remainder batch
@@ -129,6 +169,7 @@ class NetCdfRead(Accessor):
                     self._ntimes / self._load_n_times
                 )
                 self._data_loaded = {}
+                self._batch_loaded = {}
 
             # Note that if neither _load variables is specified, then no time
             # batching is used
@@ -288,9 +329,10 @@ class NetCdfRead(Accessor):
             )
 
         if itime_step is None:
-            return self.dataset[variable][
-                self._start_index : (self._end_index + 1), :
-            ]
+            with self._lock:
+                return self.dataset[variable][
+                    self._start_index : (self._end_index + 1), :
+                ]
 
         else:
             if itime_step >= self._ntimes:
@@ -300,28 +342,91 @@ class NetCdfRead(Accessor):
                 )
 
             if hasattr(self, "_data_loaded"):
-                # load when needed, at the beginning of each batch
+                # load when needed, at the beginning of each batch or when
+                # starting mid-batch (e.g. a restart)
                 batch_index = itime_step % self._load_n_times
-                if batch_index == 0:
-                    ith_batch = itime_step // self._load_n_times
+                ith_batch = itime_step // self._load_n_times
+                if self._batch_loaded.get(variable) != ith_batch:
                     # print(
                     #     f"load batch "
                     #     f"#{ith_batch}/{self._load_n_time_batches-1}: "
                     #     f"{variable}"
                     # )
-                    start_ind = self._start_index + (
-                        ith_batch * self._load_n_times
+                    self._data_loaded[variable] = self._load_batch(
+                        variable, ith_batch
                     )
-                    end_ind = start_ind + self._load_n_times
-                    self._data_loaded[variable] = self.dataset[variable][
-                        start_ind:end_ind, :
-                    ]
+                    self._batch_loaded[variable] = ith_batch
+                    if self._prefetch_n_batches > 0:
+                        self._prefetch(variable, ith_batch)
 
                 return self._data_loaded[variable][batch_index, :]
 
             else:
                 # no time batching
-                return self.dataset[variable][itime_step, :]
+                with self._lock:
+                    return self.dataset[variable][itime_step, :]
+
+    def get_time_window(
+        self, variable: str, start: int, stop: int
+    ) -> np.ndarray:
+        """Get the data of a variable for a window of time steps.
+
+        Args:
+            variable: variable name
+            start: the first time step of the window
+            stop: the time step after the last of the window
+
+        Returns:
+            The masked array of the data with time as the first dimension.
+        """
+        if variable not in self._nc_read_vars:
+            raise ValueError(
+                f"'{variable}' not in list of available variables"
+            )
+        stop = min(stop, self._ntimes)
+        with self._lock:
+            return self.dataset[variable][
+                self._start_index + start : self._start_index + stop, :
+            ]
+
+    def _read_batch(self, variable: str, ith_batch: int) -> np.ndarray:
+        start_ind = self._start_index + (ith_batch * self._load_n_times)
+        end_ind = start_ind + self._load_n_times
+        with self._lock:
+            return self.dataset[variable][start_ind:end_ind, :]
+
+    def _load_batch(self, variable: str, ith_batch: int) -> np.ndarray:
+        # take the batch from the background reads if it was requested,
+        # otherwise read it now
+        future = self._prefetched.get(variable, {}).pop(ith_batch, None)
+        if future is not None:
+            return future.result()
+        return self._read_batch(variable, ith_batch)
+
+    def _prefetch(self, variable: str, ith_batch: int) -> None:
+        # keep the prefetch_n_batches batches after ith_batch in flight
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"{self.name}_prefetch"
+            )
+        wanted = range(
+            ith_batch + 1,
+            min(
+                ith_batch + 1 + self._prefetch_n_batches,
+                self._load_time_batches,
+            ),
+        )
+        in_flight = self._prefetched.setdefault(variable, {})
+        # drop batches no longer wanted, e.g. after a seek
+        for batch in list(in_flight.keys()):
+            if batch not in wanted:
+                in_flight.pop(batch).cancel()
+        for batch in wanted:
+            if batch not in in_flight.keys():
+                in_flight[batch] = self._executor.submit(
+                    self._read_batch, variable, batch
+                )
+        return
 
     def advance(
         self, variable: str, current_time: np.datetime64 = None
@@ -353,7 +458,706 @@ class NetCdfRead(Accessor):
         return arr
 
 
-class NetCdfWrite(Accessor):
+def plan_time_batches(
+    files: dict,
+    memory_budget: int,
+    n_times: int,
+    prefetch_n_batches: int = 0,
+) -> dict:
+    """Size the time batches of input files to fit a memory budget.
+
+    All the files are read concurrently as a model advances, so each gets
+    the same number of times per batch: the largest number for which the
+    batches of all the files fit the budget together. Each file holds its
+    current batch plus prefetch_n_batches read ahead (see NetCdfRead).
+    Files without a "time" dimension (e.g. DOY variables) are not batched
+    and not in the plan.
+
+    Args:
+        files: A dictionary of {variable name: netcdf file}, where the file
+            contains the variable.
+        memory_budget: The number of bytes the batches of all the files may
+            occupy.
+        n_times: The number of times to be read from each file.
+        prefetch_n_batches: The number of batches read ahead per file.
+
+    Returns:
+        A dictionary {variable name: {"load_n_times": , "n_batches": ,
+        "batch_bytes": }} where batch_bytes is the size of one batch.
+    """
+    if memory_budget <= 0:
+        raise ValueError("memory_budget must be positive")
+
+    bytes_per_time = {}
+    for name, file in files.items():
+        with nc4.Dataset(file, "r") as ds:
+            var = ds.variables[name]
+            if "time" not in var.dimensions:
+                continue
+            shape = [
+                size
+                for dim, size in zip(var.dimensions, var.shape)
+                if dim != "time"
+            ]
+            bytes_per_time[name] = prod(shape) * var.dtype.itemsize
+
+    total_bytes_per_time = sum(bytes_per_time.values()) * (
+        1 + prefetch_n_batches
+    )
+    if total_bytes_per_time == 0:
+        return {}
+
+    load_n_times = min(n_times, memory_budget // total_bytes_per_time)
+    if load_n_times < 1:
+        msg = (
+            f"memory_budget of {memory_budget} bytes is less than a single "
+            f"time of the inputs ({total_bytes_per_time} bytes), using 1"
+        )
+        warn(msg)
+        load_n_times = 1
+
+    n_batches = ceil(n_times / load_n_times)
+    return {
+        name: {
+            "load_n_times": load_n_times,
+            "n_batches": n_batches,
+            "batch_bytes": load_n_times * nbytes,
+        }
+        for name, nbytes in bytes_per_time.items()
+    }
+
+
+class BackgroundWriter:
+    """A thread writing NetCdfWrite data handed to it through a queue.
+
+    Writes submitted by NetCdfWrite objects are executed in order by a single
+    daemon thread, so the caller does not wait while HDF5 compresses and
+    writes. The queue is bounded: when max_queued writes are pending, submit
+    blocks until the thread catches up, which bounds the memory used by
+    their data.
+
+    An exception raised by a write is tied to the object writing (the owner
+    of the bound method submitted, e.g. a NetCdfWrite), whose later writes
+    are skipped so its file is not written with holes, while the writes of
+    other files continue. The error is sticky: every following submit() for
+    the failed owner raises it until it is reported by drain() or close(),
+    which raise the errors of the owner given or of all owners. Calls
+    submitted with always=True (e.g. closing the file) run regardless.
+
+    Since the netCDF library is not thread safe, a single writer for all the
+    files in a python process is appropriate, see background_writer().
+
+    Args:
+        max_queued: The maximum number of pending writes.
+    """
+
+    def __init__(self, max_queued: int = 256):
+        self._queue = queue.Queue(maxsize=max_queued)
+        # {id(owner): (owner, exception)}
+        self._errors = {}
+        self._thread = threading.Thread(
+            target=self._work, name="NetCdfBackgroundWriter", daemon=True
+        )
+        self._thread.start()
+        return
+
+    @property
+    def max_queued(self) -> int:
+        """The maximum number of pending writes."""
+        return self._queue.maxsize
+
+    @max_queued.setter
+    def max_queued(self, value: int) -> None:
+        with self._queue.mutex:
+            self._queue.maxsize = value
+            self._queue.not_full.notify_all()
+        return
+
+    @staticmethod
+    def _owner(func):
+        return getattr(func, "__self__", None)
+
+    def _work(self) -> None:
+        while True:
+            func, args, always = self._queue.get()
+            try:
+                if func is None:
+                    return
+                key = id(self._owner(func))
+                if always or key not in self._errors.keys():
+                    with _nc_lock:
+                        func(*args)
+            except Exception as error:
+                if key not in self._errors.keys():
+                    self._errors[key] = (self._owner(func), error)
+            finally:
+                self._queue.task_done()
+
+    def _raise(self, owner=None, clear: bool = True) -> None:
+        if owner is None:
+            keys = list(self._errors.keys())
+        else:
+            keys = [key for key in [id(owner)] if key in self._errors.keys()]
+        if not len(keys):
+            return
+
+        failed = [self._errors[key] for key in keys]
+        if clear:
+            for key in keys:
+                del self._errors[key]
+        names = ", ".join(
+            str(getattr(failed_owner, "_store_name", failed_owner))
+            for failed_owner, _ in failed
+        )
+        msg = f"NetCDF background write failed for {names}"
+        raise RuntimeError(msg) from failed[0][1]
+
+    def submit(self, func, *args, always: bool = False) -> None:
+        """Queue a call func(*args), blocking while the queue is full.
+
+        Args:
+            func: The callable, a bound method of the owner writing.
+            args: The arguments of func.
+            always: Call func even when a write of its owner failed, and do
+                not raise that failure here.
+        """
+        if not always:
+            self._raise(self._owner(func), clear=False)
+        if not self._thread.is_alive():
+            raise RuntimeError("The BackgroundWriter is closed")
+        self._queue.put((func, args, always))
+        return
+
+    def drain(self, owner=None) -> None:
+        """Wait for all pending writes to complete and raise any failure.
+
+        Args:
+            owner: Only raise (and clear) the failure of this owner. None
+                raises the failures of all owners.
+        """
+        if self._thread.is_alive():
+            self._queue.join()
+        self._raise(owner)
+        return
+
+    def close(self) -> None:
+        """Drain the pending writes, stop the thread, and raise any
+        failure."""
+        if self._thread.is_alive():
+            self._queue.put((None, (), True))
+            self._thread.join()
+        self._raise()
+        return
+
+
+_background_writer = None
+
+
+def background_writer(max_queued: int = None) -> BackgroundWriter:
+    """The BackgroundWriter shared by the python process, started if needed.
+
+    Args:
+        max_queued: Optionally set the maximum number of pending writes.
+
+    Returns:
+        The BackgroundWriter.
+    """
+    global _background_writer
+    if _background_writer is None or not _background_writer._thread.is_alive():
+        _background_writer = BackgroundWriter()
+    if max_queued is not None:
+        _background_writer.max_queued = max_queued
+    return _background_writer
+
+
+def spatial_coordinate_name(dimensions: listish) -> str:
+    """The name of the spatial coordinate of output for a variable.
+
+    Args:
+        dimensions: the dimension names of the variable from its metadata.
+
+    Returns:
+        The coordinate name, e.g. "nhm_id" for variables on HRUs.
+    """
+    if len(set(["nhru", "ngw", "nssr"]).intersection(set(dimensions))):
+        return "nhm_id"
+    elif "nsegment" in dimensions:
+        return "nhm_seg"
+    elif "one" in dimensions:
+        return "one"
+    elif "nreservoirs" in dimensions:
+        return "grand_id"
+    elif "nnodes" in dimensions:
+        return "node_coord"
+    else:
+        msg = f"Undefined spatial coordinate name in {dimensions}"
+        raise ValueError(msg)
+
+
+# Named layouts of output variables, see output_layout(). A chunk size of 0
+# is the full length of the dimension.
+output_layout_profiles = {
+    # the layout of NetCdfWrite without a layout
+    "default": {
+        "chunk_sizes": {"time": 1, "space": 0},
+        "zlib": True,
+        "complevel": 4,
+        "shuffle": True,
+        "float32": False,
+        "least_significant_digit": None,
+    },
+    # one time step per chunk and no compression, cheapest to write
+    "write-optimized": {
+        "chunk_sizes": {"time": 1, "space": 0},
+        "zlib": False,
+        "complevel": 0,
+        "shuffle": False,
+        "float32": False,
+        "least_significant_digit": None,
+    },
+    # long and narrow chunks, reading the timeseries of a location reads
+    # few chunks
+    "timeseries-read-optimized": {
+        "chunk_sizes": {"time": 128, "space": 256},
+        "zlib": True,
+        "complevel": 4,
+        "shuffle": True,
+        "float32": False,
+        "least_significant_digit": None,
+    },
+}
+
+
+def output_layout(layout: Union[str, dict]) -> dict:
+    """Resolve the chunking and compression of output variables.
+
+    Args:
+        layout: the name of a profile in output_layout_profiles
+            ("default", "write-optimized", "timeseries-read-optimized") or
+            a dictionary of the keys of a profile overriding those of the
+            profile named by its optional key "profile" (default
+            "default"). The keys are:
+
+            * chunk_sizes: {"time": int, "space": int} the chunk sizes on
+              the time and spatial dimensions, 0 for the full dimension.
+            * zlib: bool to compress with zlib.
+            * complevel: the zlib compression level, 0-9.
+            * shuffle: bool to apply the HDF5 byte shuffle filter.
+            * float32: bool to store float64 variables as float32.
+            * least_significant_digit: the power of ten of the smallest
+              decimal place retained in floating point variables, which are
+              quantized (lossy) to improve their compression, or None.
+
+    Returns:
+        The complete layout dictionary.
+
+    Examples:
+    ---------
+
+    >>> from pywatershed.utils.netcdf_utils import output_layout
+    >>> layout = output_layout(
+    ...     {"profile": "write-optimized", "zlib": True, "complevel": 1}
+    ... )
+    >>> layout["chunk_sizes"], layout["zlib"], layout["complevel"]
+    ({'time': 1, 'space': 0}, True, 1)
+    """
+    if isinstance(layout, str):
+        layout = {"profile": layout}
+    layout = dict(layout)
+    profile = layout.pop("profile", "default")
+    if profile not in output_layout_profiles.keys():
+        msg = (
+            f"Output layout profile '{profile}' is not one of "
+            f"{list(output_layout_profiles.keys())}"
+        )
+        raise ValueError(msg)
+
+    result = dict(output_layout_profiles[profile])
+    bad_keys = set(layout.keys()).difference(result.keys())
+    if len(bad_keys):
+        msg = f"Unknown output layout keys: {sorted(bad_keys)}"
+        raise ValueError(msg)
+    result.update(layout)
+    result["chunk_sizes"] = {
+        **output_layout_profiles[profile]["chunk_sizes"],
+        **result["chunk_sizes"],
+    }
+    return result
+
+
+def spatial_subset_index(
+    coordinate: np.ndarray, selection: np.ndarray
+) -> np.ndarray:
+    """The indices of a spatial selection on a coordinate.
+
+    Args:
+        coordinate: the values (IDs) of the coordinate, e.g. nhm_seg.
+        selection: either a boolean mask with the length of the coordinate
+            or an array of coordinate values (IDs) to select.
+
+    Returns:
+        The sorted indices of the selection on the coordinate.
+    """
+    coordinate = np.atleast_1d(np.asarray(coordinate))
+    selection = np.atleast_1d(np.asarray(selection))
+    if selection.dtype == bool:
+        if selection.shape != coordinate.shape:
+            msg = (
+                f"Spatial selection mask of shape {selection.shape} does not "
+                f"match the coordinate shape {coordinate.shape}"
+            )
+            raise ValueError(msg)
+        index = np.nonzero(selection)[0]
+    else:
+        missing = np.setdiff1d(selection, coordinate)
+        if len(missing):
+            msg = f"Spatial selection IDs not in the coordinate: {missing}"
+            raise ValueError(msg)
+        index = np.nonzero(np.isin(coordinate, selection))[0]
+
+    if not len(index):
+        raise ValueError("Spatial selection selects no locations")
+    return index
+
+
+class OutputWrite(Accessor):
+    """Base class of output backends writing time steps of variables.
+
+    An output backend creates a store (file, directory) with variables
+    having a leading time dimension and writes the data of time steps to
+    them. The time step writes can be buffered and written as blocks and
+    can be handed to a BackgroundWriter, see NetCdfWrite for the arguments.
+
+    Subclasses create, on __init__, the dictionary self.variables of
+    {name: array} and the time coordinate array self.time, where the arrays
+    support numpy-style slice assignment, shape and dtype, then call
+    self._init_write(name, buffer_n_times, writer). They implement _is_open,
+    _close_store, _is_time_variable, _time_chunk_size, and _encode_time.
+    Subclasses supporting a spatial_subset pass their coordinates and
+    extra_coords through _init_spatial_subset before creating the store.
+    """
+
+    # reads and writes of the store are done with this lock held
+    _lock = nullcontext()
+
+    def _init_write(
+        self, name: fileish, buffer_n_times: int, writer: "BackgroundWriter"
+    ) -> None:
+        self._store_name = str(name)
+        if not hasattr(self, "_spatial_index"):
+            self._spatial_index = {}
+        self._init_buffers(buffer_n_times)
+        self._writer = writer
+        return
+
+    def _init_spatial_subset(
+        self,
+        coordinates: dict,
+        extra_coords: dict,
+        variables: listish,
+        var_meta: dict,
+        spatial_subset: dict,
+    ) -> tuple[dict, dict]:
+        # Subset the coordinates and extra coordinates and find the indices
+        # of the data of each variable to write, {var_name: indices}.
+        self._spatial_index = {}
+        if spatial_subset is None or not len(spatial_subset):
+            return coordinates, extra_coords
+
+        indices = {}
+        for coord_name, selection in spatial_subset.items():
+            if coord_name not in coordinates.keys():
+                msg = f"spatial_subset coordinate '{coord_name}' not found"
+                raise ValueError(msg)
+            indices[coord_name] = spatial_subset_index(
+                coordinates[coord_name], selection
+            )
+
+        coordinates = {
+            name: (
+                np.asarray(values)[indices[name]]
+                if name in indices.keys()
+                else values
+            )
+            for name, values in coordinates.items()
+        }
+        if extra_coords is not None:
+            extra_coords = {
+                x_dim: {
+                    x_var_name: (
+                        np.asarray(x_data)[indices[x_dim]]
+                        if x_dim in indices.keys()
+                        else x_data
+                    )
+                    for x_var_name, x_data in x_data_dict.items()
+                }
+                for x_dim, x_data_dict in extra_coords.items()
+            }
+
+        for var_name in variables:
+            coord_name = spatial_coordinate_name(
+                meta_dimensions(var_meta[var_name])
+            )
+            if coord_name in indices.keys():
+                self._spatial_index[var_name] = indices[coord_name]
+
+        return coordinates, extra_coords
+
+    def _is_open(self) -> bool:
+        raise NotImplementedError("Must be overridden")
+
+    def _close_store(self) -> None:
+        raise NotImplementedError("Must be overridden")
+
+    @staticmethod
+    def _is_time_variable(var) -> bool:
+        raise NotImplementedError("Must be overridden")
+
+    @staticmethod
+    def _time_chunk_size(var) -> int:
+        raise NotImplementedError("Must be overridden")
+
+    def _encode_time(self, simulation_time: dt.datetime) -> float:
+        raise NotImplementedError("Must be overridden")
+
+    def _write_block(self, var, start: int, block: np.ndarray) -> None:
+        var[start : start + block.shape[0], ...] = block
+        return
+
+    def _write_time_step(self, var, itime_step: int, current) -> None:
+        var[itime_step, ...] = current
+        return
+
+    def __del__(self):
+        self.close()
+        return
+
+    def close(self):
+        if not hasattr(self, "_buffers"):
+            # __init__ did not complete
+            return
+        if self._writer is not None and self._is_open():
+            # close even after a failed write, then raise the failure
+            self._writer.submit(self._close, always=True)
+            self._writer.drain(self)
+            return
+        with self._lock:
+            self._close()
+        return
+
+    def _close(self):
+        if self._is_open():
+            self._flush()
+            self._close_store()
+        return
+
+    def _init_buffers(self, buffer_n_times: int) -> None:
+        if buffer_n_times < 1:
+            raise ValueError("buffer_n_times must be at least 1")
+
+        self._buffer_n_times = buffer_n_times
+        # {name: [variable, block array, first time step, n times]}
+        self._buffers = {}
+        if buffer_n_times == 1:
+            return
+
+        buffered = {
+            name: var
+            for name, var in self.variables.items()
+            if self._is_time_variable(var)
+        }
+        if not len(buffered):
+            return
+        buffered["time"] = self.time
+
+        # a multiple of the largest time chunk size
+        time_chunk = max(
+            self._time_chunk_size(var) for var in buffered.values()
+        )
+        self._buffer_n_times = ceil(buffer_n_times / time_chunk) * time_chunk
+        for name, var in buffered.items():
+            block = np.zeros(
+                (self._buffer_n_times, *var.shape[1:]), dtype=var.dtype
+            )
+            self._buffers[name] = [var, block, 0, 0]
+
+        return
+
+    def _add_buffered(
+        self, name: str, itime_step: int, current: np.ndarray
+    ) -> None:
+        buffer = self._buffers[name]
+        var, block, start, count = buffer
+        if count and itime_step != start + count:
+            # not contiguous with the block
+            self._flush_buffer(buffer)
+            count = 0
+        if count == 0:
+            buffer[2] = start = itime_step
+
+        block[count] = current
+        buffer[3] = count = count + 1
+        if (itime_step + 1) % self._buffer_n_times == 0:
+            self._flush_buffer(buffer)
+        return
+
+    def _flush_buffer(self, buffer: list) -> None:
+        var, block, start, count = buffer
+        if count:
+            self._write_block(var, start, block[:count])
+            buffer[3] = 0
+        return
+
+    def flush(self) -> None:
+        """Write any buffered time steps to the store."""
+        if self._writer is not None:
+            self._writer.submit(self._flush)
+            self._writer.drain(self)
+            return
+        with self._lock:
+            self._flush()
+        return
+
+    def _flush(self) -> None:
+        for buffer in self._buffers.values():
+            self._flush_buffer(buffer)
+        return
+
+    def add_simulation_time(self, itime_step: int, simulation_time: float):
+        if self._writer is not None:
+            self._writer.submit(
+                self._add_simulation_time, itime_step, simulation_time
+            )
+            return
+        with self._lock:
+            self._add_simulation_time(itime_step, simulation_time)
+        return
+
+    def _add_simulation_time(self, itime_step: int, simulation_time: float):
+        if "time" in self._buffers.keys():
+            self._add_buffered(
+                "time", itime_step, self._encode_time(simulation_time)
+            )
+            return
+        self._write_time_step(
+            self.time, itime_step, self._encode_time(simulation_time)
+        )
+        return
+
+    def add_data(
+        self, name: str, itime_step: int, current: np.ndarray
+    ) -> None:
+        """Add data for a time step to a variable
+
+        Args:
+            name:
+            itime_step:
+
+        Returns:
+
+        """
+        if name not in self.variables.keys():
+            raise KeyError(f"{name} not a valid variable name")
+        if name in self._spatial_index.keys():
+            # a copy of the selected locations
+            current = current[self._spatial_index[name]]
+        elif self._writer is not None:
+            # the caller may change current once this returns
+            current = np.array(current)
+        if self._writer is not None:
+            self._writer.submit(self._add_data, name, itime_step, current)
+            return
+        with self._lock:
+            self._add_data(name, itime_step, current)
+        return
+
+    def _add_data(
+        self, name: str, itime_step: int, current: np.ndarray
+    ) -> None:
+        if name in self._buffers.keys():
+            self._add_buffered(name, itime_step, current)
+            return
+        self._write_time_step(self.variables[name], itime_step, current)
+        return
+
+    def _submit(self, func, *args) -> None:
+        if self._writer is not None:
+            self._writer.submit(func, *args)
+            return
+        with self._lock:
+            func(*args)
+        return
+
+    def add_time_block(
+        self, start: int, time_data: np.ndarray, time_coord: str = "time"
+    ) -> None:
+        """Add the times of a block of contiguous time steps.
+
+        Args:
+            start: the time step of the first time of the block.
+            time_data: the np.datetime64 times or the days of year.
+            time_coord: "time" or "doy".
+        """
+        self._submit(self._add_time_block, start, time_data, time_coord)
+        return
+
+    def _add_time_block(
+        self, start: int, time_data: np.ndarray, time_coord: str
+    ) -> None:
+        if time_coord == "time":
+            self._write_block(
+                self.time,
+                start,
+                np.atleast_1d(
+                    self._encode_time(
+                        time_data.astype("datetime64[s]").astype(dt.datetime)
+                    )
+                ),
+            )
+        else:
+            self._write_block(self.doy, start, time_data)
+        return
+
+    def add_data_block(
+        self,
+        name: str,
+        start: int,
+        data: np.ndarray,
+        block_n_times: int = 64,
+    ) -> None:
+        """Add a block of contiguous time steps of a variable.
+
+        The block is written directly, not through the time step buffers,
+        in pieces of block_n_times rounded up to whole time chunks of the
+        variable so the temporary copies of a write (of a spatial subset or
+        of a conversion of type) are limited to a piece. With a
+        BackgroundWriter, the pieces are queued without copying data, so
+        data must not be changed until the writes complete, e.g. on flush().
+
+        Args:
+            name: the variable name.
+            start: the time step of the first time of the block.
+            data: the data of the block with time as the first dimension.
+            block_n_times: the number of time steps written at once.
+        """
+        if name not in self.variables.keys():
+            raise KeyError(f"{name} not a valid variable name")
+
+        var = self.variables[name]
+        n_times = data.shape[0]
+        time_chunk = self._time_chunk_size(var)
+        block_n_times = max(ceil(block_n_times / time_chunk), 1) * time_chunk
+        for block_start in range(0, n_times, block_n_times):
+            block = data[block_start : block_start + block_n_times]
+            if name in self._spatial_index.keys():
+                block = block[:, self._spatial_index[name]]
+            self._submit(self._write_block, var, start + block_start, block)
+        return
+
+
+class NetCdfWrite(OutputWrite):
+    _lock = _nc_lock
+
     def __init__(
         self,
         name: fileish,
@@ -367,6 +1171,10 @@ class NetCdfWrite(Accessor):
         zlib: bool = True,
         complevel: int = 4,
         chunk_sizes: dict = {"time": 1, "hruid": 0},
+        buffer_n_times: int = 1,
+        writer: BackgroundWriter = None,
+        spatial_subset: dict = None,
+        layout: Union[str, dict] = None,
     ):
         from netCDF4 import stringtochar
 
@@ -383,6 +1191,33 @@ class NetCdfWrite(Accessor):
                 (default is True)
             complevel: compression level (default is 4)
             chunk_sizes: dictionary defining chunk sizes for the data
+            buffer_n_times: the number of time steps of each variable to hold
+                in memory before writing them to the file as a single block,
+                the default of 1 writes every time step when it is added.
+                Larger values are rounded up to a multiple of the time chunk
+                size and the blocks are aligned to multiples of it, so that
+                each chunk is written (and compressed) once. Buffered data are
+                written by flush() and close().
+            writer: an optional BackgroundWriter to which the writes of
+                add_data and add_simulation_time are handed, with copies of
+                their data. flush() and close() wait for the writes of the
+                writer to complete.
+            spatial_subset: an optional dictionary selecting the locations
+                to write on spatial coordinates, {coordinate name:
+                selection}, e.g. {"nhm_seg": gauge_segment_ids}. A selection
+                is either an array of coordinate values (IDs) or a boolean
+                mask over the coordinate. Only the selected locations of the
+                variables on the coordinate are written, in the order of the
+                coordinate, and the coordinate and the extra_coords on its
+                dimension are subset to match. The data passed to add_data
+                and add_all_data remain on the full coordinate.
+            layout: an optional chunking and compression profile name,
+                "write-optimized" or "timeseries-read-optimized", or a
+                dictionary of explicit chunk sizes, shuffle, compression
+                level and float32 quantization, see output_layout(). When
+                supplied, it replaces zlib, complevel, and chunk_sizes. When
+                its time chunk size is larger than buffer_n_times, a chunk
+                of time steps is buffered so each chunk is written once.
         """
         if isinstance(variables, dict):
             group_variables = []
@@ -402,6 +1237,16 @@ class NetCdfWrite(Accessor):
         else:
             group_variables = variables
 
+        coordinates, extra_coords = self._init_spatial_subset(
+            coordinates, extra_coords, variables, var_meta, spatial_subset
+        )
+
+        if layout is not None:
+            layout = output_layout(layout)
+            zlib = layout["zlib"]
+            complevel = layout["complevel"]
+            buffer_n_times = max(buffer_n_times, layout["chunk_sizes"]["time"])
+
         self.dataset = nc4.Dataset(name, "w", clobber=clobber)
         self.dataset.setncattr("Description", "pywatershed output data")
 
@@ -575,26 +1420,9 @@ class NetCdfWrite(Accessor):
         self.variables = {}
         for var_name, group_var_name in zip(variables, group_variables):
             variabletype = meta_netcdf_type(var_meta[var_name])
-            if len(
-                set(["nhru", "ngw", "nssr"]).intersection(
-                    set(variable_dimensions[var_name])
-                )
-            ):
-                spatial_coordinate = "nhm_id"
-            elif "nsegment" in variable_dimensions[var_name]:
-                spatial_coordinate = "nhm_seg"
-            elif "one" in variable_dimensions[var_name]:
-                spatial_coordinate = "one"
-            elif "nreservoirs" in variable_dimensions[var_name]:
-                spatial_coordinate = "grand_id"
-            elif "nnodes" in variable_dimensions[var_name]:
-                spatial_coordinate = "node_coord"
-            else:
-                msg = (
-                    "Undefined spatial coordinate name in "
-                    f"{variable_dimensions[var_name]}"
-                )
-                raise ValueError(msg)
+            spatial_coordinate = spatial_coordinate_name(
+                variable_dimensions[var_name]
+            )
 
             if var_name in doy_time_vars:
                 time_dim = "doy"
@@ -602,6 +1430,12 @@ class NetCdfWrite(Accessor):
                 time_dim = "time"
 
             var_dims = (time_dim, spatial_coordinate)
+            var_layout = {"chunksizes": tuple(chunk_sizes.values())}
+            if layout is not None:
+                var_layout = self._variable_layout(
+                    layout, var_dims, variabletype
+                )
+                variabletype = var_layout.pop("datatype")
             self.variables[var_name] = self.dataset.createVariable(
                 group_var_name,
                 variabletype,
@@ -609,7 +1443,7 @@ class NetCdfWrite(Accessor):
                 fill_value=nc4.default_fillvals[variabletype],
                 zlib=zlib,
                 complevel=complevel,
-                chunksizes=tuple(chunk_sizes.values()),
+                **var_layout,
             )
 
             for key, val in var_meta[var_name].items():
@@ -627,38 +1461,51 @@ class NetCdfWrite(Accessor):
                 var_encoding = " ".join(var_encoding)
                 self.variables[var_name].setncattr("coordinates", var_encoding)
 
+        self._init_write(name, buffer_n_times, writer)
         return
 
-    def __del__(self):
-        self.close()
-        return
+    def _variable_layout(
+        self, layout: dict, var_dims: tuple, variabletype: str
+    ) -> dict:
+        # the createVariable arguments of a variable from a layout
+        chunk_sizes = []
+        for dim, size in zip(var_dims, layout["chunk_sizes"].values()):
+            dim_len = self.dataset.dimensions[dim].size
+            if size == 0 or (dim_len and size > dim_len):
+                size = dim_len
+            chunk_sizes += [max(size, 1)]
+
+        var_layout = {
+            "datatype": variabletype,
+            "chunksizes": tuple(chunk_sizes),
+            "shuffle": layout["shuffle"],
+        }
+        if variabletype in ["f4", "f8"]:
+            if layout["float32"]:
+                var_layout["datatype"] = "f4"
+            var_layout["least_significant_digit"] = layout[
+                "least_significant_digit"
+            ]
+        return var_layout
 
-    def close(self):
-        if self.dataset.isopen():
-            self.dataset.close()
-            return
+    def _is_open(self) -> bool:
+        return self.dataset.isopen()
 
-    def add_simulation_time(self, itime_step: int, simulation_time: float):
-        self.time[itime_step] = nc4.date2num(simulation_time, self.time.units)
+    def _close_store(self) -> None:
+        self.dataset.close()
         return
 
-    def add_data(
-        self, name: str, itime_step: int, current: np.ndarray
-    ) -> None:
-        """Add data for a time step to a NetCDF variable
+    @staticmethod
+    def _is_time_variable(var) -> bool:
+        return var.dimensions[0] == "time"
 
-        Args:
-            name:
-            itime_step:
+    @staticmethod
+    def _time_chunk_size(var) -> int:
+        chunking = var.chunking()
+        return 1 if chunking == "contiguous" else chunking[0]
 
-        Returns:
-
-        """
-        if name not in self.variables.keys():
-            raise KeyError(f"{name} not a valid variable name")
-        var = self.variables[name]
-        var[itime_step, :] = current[:]
-        return
+    def _encode_time(self, simulation_time: dt.datetime) -> float:
+        return nc4.date2num(simulation_time, self.time.units)
 
     def add_all_data(
         self,
@@ -692,6 +1539,8 @@ class NetCdfWrite(Accessor):
             # currently just doy
             self[time_coord][:] = time_data
 
+        if name in self._spatial_index.keys():
+            data = data[:, self._spatial_index[name]]
         self.variables[name][:, :] = data[:, :]
 
         return
@@ -728,6 +1577,8 @@ def subset_netcdf_file(
     for additional discussion.
 
     """
+    import xarray as xr
+
     ds = xr.load_dataset(file_name)
 
     ds = subset_xr(
@@ -744,12 +1595,12 @@ def subset_netcdf_file(
 
 
 def subset_xr(
-    ds: Union[xr.Dataset, xr.DataArray],
+    ds: Union["xr.Dataset", "xr.DataArray"],
     start_time: np.datetime64 = None,
     end_time: np.datetime64 = None,
     coord_dim_name: str = None,
     coord_dim_values_keep: np.array = None,
-) -> Union[xr.Dataset, xr.DataArray]:
+) -> Union["xr.Dataset", "xr.DataArray"]:
     """Subset an xarray Dataset or DataArray on to coord or dim values.
 
     Args:
@@ -769,6 +1620,8 @@ def subset_xr(
     https://github.com/pydata/xarray/issues/8796 for additional discussion.
 
     """
+    import xarray as xr
+
     if isinstance(ds, xr.DataArray):
         var_dims_orig = ds.dims
     else:
@@ -0,0 +1,220 @@
+import hashlib
+import inspect
+import os
+import pathlib as pl
+import platform
+import types
+from typing import Union
+
+from ..constants import fileish
+from ..version import __version__
+
+# The user may set the numba cache directory for pywatershed kernels with
+# this environment variable or with set_numba_cache_dir().
+_numba_cache_dir = os.getenv("PYWATERSHED_NUMBA_CACHE_DIR")
+
+# Dispatchers created by njit and njit_functions in this python process
+_dispatchers = {}
+_function_dispatchers = {}
+
+
+def set_numba_cache_dir(cache_dir: Union[fileish, None]) -> None:
+    """Set the directory for the on-disk cache of compiled numba kernels.
+
+    Processes compiling their kernels after this call will load previously
+    compiled machine code from this directory when available or will write
+    it there when not. The cache is keyed (in subdirectories) by the
+    pywatershed version, the numba version, and the features of the host CPU
+    so that a single directory may be shared by different installations and
+    machines.
+
+    The default is taken from the environment variable
+    PYWATERSHED_NUMBA_CACHE_DIR, if set, else there is no caching.
+
+    Args:
+        cache_dir: A str or pl.Path directory or None to disable caching.
+    """
+    global _numba_cache_dir
+    _numba_cache_dir = cache_dir
+    return
+
+
+def get_numba_cache_dir() -> Union[pl.Path, None]:
+    """Get the keyed numba cache directory.
+
+    Returns:
+        None if caching is not enabled else the subdirectory of the
+        user-set cache directory for this pywatershed version, numba version,
+        and host CPU features.
+    """
+    if _numba_cache_dir is None:
+        return None
+
+    import numba as nb
+    from llvmlite import binding as llvm
+
+    # Code is compiled for the features of the CPU (e.g. avx2), which differ
+    # between CPUs of the same name, unless numba is told to compile for
+    # others (NUMBA_CPU_FEATURES).
+    cpu_features = nb.config.CPU_FEATURES
+    if cpu_features is None:
+        cpu_features = llvm.get_host_cpu_features().flatten()
+    features_hash = hashlib.sha256(cpu_features.encode()).hexdigest()[:16]
+    return (
+        pl.Path(_numba_cache_dir).resolve()
+        / f"pywatershed_{__version__}"
+        / f"numba_{nb.__version__}"
+        / f"{platform.machine()}_{features_hash}"
+    )
+
+
+def njit(*args, cache: bool = True, **kwargs):
+    """A numba.njit which reuses dispatchers and caches them to disk.
+
+    Takes the same arguments as numba.njit. The dispatcher for a given
+    function and set of arguments is created once per python process and
+    returned to later callers, so instances of the same Process class share
+    their compiled code instead of each compiling it.
+
+    When a cache directory is set (see set_numba_cache_dir), numba's
+    cache=True is applied and numba's cache directory is pointed at the keyed
+    pywatershed cache directory while the dispatcher is created (and eagerly
+    compiled when a signature is passed). Functions taking other jitted
+    functions as arguments can not be cached on disk by numba and should pass
+    cache=False.
+    """
+    import numba as nb
+
+    # njit(func, **kwargs) is equivalent to njit(**kwargs)(func)
+    if len(args) and inspect.isfunction(args[0]):
+        return njit(*args[1:], cache=cache, **kwargs)(args[0])
+
+    cache_dir = get_numba_cache_dir() if cache else None
+
+    def decorator(func):
+        key = (func, repr(args), repr(sorted(kwargs.items())), cache_dir)
+        if key in _dispatchers.keys():
+            return _dispatchers[key]
+
+        if cache_dir is None:
+            dispatcher = nb.njit(*args, **kwargs)(func)
+
+        else:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            config_cache_dir = nb.config.CACHE_DIR
+            nb.config.CACHE_DIR = str(cache_dir)
+            try:
+                dispatcher = nb.njit(*args, cache=True, **kwargs)(func)
+            finally:
+                nb.config.CACHE_DIR = config_cache_dir
+
+        _dispatchers[key] = dispatcher
+        return dispatcher
+
+    return decorator
+
+
+def _copy_functions(functions: dict, wrap) -> dict:
+    # Copy the functions with namespaces, copies of the globals of their
+    # modules, in which the names of the functions are bound to their
+    # wrapped copies.
+    namespaces = {}
+    copies = {}
+    for name, (func, kwargs) in functions.items():
+        namespace = namespaces.setdefault(
+            id(func.__globals__), dict(func.__globals__)
+        )
+        func_copy = types.FunctionType(
+            func.__code__,
+            namespace,
+            func.__name__,
+            func.__defaults__,
+            func.__closure__,
+        )
+        func_copy.__kwdefaults__ = func.__kwdefaults__
+        func_copy.__qualname__ = func.__qualname__
+        copies[name] = wrap(func_copy, kwargs)
+
+    # resolved when the functions calling them are called or compiled
+    for namespace in namespaces.values():
+        namespace.update(copies)
+
+    return copies
+
+
+def _overrides_globals(functions: dict) -> bool:
+    # Are any of the functions not the ones bound to their names in the
+    # globals of the modules of the functions (e.g. a helper overridden by a
+    # subclass)?
+    modules_globals = {
+        id(func.__globals__): func.__globals__
+        for func, _ in functions.values()
+    }.values()
+    return any(
+        name in glbls and glbls[name] is not func
+        for name, (func, _) in functions.items()
+        for glbls in modules_globals
+    )
+
+
+def bind_functions(functions: dict) -> dict:
+    """Bind python functions which call each other by their global names.
+
+    The python counterpart of njit_functions, for calc_method="numpy": the
+    functions are copied as in njit_functions but not jitted, so that the
+    functions passed (e.g. helpers overridden by a subclass) are the ones
+    called.
+
+    Args:
+        functions: A dictionary of global names to tuples of the function
+            and a dictionary of its njit keyword arguments (ignored).
+
+    Returns:
+        A dictionary of the global names to the bound functions.
+    """
+    return _copy_functions(functions, lambda func, kwargs: func)
+
+
+def njit_functions(functions: dict, cache: bool = True) -> dict:
+    """Jit functions which call each other by their global names.
+
+    numba can not cache on disk a kernel taking jitted functions as
+    arguments but can cache one calling jitted functions found in its
+    globals. The functions are copied with namespaces, copies of the globals
+    of their modules, in which the names of the functions are bound to their
+    jitted copies. The modules themselves keep the python functions. The
+    copies are jitted with njit, so they are cached on disk when a cache
+    directory is set.
+
+    numba keys its disk cache by the qualified name and file of a function,
+    not by the functions it calls. When any of the functions is not the one
+    bound to its name in the globals of the modules (e.g. a helper
+    overridden by a subclass), the functions are not cached on disk so that
+    the kernels compiled with and without the override do not load each
+    other from the cache.
+
+    Args:
+        functions: A dictionary of global names to tuples of the function
+            and a dictionary of its njit keyword arguments.
+        cache: Cache the jitted functions on disk when a cache directory is
+            set?
+
+    Returns:
+        A dictionary of the global names to the jitted functions.
+    """
+    cache = cache and not _overrides_globals(functions)
+    key = (
+        tuple(
+            (name, func, repr(sorted(kwargs.items())))
+            for name, (func, kwargs) in functions.items()
+        ),
+        get_numba_cache_dir() if cache else None,
+    )
+    if key in _function_dispatchers.keys():
+        return _function_dispatchers[key]
+
+    jitted = _copy_functions(
+        functions, lambda func, kwargs: njit(cache=cache, **kwargs)(func)
+    )
+    _function_dispatchers[key] = jitted
+    return jitted
@@ -0,0 +1,50 @@
+import importlib
+
+# {name: (class or (module, class name), store suffix)}, classes are
+# imported on first use so optional dependencies are only required then.
+_output_backends = {
+    "netcdf": (("pywatershed.utils.netcdf_utils", "NetCdfWrite"), ".nc"),
+    "zarr": (("pywatershed.utils.zarr_utils", "ZarrWrite"), ".zarr"),
+}
+
+
+def register_output_backend(name: str, write_class: type, suffix: str):
+    """Register an output backend for Process and Budget output.
+
+    Args:
+        name: the name used to select the backend, e.g. in the control
+            option output_backend.
+        write_class: a subclass of OutputWrite with the same __init__
+            arguments as NetCdfWrite (name, coordinates, variables,
+            var_meta, extra_coords, global_attrs, buffer_n_times, writer,
+            spatial_subset, layout).
+        suffix: the suffix of the file or directory names of the stores.
+    """
+    _output_backends[name] = (write_class, suffix)
+    return
+
+
+def get_output_backend(name: str = None) -> tuple[type, str]:
+    """Get the class and the store suffix of an output backend.
+
+    Args:
+        name: the name of a registered backend, None for "netcdf".
+
+    Returns:
+        A tuple of the OutputWrite subclass and the store suffix.
+    """
+    if name is None:
+        name = "netcdf"
+    if name not in _output_backends.keys():
+        msg = (
+            f"Output backend '{name}' is not one of "
+            f"{list(_output_backends.keys())}"
+        )
+        raise ValueError(msg)
+
+    write_class, suffix = _output_backends[name]
+    if isinstance(write_class, tuple):
+        module_name, class_name = write_class
+        write_class = getattr(importlib.import_module(module_name), class_name)
+        _output_backends[name] = (write_class, suffix)
+    return write_class, suffix
@@ -4,7 +4,6 @@ from typing import Tuple, Union
 
 import netCDF4 as nc4
 import numpy as np
-import pandas as pd
 
 from ..base import meta
 from ..base.accessor import Accessor
@@ -35,6 +34,8 @@ conversions = {
 
 
 def unit_conversion(data, verbose=False):
+    import pandas as pd
+
     if isinstance(data, (dict,)):
         if verbose:
             print("dictionary conversion...")
@@ -63,6 +64,8 @@ def unit_conversion(data, verbose=False):
 
 
 def load_prms_output(output_data_path, csvfiles, convert=True, verbose=False):
+    import pandas as pd
+
     templist = []
     for csvname in csvfiles:
         fpath = os.path.join(output_data_path, csvname)
@@ -89,6 +92,8 @@ def load_prms_output(output_data_path, csvfiles, convert=True, verbose=False):
 
 
 def load_prms_statscsv(fname, convert=True, verbose=False):
+    import pandas as pd
+
     # read stats.csv
     # JLM: for prms_summary.csv?
     with open(fname) as f:
@@ -114,6 +119,8 @@ def load_prms_statscsv(fname, convert=True, verbose=False):
 
 
 def load_nhru_output_csv(fname, convert=True, verbose=False):
+    import pandas as pd
+
     # read stats.csv
     df = pd.read_csv(
         fname,
@@ -132,6 +139,8 @@ def load_nhru_output_csv(fname, convert=True, verbose=False):
 
 
 def load_wbl_output(output_data_path, convert=True, verbose=False):
+    import pandas as pd
+
     wbl_outflows = {
         "soilzone.wbal": (
             "perv ET",
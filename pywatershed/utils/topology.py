@@ -0,0 +1,491 @@
+"""Topology of flow networks given by the downstream index of each node.
+
+A network of n nodes (e.g. PRMS segments or FlowGraph nodes) is described
+by a routing order (upstream nodes before downstream nodes) and, for each
+node, the zero-based index of the node to which it flows, negative if it
+flows out of the network (e.g. tosegment - 1 or to_graph_index).
+
+The TopologyIndex collects the routing order, levels, upstream adjacency,
+components, and headwaters of a network, computed once per network with
+numpy and optionally cached on disk.
+"""
+
+import hashlib
+import os
+import pathlib as pl
+from typing import Literal, Tuple, Union
+
+import numpy as np
+
+from ..constants import fileish
+from ..version import __version__
+
+# TopologyIndexes created in this python process, keyed by network hash
+_topology_indices = {}
+
+
+def kahn_order(to_index: np.ndarray) -> np.ndarray:
+    """A routing order of a flow network by Kahn's algorithm.
+
+    Nodes are ordered in frontiers: the headwater nodes, then the nodes
+    whose upstream nodes are all in previous frontiers, and so on, which
+    are also the topological levels of the nodes. Each frontier is found
+    with numpy operations on the whole frontier. Isolated nodes (without
+    upstream or downstream nodes) come first, then the headwater nodes in
+    increasing index and, in each later frontier, the nodes in the order in
+    which their last upstream node is routed. This is the order of
+    networkx.topological_sort on the graph of the edges (node, to_index) in
+    node order, with the isolated nodes in front, so the flows into each
+    node are summed in the same sequence.
+
+    Args:
+        to_index: The index of the downstream node of each node, negative
+            where flow leaves the network.
+
+    Returns:
+        The routing order of the nodes, upstream nodes before downstream
+        nodes.
+
+    Raises:
+        ValueError: If the network has a cycle.
+    """
+    to_index = np.asarray(to_index, dtype="int64")
+    n_nodes = len(to_index)
+    indegree = np.bincount(to_index[to_index >= 0], minlength=n_nodes)
+
+    isolated = (indegree == 0) & (to_index < 0)
+    frontiers = [np.where(isolated)[0]]
+    frontier = np.where((indegree == 0) & ~isolated)[0]
+    while len(frontier):
+        frontiers += [frontier]
+        to_nodes = to_index[frontier]
+        to_nodes = to_nodes[to_nodes >= 0]
+        np.subtract.at(indegree, to_nodes, 1)
+        # the position of the last upstream node of each downstream node
+        n_to = len(to_nodes)
+        to_nodes, last_reversed = np.unique(to_nodes[::-1], return_index=True)
+        last = n_to - 1 - last_reversed
+        ready = indegree[to_nodes] == 0
+        frontier = to_nodes[ready][np.argsort(last[ready])]
+
+    order = np.concatenate(frontiers)
+    if len(order) != n_nodes:
+        msg = f"The flow network has a cycle through {n_nodes - len(order)}"
+        msg += " nodes"
+        raise ValueError(msg)
+
+    return order.astype("int64")
+
+
+def topological_levels(
+    order: np.ndarray,
+    to_index: np.ndarray,
+    upstream_offsets: np.ndarray = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The topological levels (wavefronts) of a flow network.
+
+    The level of a node is the length of the longest path from a headwater
+    node (with no upstream nodes, level 0) to the node. Nodes in a level are
+    independent of each other and depend only on nodes in lower levels, so
+    the nodes of a level may be calculated concurrently once the lower
+    levels are calculated. The levels are found with one numpy pass per
+    level over its frontier: a node joins the next frontier once all of its
+    upstream nodes, counted by the upstream adjacency, are in a level.
+
+    Args:
+        order: The routing order of the nodes.
+        to_index: The index of the downstream node of each node, negative
+            where flow leaves the network.
+        upstream_offsets: Optional precomputed offsets of the
+            upstream_adjacency of the network.
+
+    Returns:
+        A tuple of (level_offsets, level_nodes) in compressed sparse row
+        form: the nodes of level ii are
+        level_nodes[level_offsets[ii]:level_offsets[ii + 1]], in routing
+        order.
+    """
+    order = np.asarray(order, dtype="int64")
+    to_index = np.asarray(to_index, dtype="int64")
+
+    if upstream_offsets is None:
+        upstream_offsets, _ = upstream_adjacency(order, to_index)
+    n_upstream = np.diff(upstream_offsets)
+
+    level = np.zeros(len(to_index), dtype="int64")
+    n_upstream_leveled = np.zeros(len(to_index), dtype="int64")
+    frontier = np.where(n_upstream == 0)[0]
+    ilevel = 0
+    while len(frontier):
+        level[frontier] = ilevel
+        to_nodes = to_index[frontier]
+        to_nodes = to_nodes[to_nodes >= 0]
+        np.add.at(n_upstream_leveled, to_nodes, 1)
+        to_nodes = np.unique(to_nodes)
+        frontier = to_nodes[
+            n_upstream_leveled[to_nodes] == n_upstream[to_nodes]
+        ]
+        ilevel += 1
+
+    level_nodes = order[np.argsort(level[order], kind="stable")]
+    level_offsets = np.zeros(level.max(initial=-1) + 2, dtype="int64")
+    np.cumsum(np.bincount(level), out=level_offsets[1:])
+    return level_offsets, level_nodes
+
+
+def upstream_adjacency(
+    order: np.ndarray, to_index: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The upstream nodes of each node of a flow network.
+
+    Args:
+        order: The routing order of the nodes.
+        to_index: The index of the downstream node of each node, negative
+            where flow leaves the network.
+
+    Returns:
+        A tuple of (upstream_offsets, upstream_nodes) in compressed sparse
+        row form: the nodes flowing into node ii are
+        upstream_nodes[upstream_offsets[ii]:upstream_offsets[ii + 1]], in
+        routing order. Summing the upstream flows in this order reproduces
+        the sums accumulated in routing order.
+    """
+    order = np.asarray(order, dtype="int64")
+    to_index = np.asarray(to_index, dtype="int64")
+
+    from_nodes = order[to_index[order] >= 0]
+    upstream_nodes = from_nodes[
+        np.argsort(to_index[from_nodes], kind="stable")
+    ]
+    upstream_offsets = np.zeros(len(to_index) + 1, dtype="int64")
+    np.cumsum(
+        np.bincount(to_index[from_nodes], minlength=len(to_index)),
+        out=upstream_offsets[1:],
+    )
+    return upstream_offsets, upstream_nodes
+
+
+def connected_components(to_index: np.ndarray) -> np.ndarray:
+    """The weakly connected components (basins) of a flow network.
+
+    Each node flows to at most one node, so each component drains to a
+    single outlet node and is identified by it.
+
+    Args:
+        to_index: The index of the downstream node of each node, negative
+            where flow leaves the network.
+
+    Returns:
+        The component of each node, components being numbered in the order
+        of the indices of their outlets.
+
+    Raises:
+        ValueError: If the network has a cycle, which has no outlet.
+    """
+    to_index = np.asarray(to_index, dtype="int64")
+    # the pointer jumping below does not end on a cycle
+    _ = kahn_order(to_index)
+    nodes = np.arange(len(to_index), dtype="int64")
+    # find the outlet of each node by pointer jumping
+    outlet = np.where(to_index >= 0, to_index, nodes)
+    while True:
+        outlet_next = outlet[outlet]
+        if np.array_equal(outlet_next, outlet):
+            break
+        outlet = outlet_next
+
+    return np.unique(outlet, return_inverse=True)[1].astype("int64")
+
+
+def balance_components(component: np.ndarray, n_parts: int) -> np.ndarray:
+    """Balance the components of a flow network across parts by node count.
+
+    Components are assigned, largest first, to the part with the fewest
+    nodes so far (longest processing time first).
+
+    Args:
+        component: The component of each node, see connected_components.
+        n_parts: The number of parts, e.g. threads.
+
+    Returns:
+        The part of each node.
+    """
+    component = np.asarray(component, dtype="int64")
+    component_size = np.bincount(component)
+    part_size = np.zeros(n_parts, dtype="int64")
+    component_part = np.zeros(len(component_size), dtype="int64")
+    for icomp in np.argsort(-component_size, kind="stable").tolist():
+        ipart = np.argmin(part_size)
+        component_part[icomp] = ipart
+        part_size[ipart] += component_size[icomp]
+
+    return component_part[component]
+
+
+def routing_schedule(
+    order: np.ndarray,
+    to_index: np.ndarray,
+    n_parts: int = 1,
+    method: Literal[None, "serial", "levels", "components"] = None,
+    levels: Tuple[np.ndarray, np.ndarray] = None,
+    component: np.ndarray = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """A schedule for routing a flow network concurrently.
+
+    The schedule is a sequence of stages, each stage a set of tasks which
+    are independent of each other and each task a sequence of nodes to
+    route in order. A router calculates the stages in sequence, the tasks of
+    a stage concurrently (e.g. in a numba prange) and the nodes of a task
+    serially. The methods are
+
+    * "serial": a single task of all the nodes in routing order.
+    * "levels": a stage for each topological level (see topological_levels)
+      with a task for each node of the level.
+    * "components": a single stage of n_parts tasks, each task the nodes of
+      whole components (basins, see connected_components) in routing order,
+      the components balanced across the tasks by node count (see
+      balance_components). The tasks need no synchronization.
+
+    Every node is scheduled after its upstream nodes in all methods.
+
+    Args:
+        order: The routing order of the nodes.
+        to_index: The index of the downstream node of each node, negative
+            where flow leaves the network.
+        n_parts: The number of tasks which may run concurrently, e.g.
+            threads.
+        method: One of [None, "serial", "levels", "components"]. None is
+            "serial" when n_parts is 1, else "components" when the largest
+            part of the balanced components has at most twice the mean
+            number of nodes of the parts (e.g. many basins), else "levels"
+            (e.g. a network dominated by a single basin).
+        levels: Optional precomputed topological_levels of the network.
+        component: Optional precomputed connected_components of the
+            network.
+
+    Returns:
+        A tuple of (stage_offsets, task_offsets, task_nodes) in compressed
+        sparse row form: the tasks of stage ii are
+        range(stage_offsets[ii], stage_offsets[ii + 1]) and the nodes of
+        task jj are task_nodes[task_offsets[jj]:task_offsets[jj + 1]].
+    """
+    if method not in [None, "serial", "levels", "components"]:
+        raise ValueError(f"Invalid routing schedule method: {method}")
+
+    order = np.asarray(order, dtype="int64")
+    to_index = np.asarray(to_index, dtype="int64")
+    n_nodes = len(order)
+    if component is None and method in [None, "components"] and n_parts > 1:
+        component = connected_components(to_index)
+
+    part = None
+    if method is None:
+        method = "serial"
+        if n_parts > 1:
+            method = "levels"
+            part = balance_components(component, n_parts)
+            part_size = np.bincount(part, minlength=n_parts)
+            if part_size.max(initial=0) <= 2 * n_nodes / n_parts:
+                method = "components"
+
+    if method == "serial":
+        stage_offsets = np.array([0, 1], dtype="int64")
+        task_offsets = np.array([0, n_nodes], dtype="int64")
+        return stage_offsets, task_offsets, order
+
+    if method == "levels":
+        if levels is None:
+            levels = topological_levels(order, to_index)
+        stage_offsets, task_nodes = levels
+        task_offsets = np.arange(n_nodes + 1, dtype="int64")
+        return stage_offsets, task_offsets, task_nodes
+
+    if part is None:
+        if component is None:
+            component = connected_components(to_index)
+        part = balance_components(component, n_parts)
+    task_nodes = order[np.argsort(part[order], kind="stable")]
+    task_offsets = np.zeros(n_parts + 1, dtype="int64")
+    np.cumsum(np.bincount(part, minlength=n_parts), out=task_offsets[1:])
+    stage_offsets = np.array([0, n_parts], dtype="int64")
+    return stage_offsets, task_offsets, task_nodes
+
+
+class TopologyIndex:
+    """The topology of a flow network as numpy arrays.
+
+    The index holds, for the downstream index of each node, the routing
+    order (see kahn_order), the topological levels, the upstream adjacency,
+    and the connected components of the network, as well as its headwater,
+    outlet, and isolated nodes. It replaces building a networkx graph. The
+    arrays are computed once per network in a python process by
+    from_to_index, which can also persist them on disk, keyed by a hash of
+    the network, so later builds of the same network load them.
+
+    Args:
+        to_index: The index of the downstream node of each node, negative
+            where flow leaves the network (e.g. tosegment - 1 or
+            to_graph_index).
+
+    Examples:
+    ---------
+
+    >>> import numpy as np
+    >>> from pywatershed.utils.topology import TopologyIndex
+    >>> topology = TopologyIndex(np.array([2, 2, -1, -1]))
+    >>> topology.order
+    array([3, 0, 1, 2])
+    >>> topology.headwaters
+    array([0, 1, 3])
+    >>> topology.isolated
+    array([3])
+    """
+
+    # the arrays defining the index, as persisted
+    _array_names = (
+        "to_index",
+        "order",
+        "level_offsets",
+        "level_nodes",
+        "upstream_offsets",
+        "upstream_nodes",
+        "component",
+    )
+
+    def __init__(self, to_index: np.ndarray):
+        self.to_index = np.array(to_index, dtype="int64")
+        self.order = kahn_order(self.to_index)
+        (
+            self.upstream_offsets,
+            self.upstream_nodes,
+        ) = upstream_adjacency(self.order, self.to_index)
+        (
+            self.level_offsets,
+            self.level_nodes,
+        ) = topological_levels(
+            self.order, self.to_index, self.upstream_offsets
+        )
+        self.component = connected_components(self.to_index)
+        return
+
+    @classmethod
+    def from_to_index(
+        cls,
+        to_index: np.ndarray,
+        cache_dir: Union[fileish, None] = None,
+    ) -> "TopologyIndex":
+        """Get the TopologyIndex of a network, computing it only once.
+
+        The index is reused for the same network in this python process.
+        When cache_dir is given, the index is also loaded from or saved to
+        the file topology_<hash>.npz in cache_dir, e.g. the directory of the
+        parameter file of the network.
+
+        Args:
+            to_index: The index of the downstream node of each node.
+            cache_dir: An optional directory of persisted indices.
+
+        Returns:
+            The TopologyIndex of the network.
+        """
+        to_index = np.ascontiguousarray(to_index, dtype="int64")
+        key = hashlib.sha256(
+            __version__.encode() + to_index.tobytes()
+        ).hexdigest()[0:16]
+        if key in _topology_indices.keys():
+            return _topology_indices[key]
+
+        cache_file = None
+        topology = None
+        if cache_dir is not None:
+            cache_file = pl.Path(cache_dir) / f"topology_{key}.npz"
+            topology = cls._load(cache_file, to_index)
+
+        if topology is None:
+            topology = cls(to_index)
+            if cache_file is not None:
+                topology._save(cache_file)
+
+        _topology_indices[key] = topology
+        return topology
+
+    @classmethod
+    def _load(
+        cls, cache_file: pl.Path, to_index: np.ndarray
+    ) -> Union["TopologyIndex", None]:
+        if not cache_file.exists():
+            return None
+        topology = cls.__new__(cls)
+        try:
+            with np.load(cache_file) as cached:
+                for name in cls._array_names:
+                    setattr(topology, name, cached[name])
+        except Exception:
+            # an unreadable cache is recomputed (and rewritten)
+            return None
+        if not np.array_equal(topology.to_index, to_index):
+            return None
+        return topology
+
+    def _save(self, cache_file: pl.Path) -> None:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            # write then rename so concurrent readers never see a partial file
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            with tmp_file.open("wb") as file:
+                np.savez(
+                    file,
+                    **{
+                        name: getattr(self, name) for name in self._array_names
+                    },
+                )
+            tmp_file.replace(cache_file)
+        except OSError:
+            # an unwritable cache is not an error
+            pass
+        return
+
+    @property
+    def n_nodes(self) -> int:
+        """The number of nodes."""
+        return len(self.to_index)
+
+    @property
+    def headwaters(self) -> np.ndarray:
+        """The nodes without upstream nodes."""
+        return np.where(np.diff(self.upstream_offsets) == 0)[0]
+
+    @property
+    def outlets(self) -> np.ndarray:
+        """The nodes from which flow leaves the network."""
+        return np.where(self.to_index < 0)[0]
+
+    @property
+    def isolated(self) -> np.ndarray:
+        """The nodes without upstream or downstream nodes."""
+        return np.where(
+            (np.diff(self.upstream_offsets) == 0) & (self.to_index < 0)
+        )[0]
+
+    def routing_schedule(
+        self,
+        n_parts: int = 1,
+        method: Literal[None, "serial", "levels", "components"] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """A schedule for routing the network, see routing_schedule.
+
+        Args:
+            n_parts: The number of tasks which may run concurrently.
+            method: One of [None, "serial", "levels", "components"].
+
+        Returns:
+            A tuple of (stage_offsets, task_offsets, task_nodes).
+        """
+        return routing_schedule(
+            self.order,
+            self.to_index,
+            n_parts=n_parts,
+            method=method,
+            levels=(self.level_offsets, self.level_nodes),
+            component=self.component,
+        )
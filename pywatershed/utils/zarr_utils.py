@@ -0,0 +1,309 @@
+import datetime as dt
+import warnings
+from typing import Union
+
+import netCDF4 as nc4
+import numpy as np
+
+from ..base.meta import meta_dimensions, meta_netcdf_type
+from .netcdf_utils import (
+    BackgroundWriter,
+    OutputWrite,
+    fileish,
+    listish,
+    output_layout,
+    spatial_coordinate_name,
+)
+from .optional_import import import_optional_dependency
+
+doy_time_vars = [
+    "soltab_potsw",
+    "soltab_horad_potsw",
+    "soltab_sunhrs",
+]
+
+
+class ZarrWrite(OutputWrite):
+    """Output time steps of variables to a Zarr store.
+
+    The Zarr store is a local directory in which each variable is an array
+    chunked along time (and not in space), so a chunk holds a block of whole
+    time steps. Time steps are buffered in memory until a chunk is complete
+    and each chunk is written once. Chunks are separate files so the store
+    can be read (e.g. by xarray.open_zarr and Dask) while being written and
+    by many readers without the locking of HDF5. Dimension names and the
+    (non-dictionary) static metadata of the variables are stored on the
+    arrays so the store opens as an xarray.Dataset and the metadata is
+    consolidated on close. The arguments and methods follow NetCdfWrite.
+
+    Requires zarr>=3.
+
+    Args:
+        name: path of the store (directory), conventionally ending in .zarr
+        coordinates: dictionary of spatial coordinate values, e.g. "nhm_id".
+        variables: a list of variable names or a dictionary of lists of
+            variable names keyed by group (None for the root group).
+        var_meta: dictionary of the metadata of the variables.
+        extra_coords: A dictionary keyed by dimension with the values being
+            a dictionary of var_name: data pairs.
+        global_attrs: dictionary of attributes of the store.
+        time_units: units of the time coordinate.
+        clobber: overwrite an existing store.
+        time_chunk_size: the number of time steps in a chunk.
+        compressors: compressors of the arrays as accepted by
+            zarr.create_array, e.g. zarr.codecs.BloscCodec(cname="zstd",
+            clevel=5, shuffle="shuffle"). Defaults to the zarr default.
+        buffer_n_times: the number of time steps to buffer, rounded up to a
+            multiple of time_chunk_size, defaults to time_chunk_size.
+        writer: an optional BackgroundWriter, see NetCdfWrite.
+        spatial_subset: optional selection of the locations to write on
+            spatial coordinates, see NetCdfWrite.
+        layout: an optional chunking and compression profile or dictionary,
+            see output_layout(). When supplied, it replaces time_chunk_size
+            and compressors: arrays are chunked by its chunk_sizes,
+            compressed with Blosc (zlib, with the shuffle and complevel of
+            the layout) or gzip when shuffle is False, and float variables
+            are stored as float32 and quantized as requested.
+    """
+
+    def __init__(
+        self,
+        name: fileish,
+        coordinates: dict,
+        variables: listish,
+        var_meta: dict,
+        extra_coords: dict = None,
+        global_attrs: dict = None,
+        time_units: str = "days since 1970-01-01 00:00:00",
+        clobber: bool = True,
+        time_chunk_size: int = 64,
+        compressors="auto",
+        buffer_n_times: int = None,
+        writer: BackgroundWriter = None,
+        spatial_subset: dict = None,
+        layout: Union[str, dict] = None,
+    ):
+        zarr = import_optional_dependency("zarr", min_version="3.0.0")
+        self._zarr = zarr
+
+        if isinstance(variables, dict):
+            group_variables = {
+                var_name: group
+                for group, vars in variables.items()
+                for var_name in vars
+            }
+        else:
+            group_variables = {var_name: None for var_name in variables}
+
+        if extra_coords is None:
+            extra_coords = {}
+        coordinates, extra_coords = self._init_spatial_subset(
+            coordinates,
+            extra_coords,
+            list(group_variables.keys()),
+            var_meta,
+            spatial_subset,
+        )
+        if global_attrs is None:
+            global_attrs = {}
+
+        self.group = zarr.open_group(
+            store=str(name), mode="w" if clobber else "w-"
+        )
+        self.group.attrs.update(
+            {"Description": "pywatershed output data", **global_attrs}
+        )
+        self._time_units = time_units
+
+        space_chunk_size = 0
+        self._least_significant_digit = None
+        if layout is not None:
+            layout = output_layout(layout)
+            if layout["chunk_sizes"]["time"]:
+                time_chunk_size = layout["chunk_sizes"]["time"]
+            space_chunk_size = layout["chunk_sizes"]["space"]
+            compressors = None
+            if layout["zlib"] and layout["shuffle"]:
+                compressors = zarr.codecs.BloscCodec(
+                    cname="zlib",
+                    clevel=layout["complevel"],
+                    shuffle="shuffle",
+                )
+            elif layout["zlib"]:
+                compressors = zarr.codecs.GzipCodec(level=layout["complevel"])
+            self._least_significant_digit = layout["least_significant_digit"]
+
+        var_dims = {}
+        for var_name in group_variables.keys():
+            time_dim = "doy" if var_name in doy_time_vars else "time"
+            spatial_dim = spatial_coordinate_name(
+                meta_dimensions(var_meta[var_name])
+            )
+            var_dims[var_name] = (time_dim, spatial_dim)
+
+        dims = set(dim for dd in var_dims.values() for dim in dd)
+        if "time" in dims:
+            self.time = self.group.create_array(
+                "time",
+                shape=(0,),
+                dtype="float64",
+                chunks=(time_chunk_size,),
+                dimension_names=("time",),
+                attributes={"units": time_units, "calendar": "standard"},
+            )
+        if "doy" in dims:
+            self.doy = self.group.create_array(
+                "doy",
+                data=np.arange(1, 367, dtype="int32"),
+                dimension_names=("doy",),
+                attributes={"units": "Day of year"},
+            )
+        for dim in sorted(dims - {"time", "doy"}):
+            self.group.create_array(
+                dim,
+                data=np.atleast_1d(np.array(coordinates[dim])).astype("int32"),
+                dimension_names=(dim,),
+            )
+
+        for x_dim, x_data_dict in extra_coords.items():
+            for x_var_name, x_data in x_data_dict.items():
+                x_data = np.asarray(x_data)
+                if x_data.dtype.kind == "S":
+                    x_data = x_data.astype("U")
+                self.group.create_array(
+                    x_var_name,
+                    data=x_data,
+                    dimension_names=(x_dim,),
+                )
+
+        self.variables = {}
+        for var_name, group in group_variables.items():
+            time_dim, spatial_dim = var_dims[var_name]
+            n_space = self.group[spatial_dim].shape[0]
+            # the types and fill values of NetCdfWrite
+            variabletype = meta_netcdf_type(var_meta[var_name])
+            if layout is not None and layout["float32"]:
+                if variabletype == "f8":
+                    variabletype = "f4"
+            dtype = np.dtype(variabletype)
+            fill_value = nc4.default_fillvals[variabletype]
+
+            attributes = {
+                key: val
+                for key, val in var_meta[var_name].items()
+                if not isinstance(val, dict)
+            }
+            coords = [
+                x_var_name
+                for x_dim, x_data_dict in extra_coords.items()
+                if x_dim in var_dims[var_name]
+                for x_var_name in x_data_dict.keys()
+            ]
+            if len(coords):
+                attributes["coordinates"] = " ".join(coords)
+
+            parent = self.group
+            if group is not None:
+                parent = self.group.require_group(group)
+            self.variables[var_name] = parent.create_array(
+                var_name,
+                shape=(366 if time_dim == "doy" else 0, n_space),
+                dtype=dtype,
+                chunks=(
+                    time_chunk_size,
+                    min(space_chunk_size or n_space, n_space),
+                ),
+                compressors=compressors,
+                fill_value=fill_value,
+                dimension_names=(time_dim, spatial_dim),
+                attributes=attributes,
+            )
+
+        # always buffer at least a chunk
+        if buffer_n_times is None:
+            buffer_n_times = time_chunk_size
+        buffer_n_times = max(buffer_n_times, time_chunk_size)
+        self._open = True
+        self._init_write(name, buffer_n_times, writer)
+        return
+
+    def _is_open(self) -> bool:
+        return self._open
+
+    def _close_store(self) -> None:
+        with warnings.catch_warnings():
+            # consolidated metadata is not (yet) in the zarr v3 spec
+            warnings.simplefilter("ignore", UserWarning)
+            self._zarr.consolidate_metadata(self.group.store)
+        self._open = False
+        return
+
+    @staticmethod
+    def _is_time_variable(var) -> bool:
+        return var.metadata.dimension_names[0] == "time"
+
+    @staticmethod
+    def _time_chunk_size(var) -> int:
+        return var.chunks[0]
+
+    def _encode_time(self, simulation_time: dt.datetime) -> float:
+        return nc4.date2num(simulation_time, self._time_units)
+
+    @staticmethod
+    def _grow(var, n_times: int) -> None:
+        if var.shape[0] < n_times:
+            var.resize((n_times, *var.shape[1:]))
+        return
+
+    def _quantize(self, var, data: np.ndarray) -> np.ndarray:
+        # the quantization of netCDF4 with least_significant_digit, of
+        # the variables and not the (1-D) time coordinate
+        lsd = self._least_significant_digit
+        if lsd is None or var.dtype.kind != "f" or var.ndim < 2:
+            return data
+        bits = np.ceil(np.log2(10.0**lsd))
+        scale = 2.0**bits
+        return np.around(scale * np.asarray(data)) / scale
+
+    def _write_block(self, var, start: int, block: np.ndarray) -> None:
+        self._grow(var, start + block.shape[0])
+        var[start : start + block.shape[0], ...] = self._quantize(var, block)
+        return
+
+    def _write_time_step(self, var, itime_step: int, current) -> None:
+        self._grow(var, itime_step + 1)
+        var[itime_step, ...] = self._quantize(var, current)
+        return
+
+    def add_all_data(
+        self,
+        name: str,
+        data: np.ndarray,
+        time_data: np.ndarray,
+        time_coord: str = "time",
+    ) -> None:
+        """Add all the times of a variable, see NetCdfWrite.add_all_data.
+
+        Args:
+            name: the variable name.
+            data: the data with time as the first dimension.
+            time_data: the np.datetime64 times or the days of year.
+            time_coord: "time" or "doy".
+        """
+        if name not in self.variables.keys():
+            raise KeyError(f"{name} not a valid variable name")
+
+        if time_coord == "time":
+            self._write_block(
+                self.time,
+                0,
+                nc4.date2num(
+                    time_data.astype(dt.datetime),
+                    units=self._time_units,
+                    calendar="standard",
+                ),
+            )
+        if name in self._spatial_index.keys():
+            data = data[:, self._spatial_index[name]]
+        self._write_block(self.variables[name], 0, data)
+        return